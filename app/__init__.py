@@ -5,16 +5,28 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
+from functools import lru_cache
 import os
 import re
 
 from app.mod_auth.auth import AuthError
+from app.mod_base.pool import engine_options, pool_metrics
+from app.mod_base.profiling import profiler
+from app.mod_base.metrics import metrics
 
+URLS_REGEX = re.compile(r"(https?\:\/\/[\w/\-?=%.]+\.[\w/\+\-?=%.~&\[\]\#]+)")
+DECORATED_URL_FORMAT = '<a href="{}" target="_blank">{}</a>'
+
+'''
+task_details_for_markup(details)
+    decorates the urls of the task details with links
+    the result is memoized per details string, as the same details are rendered on
+    every occurrence of a recurrent task and on every page view
+'''
+@lru_cache(maxsize=4096)
 def task_details_for_markup(details):
-    URLS_REGEX_PATTERN = r"(https?\:\/\/[\w/\-?=%.]+\.[\w/\+\-?=%.~&\[\]\#]+)"
-    DECORATED_URL_FORMAT = '<a href="{}" target="_blank">{}</a>'
     decorated_fragments = []
-    fragments = re.split(URLS_REGEX_PATTERN, details)
+    fragments = URLS_REGEX.split(details)
     for index, fragment in enumerate(fragments):
         if index % 2 == 1:
             decorated_fragments.append(DECORATED_URL_FORMAT.format(fragment, fragment))
@@ -26,14 +38,43 @@ def task_details_for_markup(details):
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    the connection pool is configured with the DB_* settings (see config.py)
 '''
 def setup_db(app, database_path, track_modifications=False):
     if database_path:
         app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = track_modifications
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
     db.app = app
     db.init_app(app)
 
+'''
+runtime_metrics()
+    metrics collector of the connection pool and of the caches counters
+'''
+def runtime_metrics():
+    import app.mod_auth.auth as auth
+    from app.mod_calendar.cache import month_cache, calendar_settings_cache
+
+    pool = pool_metrics.stats(db.engine)
+    for counter, key in (
+        ('db_pool_checkouts_total', 'checkouts'),
+        ('db_pool_connects_total', 'connects'),
+        ('db_pool_invalidations_total', 'invalidations'),
+        ('db_pool_wait_seconds_total', 'wait_seconds_total')
+    ):
+        yield 'counter', counter, (), pool[key]
+    for gauge in ('size', 'checked_out', 'overflow', 'idle'):
+        yield 'gauge', 'db_pool_%s' % gauge, (), pool.get(gauge)
+    for cache, stats in (
+        ('month', month_cache.stats()),
+        ('calendar_settings', calendar_settings_cache.stats()),
+        ('token', auth.token_cache.stats()),
+        ('jwks', auth.jwks_cache.stats())
+    ):
+        yield 'counter', 'cache_hits_total', (('cache', cache),), stats['hits']
+        yield 'counter', 'cache_misses_total', (('cache', cache),), stats['misses']
+
 '''
 create_app(config)
     creates the flask application
@@ -51,6 +92,10 @@ def create_app(config='config'):
     app.config['CORS_HEADERS'] = 'Content-Type'
     csrf.init_app(app)
 
+    # Opt-in request profiling, see PROFILING_* in config.py
+    if app.config.get('PROFILING_ENABLED'):
+        profiler.init_app(app)
+
     if 'DATABASE_URL' in os.environ:
         database_path = os.environ['DATABASE_URL']
     else:
@@ -61,15 +106,37 @@ def create_app(config='config'):
     # Import a module / component using its blueprint handler variable (mod_auth)
     from app.mod_auth.controllers import mod_auth as auth_module
     from app.mod_calendar.controllers import mod_calendar as calendar_module
+    from app.mod_calendar.cache import month_cache, calendar_settings_cache
+    from app.mod_calendar.occurrences import occurrence_store
+
+    # Rendered month grids and calendar settings caches, see MONTH_CACHE_* in config.py
+    month_cache.init_app(app)
+    calendar_settings_cache.init_app(app)
+    # Optional materialized occurrences of the recurrent tasks, see OCCURRENCES_* in config.py
+    occurrence_store.init_app(app)
 
     # Register blueprint(s)
     app.register_blueprint(auth_module)
     app.register_blueprint(calendar_module)
 
+    # Request counts and latencies per endpoint, pool and caches state: GET /metrics
+    # (summed over the gunicorn workers with METRICS_MULTIPROC_DIR, see config.py)
+    metrics.init_app(app)
+    metrics.add_collector(runtime_metrics)
+
     @app.route('/', methods=['GET'])
     def index():
         return redirect("/calendar/", code=302)
 
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        return metrics.response()
+
+    # Connection pool state of this worker, for scraping
+    @app.route('/stats/pool', methods=['GET'])
+    def pool_stats():
+        return jsonify(pool_metrics.stats(db.engine))
+
     # To avoid main_calendar_action below shallowing favicon requests and generating error logs
     @app.route("/favicon.ico")
     def favicon():
@@ -1 +1 @@
-__all__ = ['auth', 'constants', 'controllers', 'forms']
\ No newline at end of file
+__all__ = ['auth', 'constants', 'controllers', 'forms', 'jwks', 'tokens']
\ No newline at end of file
@@ -1,15 +1,28 @@
 import json
+from os import environ as env
 from flask import request, _request_ctx_stack, session
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen, URLError
 from authlib.integrations.flask_client import OAuth
 import app.mod_auth.constants as constants
+from app.mod_auth.jwks import JWKSCache, JWKSError
+from app.mod_auth.tokens import TokenCache
+from app.mod_base.profiling import span
+from app.mod_base.metrics import metrics
 
 AUTH0_DOMAIN = 'kilauea.eu.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'calendar'
 
+# Signing keys are fetched once per process and refreshed every AUTH0_JWKS_TTL seconds.
+# AUTH0_JWKS_SOURCE may point to a local jwks.json file (path or file:// URL) to run offline.
+jwks_cache = JWKSCache(
+  env.get(constants.AUTH0_JWKS_SOURCE, f'https://{AUTH0_DOMAIN}/.well-known/jwks.json'),
+  ttl=int(env.get(constants.AUTH0_JWKS_TTL, 3600))
+)
+# Verified payloads are reused until the token expires, AUTH0_TOKEN_CACHE_SIZE=0 disables it.
+token_cache = TokenCache(int(env.get(constants.AUTH0_TOKEN_CACHE_SIZE, 1024)))
+
 ## AuthError Exception
 '''
 AuthError Exception
@@ -94,7 +107,7 @@ def check_permissions(permission, payload):
         token: a json web token (string)
 
     it should be an Auth0 token with key id (kid)
-    it should verify the token using Auth0 /.well-known/jwks.json
+    it should verify the token using Auth0 /.well-known/jwks.json (cached in jwks_cache)
     it should decode the payload from the token
     it should validate the claims
     return the decoded payload
@@ -103,32 +116,27 @@ def check_permissions(permission, payload):
 '''
 def verify_decode_jwt(token):
   try:
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
-  except URLError as e:
-    print(e)
+    unverified_header = jwt.get_unverified_header(token)
+  except Exception:
+    raise AuthError({
+      'code': 'invalid_header',
+      'description': 'Unable to parse authentication token.'
+    }, 401)
+  if 'kid' not in unverified_header:
     raise AuthError({
       'code': 'invalid_header',
       'description': 'Authorization malformed.'
     }, 401)
 
-  unverified_header = jwt.get_unverified_header(token)
-  rsa_key = {}
-  if 'kid' not in unverified_header:
+  try:
+    rsa_key = jwks_cache.get_key(unverified_header['kid'])
+  except JWKSError as e:
+    print(e)
     raise AuthError({
       'code': 'invalid_header',
       'description': 'Authorization malformed.'
     }, 401)
 
-  for key in jwks['keys']:
-    if key['kid'] == unverified_header['kid']:
-      rsa_key = {
-        'kty': key['kty'],
-        'kid': key['kid'],
-        'use': key['use'],
-        'n': key['n'],
-        'e': key['e']
-      }
   if rsa_key:
     try:
       payload = jwt.decode(
@@ -161,13 +169,26 @@ def verify_decode_jwt(token):
     'description': 'Unable to find the appropriate key.'
   }, 401)
 
+'''
+verify_decode_jwt_cached(token)
+    same as verify_decode_jwt, but a token already verified is served from token_cache
+    until its exp claim, skipping the signature and claims verification
+    the returned payload is shared between requests and must not be modified
+'''
+def verify_decode_jwt_cached(token):
+  payload = token_cache.get(token)
+  if payload is None:
+    payload = verify_decode_jwt(token)
+    token_cache.put(token, payload)
+  return payload
+
 '''
 @implement @requires_auth(permission) decorator method
     @INPUTS
         permission: string permission (i.e. 'post:drink')
 
     it should use the get_token_auth_header method to get the token
-    it should use the verify_decode_jwt method to decode the jwt
+    it should use the verify_decode_jwt_cached method to decode the jwt
     it should use the check_permissions method validate claims and check the requested permission
     return the decorator which passes the decoded payload to the decorated method
 '''
@@ -186,7 +207,8 @@ def requires_auth(permission=None):
           'description': 'Token not found.'
         }, 401)
       token = session[constants.JWT_TOKEN]
-      payload = verify_decode_jwt(token)
+      with span('auth'), metrics.time('auth_verification_seconds'):
+        payload = verify_decode_jwt_cached(token)
       if permission:
         check_permissions(permission, payload)
         return f(payload, *args, **kwargs)
@@ -6,6 +6,9 @@ AUTH0_CLIENT_SECRET = 'AUTH0_CLIENT_SECRET'
 AUTH0_CALLBACK_URL = 'AUTH0_CALLBACK_URL'
 AUTH0_DOMAIN = 'AUTH0_DOMAIN'
 AUTH0_AUDIENCE = 'AUTH0_AUDIENCE'
+AUTH0_JWKS_SOURCE = 'AUTH0_JWKS_SOURCE'
+AUTH0_JWKS_TTL = 'AUTH0_JWKS_TTL'
+AUTH0_TOKEN_CACHE_SIZE = 'AUTH0_TOKEN_CACHE_SIZE'
 PROFILE_KEY = 'profile'
 JWT_PAYLOAD = 'jwt_payload'
 JWT_TOKEN = 'jwt_token'
\ No newline at end of file
@@ -11,6 +11,9 @@ from flask import Blueprint, request, render_template, \
                   current_app
 import app.mod_auth.constants as constants
 import app.mod_auth.auth as auth
+from app.mod_calendar.cache import month_cache, calendar_settings_cache
+from app.mod_base.pool import pool_metrics
+from app import db
 
 __STORE_SESSION__ = False
 
@@ -102,4 +105,9 @@ def dashboard():
     return render_template('auth/dashboard.html',
                            userinfo=session[constants.PROFILE_KEY],
                            userinfo_pretty=json.dumps(session[constants.JWT_PAYLOAD], indent=4),
-                           userperm_pretty=json.dumps(auth.verify_decode_jwt(session[constants.JWT_TOKEN]), indent=4))
+                           userperm_pretty=json.dumps(auth.verify_decode_jwt_cached(session[constants.JWT_TOKEN]), indent=4),
+                           jwks_stats_pretty=json.dumps(auth.jwks_cache.stats(), indent=4),
+                           token_stats_pretty=json.dumps(auth.token_cache.stats(), indent=4),
+                           month_cache_stats_pretty=json.dumps(month_cache.stats(), indent=4),
+                           settings_cache_stats_pretty=json.dumps(calendar_settings_cache.stats(), indent=4),
+                           pool_stats_pretty=json.dumps(pool_metrics.stats(db.engine), indent=4))
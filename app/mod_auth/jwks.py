@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from urllib.request import urlopen, URLError
+
+'''
+JWKSError Exception
+    raised when the JWKS document can not be fetched or parsed
+'''
+class JWKSError(Exception):
+  pass
+
+'''
+JWKSCache
+    process-wide cache of the identity provider signing keys, indexed by key id (kid)
+
+    source: https:// or file:// URL of the jwks.json document, or a local file path
+    ttl: seconds before the whole key set is refreshed
+    min_refetch_interval: minimum seconds between refetches triggered by an unknown kid,
+        so a flood of forged kids can not turn into a flood of requests to the provider
+
+    The keys are fetched lazily on the first lookup. When a refresh fails the previous
+    keys keep being served until a later refresh succeeds.
+    EXAMPLE
+        cache = JWKSCache('https://example.auth0.com/.well-known/jwks.json')
+        rsa_key = cache.get_key(unverified_header['kid'])
+'''
+class JWKSCache():
+  def __init__(self, source, ttl=3600, min_refetch_interval=30, timeout=10):
+    self.source = source
+    self.ttl = ttl
+    self.min_refetch_interval = min_refetch_interval
+    self.timeout = timeout
+    self._keys = {}
+    self._fetched_at = None
+    self._attempted_at = None
+    self._error = None
+    self._generation = 0
+    self._lock = threading.Lock()
+    self._counters = {
+      'hits': 0,
+      'misses': 0,
+      'refreshes': 0,
+      'errors': 0
+    }
+
+  def _load(self):
+    if self.source.startswith('https://') or self.source.startswith('http://'):
+      response = urlopen(self.source, timeout=self.timeout)
+      return json.loads(response.read())
+    path = self.source[len('file://'):] if self.source.startswith('file://') else self.source
+    with open(path, 'rb') as jwks_file:
+      return json.loads(jwks_file.read())
+
+  def _refresh(self, generation):
+    # Single-flight: only the first thread refreshes, the ones waiting on the lock
+    # reuse its outcome, keys or error, instead of fetching the document again
+    with self._lock:
+      if self._generation != generation:
+        if self._fetched_at is not None:
+          return
+        if self._error is not None:
+          raise JWKSError(self._error)
+      self._attempted_at = time.monotonic()
+      try:
+        jwks = self._load()
+        keys = {}
+        for key in jwks['keys']:
+          keys[key['kid']] = {
+            'kty': key['kty'],
+            'kid': key['kid'],
+            'use': key['use'],
+            'n': key['n'],
+            'e': key['e']
+          }
+      except (URLError, OSError, ValueError, KeyError, TypeError) as e:
+        self._counters['errors'] += 1
+        self._error = e
+        self._generation += 1
+        if self._fetched_at is None:
+          raise JWKSError(e)
+        # Keep serving the stale keys, retry once min_refetch_interval has elapsed
+        self._fetched_at = time.monotonic() - self.ttl + self.min_refetch_interval
+        return
+      self._keys = keys
+      self._fetched_at = time.monotonic()
+      self._error = None
+      self._generation += 1
+      self._counters['refreshes'] += 1
+
+  '''
+  get_key(kid)
+      returns the rsa key dictionary for kid, or None if the provider does not publish it
+      it refreshes the key set when it is older than ttl
+      it refetches the key set once when kid is unknown and the last fetch is old enough
+  '''
+  def get_key(self, kid):
+    generation = self._generation
+    fetched_at = self._fetched_at
+    if fetched_at is None or time.monotonic() - fetched_at >= self.ttl:
+      self._refresh(generation)
+    key = self._keys.get(kid)
+    if key is not None:
+      self._counters['hits'] += 1
+      return key
+
+    self._counters['misses'] += 1
+    if time.monotonic() - self._attempted_at >= self.min_refetch_interval:
+      self._refresh(self._generation)
+      key = self._keys.get(kid)
+    return key
+
+  def clear(self):
+    with self._lock:
+      self._keys = {}
+      self._fetched_at = None
+      self._attempted_at = None
+      self._error = None
+      self._generation += 1
+
+  def stats(self):
+    stats = dict(self._counters)
+    stats['keys'] = len(self._keys)
+    stats['age'] = None if self._fetched_at is None else time.monotonic() - self._fetched_at
+    return stats
@@ -0,0 +1,76 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+'''
+TokenCache
+    bounded LRU cache of verified jwt payloads, indexed by the sha256 of the token
+
+    max_size: maximum number of payloads kept, 0 disables the cache
+    Entries expire at the token 'exp' claim, so a cached payload is never served
+    for a token the provider would consider expired. Only successfully verified
+    tokens are stored: a token that fails verification is checked again every time.
+    EXAMPLE
+        cache = TokenCache(1024)
+        payload = cache.get(token)
+        if payload is None:
+            payload = verify(token)
+            cache.put(token, payload)
+'''
+class TokenCache():
+  def __init__(self, max_size=1024):
+    self.max_size = max_size
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+    self._counters = {
+      'hits': 0,
+      'misses': 0,
+      'expired': 0,
+      'evictions': 0
+    }
+
+  @staticmethod
+  def _key(token):
+    if isinstance(token, str):
+      token = token.encode('utf-8')
+    return hashlib.sha256(token).digest()
+
+  def get(self, token):
+    if self.max_size <= 0:
+      return None
+    key = TokenCache._key(token)
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        self._counters['misses'] += 1
+        return None
+      expires_at, payload = entry
+      if expires_at <= time.time():
+        del self._entries[key]
+        self._counters['expired'] += 1
+        self._counters['misses'] += 1
+        return None
+      self._entries.move_to_end(key)
+      self._counters['hits'] += 1
+      return payload
+
+  def put(self, token, payload):
+    if self.max_size <= 0 or 'exp' not in payload:
+      return
+    key = TokenCache._key(token)
+    with self._lock:
+      self._entries[key] = (payload['exp'], payload)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_size:
+        self._entries.popitem(last=False)
+        self._counters['evictions'] += 1
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+  def stats(self):
+    stats = dict(self._counters)
+    stats['size'] = len(self._entries)
+    return stats
@@ -1 +1 @@
-__all__ = ['base_model']
\ No newline at end of file
+__all__ = ['base_model', 'pool', 'profiling', 'metrics']
\ No newline at end of file
@@ -0,0 +1,273 @@
+import fcntl
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+'''
+MetricsRegistry
+    in-process counters and histograms, exposed in the Prometheus text format
+
+    Updates only take a short lock around a dict update. Collectors (add_collector)
+    report the counters and gauges already kept by other components (connection pool,
+    caches) when the metrics are collected, so they cost nothing per request.
+
+    Multiprocess mode (METRICS_MULTIPROC_DIR): every gunicorn worker writes a snapshot
+    of its metrics to <dir>/metrics-<pid>.json, at most every METRICS_FLUSH_INTERVAL
+    seconds (and on every scrape of the worker serving it), and /metrics sums the
+    snapshots of every worker. The snapshots of exited workers are merged into
+    archived.json on the next scrape: their counters are kept, their gauges dropped.
+    EXAMPLE
+        metrics.inc('http_requests_total', (('endpoint', 'calendar.get_calendar'),))
+        with metrics.time('auth_verification_seconds'):
+            payload = verify_decode_jwt(token)
+'''
+class MetricsRegistry():
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.multiproc_dir = None
+        self.flush_interval = 1.0
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        self._flushed_at = 0.0
+
+    def init_app(self, app):
+        self.multiproc_dir = app.config.get('METRICS_MULTIPROC_DIR') or None
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 1.0)
+        if self.multiproc_dir:
+            os.makedirs(self.multiproc_dir, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Bucket counts (the last one is +Inf), sum, count
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    break
+            else:
+                index = len(self.buckets)
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def time(self, name, labels=()):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, labels)
+
+    '''
+    add_collector(collector)
+        collector() returns an iterable of (type, name, labels, value) tuples,
+        type is 'counter' or 'gauge'
+        a collector already added is ignored: create_app() adds its collectors to the
+        module registry once per application, their values must not be summed twice
+    '''
+    def add_collector(self, collector):
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def snapshot(self):
+        with self._lock:
+            counters = [[name, labels, value] for (name, labels), value in self._counters.items()]
+            histograms = [
+                [name, labels, list(histogram[0]), histogram[1], histogram[2]]
+                for (name, labels), histogram in self._histograms.items()
+            ]
+        gauges = []
+        for collector in self._collectors:
+            try:
+                collected = list(collector())
+            except Exception as e:
+                print('Metrics collector failed: %s' % e)
+                continue
+            for metric_type, name, labels, value in collected:
+                if value is None:
+                    continue
+                (counters if metric_type == 'counter' else gauges).append([name, labels, value])
+        return {'pid': os.getpid(), 'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+    def _path(self):
+        return os.path.join(self.multiproc_dir, 'metrics-%d.json' % os.getpid())
+
+    def flush(self, force=False):
+        if not self.multiproc_dir:
+            return
+        now = time.monotonic()
+        if not force and now - self._flushed_at < self.flush_interval:
+            return
+        self._flushed_at = now
+        _write(self.multiproc_dir, self._path(), self.snapshot())
+
+    def collect(self):
+        if not self.multiproc_dir:
+            return [self.snapshot()]
+        self.flush(force=True)
+        archive_exited(self.multiproc_dir)
+        snapshots = []
+        for path in glob.glob(os.path.join(self.multiproc_dir, '*.json')):
+            snapshot = _read(path)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        return snapshots
+
+    def render(self):
+        counters, gauges, histograms = _merge(self.collect())
+        lines = []
+        for metric_type, values in (('counter', counters), ('gauge', gauges)):
+            for name in sorted({name for name, _ in values}):
+                lines.append('# TYPE %s %s' % (name, metric_type))
+                for (metric_name, labels), value in sorted(values.items()):
+                    if metric_name == name:
+                        lines.append('%s%s %s' % (name, _format_labels(labels), _format_value(value)))
+        for name in sorted({name for name, _ in histograms}):
+            lines.append('# TYPE %s histogram' % name)
+            for (metric_name, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket in zip(list(self.buckets) + ['+Inf'], buckets):
+                    cumulative += bucket
+                    le = bound if bound == '+Inf' else _format_value(bound)
+                    lines.append('%s_bucket%s %d' % (name, _format_labels(labels + (('le', le),)), cumulative))
+                lines.append('%s_sum%s %s' % (name, _format_labels(labels), _format_value(total)))
+                lines.append('%s_count%s %d' % (name, _format_labels(labels), count))
+        return '\n'.join(lines) + '\n'
+
+    def response(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def _before_request(self):
+        g._metrics_started = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            # The url rule endpoint keeps the label set bounded, unknown urls share one label
+            endpoint = request.url_rule.endpoint if request.url_rule is not None else 'unmatched'
+            self.inc('http_requests_total', (
+                ('endpoint', endpoint),
+                ('method', request.method),
+                ('status', str(response.status_code))
+            ))
+            self.observe('http_request_duration_seconds', time.perf_counter() - started, (('endpoint', endpoint),))
+            self.flush()
+        return response
+
+'''
+_merge(snapshots)
+    sums the counters, gauges and histograms of several snapshots
+    returns three dictionaries indexed by (name, labels)
+'''
+def _merge(snapshots):
+    counters = {}
+    gauges = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, _labels(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snapshot['gauges']:
+            key = (name, _labels(labels))
+            gauges[key] = gauges.get(key, 0) + value
+        for name, labels, buckets, total, count in snapshot['histograms']:
+            key = (name, _labels(labels))
+            histogram = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+            histogram[1] += total
+            histogram[2] += count
+    return counters, gauges, histograms
+
+def _labels(labels):
+    return tuple(tuple(label) for label in labels)
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _read(path):
+    try:
+        with open(path) as snapshot_file:
+            return json.load(snapshot_file)
+    except (OSError, ValueError):
+        return None
+
+def _write(directory, path, snapshot):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp')
+    with os.fdopen(fd, 'w') as snapshot_file:
+        json.dump(snapshot, snapshot_file)
+    os.replace(tmp_path, path)
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+'''
+archive_exited(multiproc_dir)
+    merges the counters and histograms of the exited workers into archived.json and
+    drops their gauges, under an exclusive flock so concurrent scrapes do not count
+    a worker twice
+'''
+def archive_exited(multiproc_dir):
+    with open(os.path.join(multiproc_dir, '.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            exited = []
+            for path in glob.glob(os.path.join(multiproc_dir, 'metrics-*.json')):
+                pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+                if not _is_running(pid):
+                    exited.append(path)
+            if not exited:
+                return
+            archive_path = os.path.join(multiproc_dir, 'archived.json')
+            snapshots = [_read(path) for path in [archive_path] + exited]
+            counters, _, histograms = _merge([snapshot for snapshot in snapshots if snapshot is not None])
+            _write(multiproc_dir, archive_path, {
+                'pid': None,
+                'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+                'histograms': [
+                    [name, labels, buckets, total, count]
+                    for (name, labels), (buckets, total, count) in histograms.items()
+                ],
+                'gauges': []
+            })
+            for path in exited:
+                os.remove(path)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+metrics = MetricsRegistry()
@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+'''
+PoolMetrics
+    per-worker (per-process) connection pool counters
+        checkouts, checkins: connections handed to and returned by the requests
+        connects: new DBAPI connections, a burst of them is a connection storm
+        invalidations: connections dropped, e.g. dead connections detected by pre-ping
+        wait_seconds_total, wait_seconds_max: time spent waiting for a connection
+    stats(engine) adds the live pool state: size, checked out and overflow connections
+    EXAMPLE
+        pool_metrics.stats(db.engine)
+'''
+class PoolMetrics():
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {
+                'checkouts': 0,
+                'checkins': 0,
+                'connects': 0,
+                'invalidations': 0,
+                'wait_seconds_total': 0.0,
+                'wait_seconds_max': 0.0
+            }
+
+    def incr(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def wait(self, seconds):
+        with self._lock:
+            self._counters['wait_seconds_total'] += seconds
+            if seconds > self._counters['wait_seconds_max']:
+                self._counters['wait_seconds_max'] = seconds
+
+    def stats(self, engine=None):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['pid'] = os.getpid()
+        pool = getattr(engine, 'pool', None)
+        if isinstance(pool, QueuePool):
+            stats['size'] = pool.size()
+            stats['checked_out'] = pool.checkedout()
+            stats['overflow'] = max(pool.overflow(), 0)
+            stats['idle'] = pool.checkedin()
+        return stats
+
+pool_metrics = PoolMetrics()
+
+'''
+MeteredQueuePool
+    QueuePool recording the checkout wait time and the pool events in pool_metrics
+'''
+class MeteredQueuePool(QueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_metrics.wait(time.perf_counter() - started)
+
+# Listeners of the class, not of each pool: engine.dispose() recreates the pool with a
+# copy of its listeners, instance listeners would be added again on every dispose
+for pool_event, counter in (
+    ('connect', 'connects'),
+    ('checkout', 'checkouts'),
+    ('checkin', 'checkins'),
+    ('invalidate', 'invalidations')
+):
+    event.listen(MeteredQueuePool, pool_event, lambda *args, counter=counter: pool_metrics.incr(counter))
+
+'''
+engine_options(config)
+    SQLAlchemy engine options built from the DB_* settings of config.py
+    the pool and connection settings only apply to PostgreSQL, SQLite keeps the
+    Flask-SQLAlchemy defaults; SQLALCHEMY_ENGINE_OPTIONS entries take precedence
+    EXAMPLE
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+'''
+def engine_options(config):
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if not (config.get('SQLALCHEMY_DATABASE_URI') or '').startswith('postgres'):
+        return options
+
+    options.setdefault('poolclass', MeteredQueuePool)
+    options.setdefault('pool_size', config.get('DB_POOL_SIZE', 5))
+    options.setdefault('max_overflow', config.get('DB_MAX_OVERFLOW', 10))
+    options.setdefault('pool_timeout', config.get('DB_POOL_TIMEOUT', 30))
+    options.setdefault('pool_recycle', config.get('DB_POOL_RECYCLE', 1800))
+    options.setdefault('pool_pre_ping', config.get('DB_POOL_PRE_PING', True))
+
+    connect_args = dict(options.get('connect_args') or {})
+    connect_args.setdefault('application_name', config.get('DB_APPLICATION_NAME', 'calendarapp'))
+    statement_timeout = config.get('DB_STATEMENT_TIMEOUT_MS', 0)
+    if statement_timeout:
+        connect_args.setdefault('options', '-c statement_timeout=%d' % statement_timeout)
+    options['connect_args'] = connect_args
+    return options
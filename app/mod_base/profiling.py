@@ -0,0 +1,141 @@
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('app.profiling')
+
+'''
+Request profiling
+    Opt-in (PROFILING_ENABLED), for a sample of the requests (PROFILING_SAMPLE_RATE,
+    0.0 to 1.0) records the wall time, the time spent in auth (span('auth')), the
+    number and total time of the SQL statements, the template rendering time and the
+    bytes out. Every sampled request is logged as a JSON line on the 'app.profiling'
+    logger and, with PROFILING_SERVER_TIMING, described in a Server-Timing header.
+    Requests that are not sampled only pay a random() call, the SQL and template
+    hooks return at once when the request is not sampled.
+    EXAMPLE
+        profiler.init_app(app)
+        with span('auth'):
+            payload = verify_decode_jwt(token)
+'''
+
+def _current():
+    if not has_request_context():
+        return None
+    return g.get('_profile')
+
+@contextmanager
+def span(name):
+    profile = _current()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile['spans'][name] = profile['spans'].get(name, 0.0) + time.perf_counter() - started
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current() is not None:
+        conn.info.setdefault('_profile_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current()
+    if profile is None:
+        return
+    started = conn.info.get('_profile_started')
+    if not started:
+        return
+    profile['sql_count'] += 1
+    profile['sql_seconds'] += time.perf_counter() - started.pop()
+
+def _handle_error(exception_context):
+    # The statement failed, after_cursor_execute is not called
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('_profile_started'):
+        connection.info['_profile_started'].pop()
+
+'''
+ProfiledTemplate
+    jinja2 Template timing its renders in the 'render' span
+'''
+class ProfiledTemplate(Template):
+    def render(self, *args, **kwargs):
+        with span('render'):
+            return super().render(*args, **kwargs)
+
+class RequestProfiler():
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.server_timing = True
+
+    def init_app(self, app):
+        self.sample_rate = app.config.get('PROFILING_SAMPLE_RATE', 0.01)
+        self.server_timing = app.config.get('PROFILING_SERVER_TIMING', True)
+        if not logger.handlers:
+            # One JSON object per line on stderr, collected with the gunicorn logs
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.propagate = False
+        logger.setLevel(logging.INFO)
+        # A logging fileConfig (e.g. alembic.ini, by the migrations) disables the loggers
+        # created before it
+        logger.disabled = False
+        app.jinja_env.template_class = ProfiledTemplate
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            # Engine class events: every engine of the process, once per process even
+            # with several applications (one per test case)
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def before_request(self):
+        if self.sample_rate >= 1.0 or random.random() < self.sample_rate:
+            g._profile = {
+                'started': time.perf_counter(),
+                'sql_count': 0,
+                'sql_seconds': 0.0,
+                'spans': {}
+            }
+
+    def after_request(self, response):
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return response
+        wall_seconds = time.perf_counter() - profile['started']
+        spans = profile['spans']
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'wall_ms': round(wall_seconds * 1000, 3),
+            'auth_ms': round(spans.get('auth', 0.0) * 1000, 3),
+            'sql_count': profile['sql_count'],
+            'sql_ms': round(profile['sql_seconds'] * 1000, 3),
+            'render_ms': round(spans.get('render', 0.0) * 1000, 3),
+            # None for streamed responses
+            'bytes_out': None if response.is_streamed else response.calculate_content_length()
+        }
+        logger.info(json.dumps(record))
+        if self.server_timing:
+            response.headers.add('Server-Timing', ', '.join([
+                'app;dur=%.3f' % record['wall_ms'],
+                'auth;dur=%.3f' % record['auth_ms'],
+                'db;dur=%.3f;desc="%d queries"' % (record['sql_ms'], record['sql_count']),
+                'render;dur=%.3f' % record['render_ms']
+            ]))
+        return response
+
+profiler = RequestProfiler()
@@ -1 +1 @@
-__all__ = ['controllers', 'forms', 'models']
\ No newline at end of file
+__all__ = ['controllers', 'forms', 'models', 'recurrence', 'cache', 'importer', 'ical', 'timezones', 'occurrences']
\ No newline at end of file
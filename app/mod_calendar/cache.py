@@ -0,0 +1,340 @@
+import fcntl
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+'''
+Cache backends
+    get(key): returns the cached value or None
+    set(key, value, timeout=None): stores value, timeout in seconds (None: no expiration)
+    get_counter(key): returns the value of an integer counter, 0 if it was never incremented
+    incr(key): atomically increments an integer counter and returns its new value
+    clear(): removes every entry
+    Counters are kept apart from the cached values and are never evicted.
+'''
+class NullCacheBackend():
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def get_counter(self, key):
+        return 0
+
+    def incr(self, key):
+        return 0
+
+    def clear(self):
+        pass
+
+'''
+LRUCacheBackend
+    in-process LRU cache, the default backend
+    each gunicorn worker keeps its own entries
+'''
+class LRUCacheBackend():
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires_at = None if timeout is None else time.time() + timeout
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_counter(self, key):
+        return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            value = self._counters.get(key, 0) + 1
+            self._counters[key] = value
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+'''
+FileSystemCacheBackend
+    cache shared by every process of the host through a directory, so the gunicorn
+    workers see the same entries and the same invalidations
+    the files are written atomically (temporary file + rename) and counters are
+    incremented under an exclusive flock
+'''
+class FileSystemCacheBackend():
+    def __init__(self, cache_dir, max_entries=2048):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._sets = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _counter_path(self, key):
+        return os.path.join(self.cache_dir, 'counter-' + hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as cache_file:
+                return pickle.load(cache_file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _write(self, path, entry):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp')
+        with os.fdopen(fd, 'wb') as cache_file:
+            pickle.dump(entry, cache_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def _prune(self):
+        # Counters are never pruned, losing one would serve stale entries
+        paths = [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if not name.startswith('.') and not name.startswith('counter-')
+        ]
+        if len(paths) <= self.max_entries:
+            return
+        entries = []
+        for path in paths:
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+        entries.sort()
+        for _, path in entries[:len(paths) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, key):
+        entry = self._read(self._path(key))
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        return value
+
+    def set(self, key, value, timeout=None):
+        expires_at = None if timeout is None else time.time() + timeout
+        self._write(self._path(key), (expires_at, value))
+        self._sets += 1
+        if self._sets % 64 == 0:
+            self._prune()
+
+    def get_counter(self, key):
+        value = self._read(self._counter_path(key))
+        return value if value is not None else 0
+
+    def incr(self, key):
+        path = self._counter_path(key)
+        with open(os.path.join(self.cache_dir, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                value = self.get_counter(key) + 1
+                self._write(path, value)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return value
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name == '.lock':
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+'''
+MonthCache
+    cache of the rendered month grids (calendar/month.html)
+
+    A fragment is keyed by (calendar_id, year, month, view past flag, week start, today).
+    Invalidation is done by versioning: every calendar and every (calendar, year, month)
+    have a counter that is part of the fragment key, writes bump the counters and the
+    stale fragments are never read again (they fall out of the LRU or expire). The
+    counters of the 'lru' backend are per process: the writes of another process
+    (another worker, manage.py) are only seen when the fragments expire.
+
+    Configuration (app.config):
+        MONTH_CACHE_BACKEND: 'lru' (default, single worker), 'filesystem' (shared by the
+            workers of the host, required when gunicorn runs several workers) or 'null'
+        MONTH_CACHE_MAX_ENTRIES: maximum number of fragments (default 512)
+        MONTH_CACHE_DIR: directory of the 'filesystem' backend
+        MONTH_CACHE_TIMEOUT: seconds a fragment is kept (default 300), bounds the
+            staleness left by the writes of other processes
+        MONTH_CACHE_HIDDEN_PAST_TIMEOUT: seconds a fragment with hidden past tasks is
+            kept, as it depends on the current time (default 60)
+    EXAMPLE
+        month_cache.init_app(app)
+        key = month_cache.key(calendar_id, year, month, view_past_tasks, week_starting_day, today)
+        fragment = month_cache.get(key)
+'''
+class MonthCache():
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else LRUCacheBackend()
+        self.timeout = 300
+        self.hidden_past_timeout = 60
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0
+        }
+
+    def init_app(self, app):
+        backend = app.config.get('MONTH_CACHE_BACKEND', 'lru')
+        max_entries = app.config.get('MONTH_CACHE_MAX_ENTRIES', 512)
+        if backend == 'filesystem':
+            cache_dir = app.config.get(
+                'MONTH_CACHE_DIR',
+                os.path.join(tempfile.gettempdir(), 'calendarapp-month-cache')
+            )
+            self.backend = FileSystemCacheBackend(cache_dir, max_entries)
+        elif backend == 'null':
+            self.backend = NullCacheBackend()
+        else:
+            self.backend = LRUCacheBackend(max_entries)
+        self.timeout = app.config.get('MONTH_CACHE_TIMEOUT', 300)
+        self.hidden_past_timeout = app.config.get('MONTH_CACHE_HIDDEN_PAST_TIMEOUT', 60)
+
+    def _version(self, key):
+        return self.backend.get_counter(key)
+
+    def key(self, calendar_id, year, month, view_past_tasks, week_starting_day, today):
+        return 'month:%d.%d:%d-%d.%d:%d:%d:%s' % (
+            calendar_id,
+            self._version('version:%d' % calendar_id),
+            year,
+            month,
+            self._version('version:%d:%d-%d' % (calendar_id, year, month)),
+            1 if view_past_tasks else 0,
+            week_starting_day,
+            today.isoformat()
+        )
+
+    def get(self, key):
+        fragment = self.backend.get(key)
+        if fragment is None:
+            self._counters['misses'] += 1
+        else:
+            self._counters['hits'] += 1
+        return fragment
+
+    def set(self, key, fragment, view_past_tasks=True):
+        self.backend.set(key, fragment, self.timeout if view_past_tasks else min(self.timeout, self.hidden_past_timeout))
+
+    def invalidate_calendar(self, calendar_id):
+        self._counters['invalidations'] += 1
+        self.backend.incr('version:%d' % calendar_id)
+
+    def invalidate_month(self, calendar_id, year, month):
+        self._counters['invalidations'] += 1
+        self.backend.incr('version:%d:%d-%d' % (calendar_id, year, month))
+
+    '''
+    invalidate_task(task)
+        invalidates the fragments where the task is displayed: every month of the calendar
+        for a recurrent task, otherwise the month of its start day and the neighbour months
+        whose grids also show that day
+    '''
+    def invalidate_task(self, task):
+        if task.is_recurrent:
+            self.invalidate_calendar(task.calendar_id)
+            return
+        year, month = task.start_time.year, task.start_time.month
+        previous_year, previous_month = (year - 1, 12) if month == 1 else (year, month - 1)
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        self.invalidate_month(task.calendar_id, previous_year, previous_month)
+        self.invalidate_month(task.calendar_id, year, month)
+        self.invalidate_month(task.calendar_id, next_year, next_month)
+
+    def stats(self):
+        stats = dict(self._counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        stats['backend'] = type(self.backend).__name__
+        return stats
+
+month_cache = MonthCache()
+
+'''
+CalendarSettingsCache
+    process-level cache of CalendarSettings snapshots, indexed by calendar id
+
+    Entries are dropped by invalidate() when the calendar is edited or deleted in this
+    process, and expire after CALENDAR_SETTINGS_CACHE_TTL seconds (default 30) so the
+    edits made through other gunicorn workers are picked up.
+    EXAMPLE
+        settings = calendar_settings_cache.get(calendar_id, load_settings)
+'''
+class CalendarSettingsCache():
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0
+        }
+
+    def init_app(self, app):
+        self.ttl = app.config.get('CALENDAR_SETTINGS_CACHE_TTL', 30)
+        self.clear()
+
+    def get(self, calendar_id, loader):
+        entry = self._entries.get(calendar_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._counters['hits'] += 1
+            return entry[1]
+        self._counters['misses'] += 1
+        settings = loader(calendar_id)
+        # Missing calendars are not cached, they may be created later
+        if settings is not None and self.ttl > 0:
+            with self._lock:
+                self._entries[calendar_id] = (time.monotonic() + self.ttl, settings)
+        return settings
+
+    def invalidate(self, calendar_id):
+        self._counters['invalidations'] += 1
+        with self._lock:
+            self._entries.pop(calendar_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        stats = dict(self._counters)
+        stats['size'] = len(self._entries)
+        return stats
+
+calendar_settings_cache = CalendarSettingsCache()
@@ -1,6 +1,8 @@
 import sys
 from flask import (
     Blueprint,
+    Markup,
+    Response,
     abort,
     current_app,
     g,
@@ -10,17 +12,23 @@ from flask import (
     render_template,
     request,
     session,
+    stream_with_context,
     flash
 )
 from flask_wtf import FlaskForm
 from wtforms import HiddenField
 from datetime import date, datetime, timedelta
+import hashlib
 import re
 
 from app.mod_calendar.models import Calendar
 from app.mod_calendar.models import Task
 from app.mod_calendar.forms import CalendarForm, TaskForm
+from app.mod_calendar.cache import month_cache, calendar_settings_cache
+from app.mod_calendar import ical, importer
+from app.mod_calendar.occurrences import occurrence_store
 import app.mod_auth.auth as auth
+from app import task_details_for_markup
 
 # Define the blueprint: 'auth', set its url prefix: app.url/auth
 mod_calendar = Blueprint('calendar', __name__, url_prefix='/calendar')
@@ -37,8 +45,45 @@ def unprocessable_entity_error(error):
 def server_error(error):
     return render_template('errors/500.html', error_msg=error), 500
 
-def previous_month_link(calendar_id, year, month):
+def _query_calendar_settings(calendar_id):
     calendar_query = Calendar.query.get(calendar_id)
+    return None if calendar_query is None else calendar_query.settings()
+
+'''
+load_calendar_settings(calendar_id)
+    returns the CalendarSettings of a calendar, or None if it does not exist
+    the settings are loaded once per request (stored on g) and shared by every helper,
+    behind the process-level calendar_settings_cache
+'''
+def load_calendar_settings(calendar_id):
+    if 'calendar_settings' not in g:
+        g.calendar_settings = {}
+    if calendar_id not in g.calendar_settings:
+        g.calendar_settings[calendar_id] = calendar_settings_cache.get(calendar_id, _query_calendar_settings)
+    return g.calendar_settings[calendar_id]
+
+'''
+invalidate_calendar_settings(calendar_id)
+    drops the cached settings after the calendar is edited or deleted
+'''
+def invalidate_calendar_settings(calendar_id):
+    if 'calendar_settings' in g:
+        g.calendar_settings.pop(calendar_id, None)
+    calendar_settings_cache.invalidate(calendar_id)
+
+'''
+details_markup(calendar_id, details)
+    decorated details stored with the task when the calendar auto decorates hyperlinks,
+    so the month views do not decorate them on every render
+'''
+def details_markup(calendar_id, details):
+    calendar_query = load_calendar_settings(calendar_id)
+    if calendar_query is None or not calendar_query.auto_decorate_task_details_hyperlink:
+        return None
+    return task_details_for_markup(details)
+
+def previous_month_link(calendar_id, year, month):
+    calendar_query = load_calendar_settings(calendar_id)
     month, year = Calendar.previous_month_and_year(year=year, month=month)
     return (
         ""
@@ -47,7 +92,7 @@ def previous_month_link(calendar_id, year, month):
     )
 
 def next_month_link(calendar_id, year, month):
-    calendar_query = Calendar.query.get(calendar_id)
+    calendar_query = load_calendar_settings(calendar_id)
     month, year = Calendar.next_month_and_year(year=year, month=month)
     return (
         ""
@@ -55,9 +100,22 @@ def next_month_link(calendar_id, year, month):
         else "?y={}&m={}".format(year, month)
     )
 
+'''
+index()
+    calendars listing, newest first, ?after= is the cursor of the next page and
+    ?q= a name prefix
+'''
 @mod_calendar.route('/', methods=['GET'])
 def index():
-    calendars = Calendar.query.order_by(Calendar.date_created.desc()).limit(10).all()
+    name_prefix = request.args.get('q', '').strip()
+    try:
+        calendars, next_cursor = Calendar.page(
+            request.args.get('after'),
+            current_app.config.get('CALENDARS_PAGE_SIZE', 10),
+            name_prefix
+        )
+    except ValueError as e:
+        return unprocessable_entity_error(str(e))
     class MyCSRFForm(FlaskForm):
         id = HiddenField('id')
     form = MyCSRFForm()
@@ -66,20 +124,50 @@ def index():
         'calendar/home.html',
         session=session,
         calendars=calendars,
+        name_prefix=name_prefix,
+        next_cursor=next_cursor,
+        is_first_page='after' not in request.args,
         form=form,
         dashboard_link='/auth/dashboard'
     )
 
+'''
+list_calendars_api()
+    JSON page of the calendars listing: ?after= cursor, ?q= name prefix, ?limit= page size
+    returns the calendars and the cursor of the next page (null on the last page)
+'''
+@mod_calendar.route('/api/calendars', methods=['GET'])
+def list_calendars_api():
+    try:
+        limit = int(request.args.get('limit', current_app.config.get('CALENDARS_PAGE_SIZE', 10)))
+        if not 1 <= limit <= 100:
+            raise ValueError('limit must be between 1 and 100')
+        calendars, next_cursor = Calendar.page(
+            request.args.get('after'),
+            limit,
+            request.args.get('q', '').strip()
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': 422,
+            'message': str(e)
+        }), 422
+
+    return jsonify({
+        'success': True,
+        'calendars': [calendar.short() for calendar in calendars],
+        'next': next_cursor
+    })
+
 @mod_calendar.route('/<int:calendar_id>/', methods=['GET'])
 @auth.requires_auth('get:calendars')
 def get_calendar(jwt, calendar_id):
-    calendar_query = Calendar.query.get(calendar_id)
+    calendar_query = load_calendar_settings(calendar_id)
     if calendar_query is None:
         return not_found_error('Calendar %s not found' % calendar_id)
 
-    Calendar.set_first_weekday(calendar_query.week_starting_day)
-
-    current_day, current_month, current_year = Calendar.current_date()
+    current_day, current_month, current_year = Calendar.current_date(calendar_query.time_zone)
     year = int(request.args.get("y", current_year))
     year = max(min(year, calendar_query.max_year), calendar_query.min_year)
     month = int(request.args.get("m", current_month))
@@ -88,13 +176,37 @@ def get_calendar(jwt, calendar_id):
 
     if calendar_query.hide_past_tasks:
         view_past_tasks = False
+        keep_days = calendar_query.days_past_to_keep_hidden_tasks
     else:
         view_past_tasks = request.cookies.get("ViewPastTasks", "1") == "1"
-
-    tasks = Task.getTasks(calendar_id, year, month, view_past_tasks)
+        keep_days = 0
 
     weekdays_headers = Calendar.weekdays(calendar_query.week_starting_day)
-    month_days = Calendar.month_days(year, month)
+
+    fragment_key = month_cache.key(
+        calendar_id,
+        year,
+        month,
+        view_past_tasks,
+        calendar_query.week_starting_day,
+        date(current_year, current_month, current_day)
+    )
+    month_grid = month_cache.get(fragment_key)
+    if month_grid is None:
+        tasks = Task.getTasks(calendar_id, year, month, view_past_tasks, calendar_query.week_starting_day,
+                              read_only=True, time_zone=calendar_query.time_zone, keep_days=keep_days,
+                              materialized=occurrence_store.covers_month(year, month))
+        month_grid = render_template(
+            "calendar/month.html",
+            calendar_id=calendar_id,
+            month=month,
+            current_year=current_year,
+            current_month=current_month,
+            current_day=current_day,
+            month_days=Calendar.month_days(year, month, calendar_query.week_starting_day),
+            tasks=tasks
+        )
+        month_cache.set(fragment_key, month_grid, view_past_tasks)
 
     return render_template(
         "calendar/calendar.html",
@@ -107,15 +219,249 @@ def get_calendar(jwt, calendar_id):
         current_year=current_year,
         current_month=current_month,
         current_day=current_day,
-        month_days=Calendar.month_days(year, month),
+        month_grid=Markup(month_grid),
         previous_month_link=previous_month_link(calendar_id, year, month),
         next_month_link=next_month_link(calendar_id, year, month),
-        tasks=tasks,
         display_view_past_button=calendar_query.show_view_past_btn,
         weekdays_headers=weekdays_headers,
         dashboard_link='/auth/dashboard'
     )
 
+'''
+get_calendar_tasks_api(calendar_id)
+    JSON occurrences of the month ?y=&m= (defaults to the current month)
+    the ETag is computed from the number of tasks and the latest date_modified of the
+    month window, so a conditional GET answered with 304 costs one aggregate query
+'''
+@mod_calendar.route('/<int:calendar_id>/api/tasks', methods=['GET'])
+@auth.requires_auth('get:calendars')
+def get_calendar_tasks_api(jwt, calendar_id):
+    calendar_query = load_calendar_settings(calendar_id)
+    if calendar_query is None:
+        return jsonify({
+            'success': False,
+            'error': 404,
+            'message': 'Calendar %s not found' % calendar_id
+        }), 404
+
+    current_day, current_month, current_year = Calendar.current_date(calendar_query.time_zone)
+    try:
+        year = int(request.args.get("y", current_year))
+        month = int(request.args.get("m", current_month))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 422,
+            'message': 'Invalid year or month'
+        }), 422
+    year = max(min(year, calendar_query.max_year), calendar_query.min_year)
+    month = max(min(month, 12), 1)
+
+    tasks_count, last_modified = Task.getMonthVersion(calendar_id, year, month, calendar_query.week_starting_day)
+    etag = hashlib.sha1(('%d:%d:%d:%d:%d:%s' % (
+        calendar_id,
+        year,
+        month,
+        calendar_query.week_starting_day,
+        tasks_count,
+        last_modified.isoformat() if last_modified else ''
+    )).encode('utf-8')).hexdigest()
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        tasks = Task.getTasks(calendar_id, year, month, True, calendar_query.week_starting_day, read_only=True,
+                              materialized=occurrence_store.covers_month(year, month))
+        occurrences = []
+        for day in Calendar.month_days(year, month, calendar_query.week_starting_day):
+            for task in tasks.get(day.month, {}).get(day.day, []):
+                occurrence = task.short()
+                occurrence['date'] = day.isoformat()
+                occurrence['is_recurrent'] = task.is_recurrent
+                occurrences.append(occurrence)
+        response = jsonify({
+            'success': True,
+            'calendar_id': calendar_id,
+            'year': year,
+            'month': month,
+            'tasks': occurrences
+        })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+'''
+agenda_range(calendar_query)
+    dates range of the agenda views: ?from=YYYY-mm-dd&to=YYYY-mm-dd, or the year ?y=
+    (defaults to the current year of the calendar)
+    raises ValueError for invalid dates and ranges longer than AGENDA_MAX_DAYS days
+'''
+def agenda_range(calendar_query):
+    max_days = current_app.config.get('AGENDA_MAX_DAYS', 366)
+    if 'from' in request.args or 'to' in request.args:
+        first_day = datetime.strptime(request.args.get('from', ''), '%Y-%m-%d').date()
+        if 'to' in request.args:
+            last_day = datetime.strptime(request.args['to'], '%Y-%m-%d').date()
+        else:
+            last_day = first_day + timedelta(days=max_days - 1)
+    else:
+        _, _, current_year = Calendar.current_date(calendar_query.time_zone)
+        year = int(request.args.get('y', current_year))
+        year = max(min(year, calendar_query.max_year), calendar_query.min_year)
+        first_day, last_day = date(year, 1, 1), date(year, 12, 31)
+    if last_day < first_day:
+        raise ValueError('The range ends before it starts')
+    if (last_day - first_day).days >= max_days:
+        raise ValueError('The range is longer than %d days' % max_days)
+    return first_day, last_day
+
+'''
+get_agenda(calendar_id)
+    year/agenda view: the occurrences of up to a year (see agenda_range) grouped by month
+    and day, loaded with one range query and one recurrence expansion pass
+'''
+@mod_calendar.route('/<int:calendar_id>/agenda', methods=['GET'])
+@auth.requires_auth('get:calendars')
+def get_agenda(jwt, calendar_id):
+    calendar_query = load_calendar_settings(calendar_id)
+    if calendar_query is None:
+        return not_found_error('Calendar %s not found' % calendar_id)
+    try:
+        first_day, last_day = agenda_range(calendar_query)
+    except ValueError as e:
+        return unprocessable_entity_error(str(e))
+
+    if calendar_query.hide_past_tasks:
+        view_past_tasks = False
+        keep_days = calendar_query.days_past_to_keep_hidden_tasks
+    else:
+        view_past_tasks = request.cookies.get("ViewPastTasks", "1") == "1"
+        keep_days = 0
+    months = Task.getTasksRange(calendar_id, first_day, last_day, view_past_tasks, calendar_query.time_zone,
+                                keep_days)
+
+    current_day, current_month, current_year = Calendar.current_date(calendar_query.time_zone)
+    return render_template(
+        "calendar/agenda.html",
+        session=session,
+        calendar_id=calendar_id,
+        description=calendar_query.description,
+        first_day=first_day,
+        last_day=last_day,
+        months=[(Calendar.month_name(month), year, month, days) for (year, month), days in months],
+        today=date(current_year, current_month, current_day),
+        min_year=calendar_query.min_year,
+        max_year=calendar_query.max_year,
+        dashboard_link='/auth/dashboard'
+    )
+
+'''
+get_agenda_api(calendar_id)
+    JSON equivalent of get_agenda, every occurrence of the range (past tasks included)
+'''
+@mod_calendar.route('/<int:calendar_id>/api/agenda', methods=['GET'])
+@auth.requires_auth('get:calendars')
+def get_agenda_api(jwt, calendar_id):
+    calendar_query = load_calendar_settings(calendar_id)
+    if calendar_query is None:
+        return jsonify({
+            'success': False,
+            'error': 404,
+            'message': 'Calendar %s not found' % calendar_id
+        }), 404
+    try:
+        first_day, last_day = agenda_range(calendar_query)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': 422,
+            'message': str(e)
+        }), 422
+
+    months = []
+    for (year, month), days in Task.getTasksRange(calendar_id, first_day, last_day):
+        month_days = []
+        for day, tasks in days:
+            occurrences = []
+            for task in tasks:
+                occurrence = task.short()
+                occurrence['is_recurrent'] = task.is_recurrent
+                occurrences.append(occurrence)
+            month_days.append({'date': day.isoformat(), 'tasks': occurrences})
+        months.append({'year': year, 'month': month, 'days': month_days})
+
+    return jsonify({
+        'success': True,
+        'calendar_id': calendar_id,
+        'from': first_day.isoformat(),
+        'to': last_day.isoformat(),
+        'months': months
+    })
+
+'''
+get_upcoming(calendar_id)
+    JSON list of the next ?n= occurrences (UPCOMING_DEFAULT_TASKS by default, at most
+    UPCOMING_MAX_TASKS) starting from the current time of the calendar
+'''
+@mod_calendar.route('/<int:calendar_id>/upcoming', methods=['GET'])
+@auth.requires_auth('get:calendars')
+def get_upcoming(jwt, calendar_id):
+    calendar_query = load_calendar_settings(calendar_id)
+    if calendar_query is None:
+        return jsonify({
+            'success': False,
+            'error': 404,
+            'message': 'Calendar %s not found' % calendar_id
+        }), 404
+    max_tasks = current_app.config.get('UPCOMING_MAX_TASKS', 100)
+    try:
+        limit = int(request.args.get('n', current_app.config.get('UPCOMING_DEFAULT_TASKS', 10)))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= max_tasks:
+        return jsonify({
+            'success': False,
+            'error': 422,
+            'message': 'n must be between 1 and %d' % max_tasks
+        }), 422
+
+    occurrences = []
+    for start, end, task in Task.getUpcoming(calendar_id, limit, calendar_query.time_zone, calendar_query.max_year):
+        occurrence = task.short()
+        occurrence['date'] = start.date().isoformat()
+        occurrence['start'] = start.isoformat()
+        occurrence['end'] = end.isoformat()
+        occurrence['is_recurrent'] = task.is_recurrent
+        occurrences.append(occurrence)
+
+    return jsonify({
+        'success': True,
+        'calendar_id': calendar_id,
+        'tasks': occurrences
+    })
+
+'''
+export_calendar(calendar_id)
+    streams the calendar as an iCalendar file, the tasks are read with a server-side
+    cursor (ICAL_EXPORT_YIELD_PER rows at a time) while the response is being sent
+'''
+@mod_calendar.route('/<int:calendar_id>/export.ics', methods=['GET'])
+@auth.requires_auth('get:calendars')
+def export_calendar(jwt, calendar_id):
+    calendar_query = load_calendar_settings(calendar_id)
+    if calendar_query is None:
+        return not_found_error('Calendar %s not found' % calendar_id)
+
+    tasks = Task.query.filter(Task.calendar_id == calendar_id).order_by(Task.id).execution_options(
+        stream_results=True
+    ).yield_per(current_app.config.get('ICAL_EXPORT_YIELD_PER', 1000))
+
+    response = Response(
+        stream_with_context(ical.export_calendar(calendar_query, tasks)),
+        mimetype='text/calendar'
+    )
+    response.headers['Content-Disposition'] = 'attachment; filename="calendar-%d.ics"' % calendar_id
+    return response
+
 @mod_calendar.route('/create', methods=['GET'])
 @auth.requires_auth('post:calendars')
 def new_calendar(jwt):
@@ -166,7 +512,10 @@ def delete_calendar(jwt, calendar_id):
         return not_found_error('Calendar %s not found' % calendar_id)
     name = calendar_query.name
     try:
+        occurrence_store.remove_calendar(calendar_id)
         calendar_query.delete()
+        month_cache.invalidate_calendar(calendar_id)
+        invalidate_calendar_settings(calendar_id)
     except:
         print("Unexpected error:", sys.exc_info()[0])
         return unprocessable_entity_error('Calendar not deleted')
@@ -177,7 +526,7 @@ def delete_calendar(jwt, calendar_id):
 @mod_calendar.route('/<int:calendar_id>/edit', methods=['GET'])
 @auth.requires_auth('patch:calendars')
 def edit_calendar_form(jwt, calendar_id):
-    calendar_query = Calendar.query.get(calendar_id)
+    calendar_query = load_calendar_settings(calendar_id)
     if calendar_query is None:
         return not_found_error('Calendar %s not found' % calendar_id)
 
@@ -215,6 +564,9 @@ def save_calendar_form(jwt, calendar_id):
             calendar_query.emojis_enabled = form.emojis_enabled.data
             calendar_query.show_view_past_btn = form.show_view_past_btn.data
             calendar_query.update()
+            occurrence_store.refresh_calendar(calendar_id)
+            month_cache.invalidate_calendar(calendar_id)
+            invalidate_calendar_settings(calendar_id)
         else:
             error_msg = ''
             if form.errors:
@@ -234,15 +586,13 @@ def save_calendar_form(jwt, calendar_id):
 @mod_calendar.route('/<int:calendar_id>/tasks', methods=['GET'])
 @auth.requires_auth('post:tasks')
 def new_task_form(jwt, calendar_id):
-    calendar_query = Calendar.query.get(calendar_id)
+    calendar_query = load_calendar_settings(calendar_id)
     if calendar_query is None:
         return not_found_error('Calendar %s not found' % calendar_id)
 
-    Calendar.set_first_weekday(calendar_query.week_starting_day)
-
-    year = int(request.args.get("year", datetime.now().year))
-    month = int(request.args.get("month", datetime.now().month))
-    current_day, current_month, current_year = Calendar.current_date()
+    current_day, current_month, current_year = Calendar.current_date(calendar_query.time_zone)
+    year = int(request.args.get("year", current_year))
+    month = int(request.args.get("month", current_month))
     year = max(min(year, calendar_query.max_year), calendar_query.min_year)
     month = max(min(month, 12), 1)
 
@@ -337,15 +687,65 @@ def create_task(jwt, calendar_id):
             repetition_type=repetition_type,
             repetition_subtype=repetition_subtype
         )
+        newTask.details_markup = details_markup(calendar_id, details)
         newTask.insert()
+        occurrence_store.refresh_task(newTask)
+        month_cache.invalidate_task(newTask)
         return redirect("/calendar/%s/?y=%d&m=%d" % (calendar_id, year, month), code=302)
     else:
         return redirect("/calendar/%s" % (calendar_id), code=302)
 
+'''
+import_tasks(calendar_id)
+    bulk import of a JSON Lines, CSV or iCalendar file (multipart 'file' field, or the request body)
+    the format is taken from ?format=, or from the file extension
+    returns the import report, invalid rows and failed chunks do not abort the load
+'''
+@mod_calendar.route('/<int:calendar_id>/tasks/import', methods=['POST'])
+@auth.requires_auth('post:tasks')
+def import_tasks(jwt, calendar_id):
+    if load_calendar_settings(calendar_id) is None:
+        return jsonify({
+            'success': False,
+            'error': 404,
+            'message': 'Calendar %s not found' % calendar_id
+        }), 404
+
+    upload = request.files.get('file')
+    fmt = request.args.get('format')
+    if fmt is None and upload is not None and '.' in (upload.filename or ''):
+        fmt = upload.filename.rsplit('.', 1)[1].lower()
+    if fmt not in importer.FORMATS:
+        return jsonify({
+            'success': False,
+            'error': 422,
+            'message': 'Unknown format, expected one of %s' % ', '.join(importer.FORMATS)
+        }), 422
+
+    stream = upload.stream if upload is not None else request.stream
+    # Parsed in the request thread by default, a pool is forked from a fresh forkserver
+    # process, not from this multi-threaded worker, and their number is capped
+    with importer.parsing_processes(current_app.config.get('ICAL_IMPORT_PROCESSES', 0),
+                                    current_app.config.get('ICAL_IMPORT_MAX_POOLS', 1)) as processes:
+        report = importer.import_tasks(
+            calendar_id,
+            importer.text_stream(stream),
+            fmt,
+            chunk_size=current_app.config.get('TASKS_IMPORT_CHUNK_SIZE', 1000),
+            processes=processes,
+            start_method='forkserver'
+        )
+    if report['inserted']:
+        occurrence_store.refresh_calendar(calendar_id)
+        month_cache.invalidate_calendar(calendar_id)
+
+    report['success'] = report['invalid'] == 0 and report['failed_chunks'] == 0 and report['stopped'] is None
+    return jsonify(report)
+
 @mod_calendar.route('/<int:calendar_id>/tasks/<int:task_id>', methods=['GET'])
 @auth.requires_auth('patch:tasks')
 def edit_task(jwt, calendar_id, task_id):
-    calendar_query = Calendar.query.get(calendar_id)
+    calendar_query = load_calendar_settings(calendar_id)
     if calendar_query is None:
         return not_found_error('Calendar %s not found' % calendar_id)
 
@@ -409,11 +809,13 @@ def update_task(jwt, calendar_id, task_id):
         task = Task.getTask(task_id)
         if task == None:
             return not_found_error('Task %s not found' % task_id)
+        month_cache.invalidate_task(task)
 
         task.calendar_id = calendar_id
         task.title = title
         task.color = color
         task.details = details
+        task.details_markup = details_markup(calendar_id, details)
         task.start_time = datetime.strptime('%s %s' % (start_date, start_time), '%Y-%m-%d %H:%M')
         task.end_time = datetime.strptime('%s %s' % (end_date, end_time), '%Y-%m-%d %H:%M')
         task.is_all_day = is_all_day
@@ -423,6 +825,8 @@ def update_task(jwt, calendar_id, task_id):
         task.repetition_subtype = repetition_subtype
 
         task.update()
+        occurrence_store.refresh_task(task)
+        month_cache.invalidate_task(task)
     except:
         print("Unexpected error:", sys.exc_info()[0])
         return unprocessable_entity_error('Task %s not saved' % task_id)
@@ -439,9 +843,12 @@ def update_task_day(jwt, calendar_id, task_id):
         if task == None:
             return not_found_error('Task %s not found' % task_id)
         if newDay:
+            month_cache.invalidate_task(task)
             task.start_time = task.start_time.replace(day = newDay)
             task.end_time = task.end_time.replace(day = newDay)
             task.update()
+            occurrence_store.refresh_task(task)
+            month_cache.invalidate_task(task)
     except:
         print("Unexpected error:", sys.exc_info()[0])
         return unprocessable_entity_error('Task %s not saved' % task_id)
@@ -458,6 +865,8 @@ def delete_task(jwt, calendar_id, task_id):
         task = Task.getTask(task_id)
         if task == None:
             return not_found_error('Task %s not found' % task_id)
+        month_cache.invalidate_task(task)
+        occurrence_store.remove_task(task.id)
         task.delete()
     except:
         print("Unexpected error:", sys.exc_info()[0])
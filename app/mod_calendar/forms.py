@@ -8,8 +8,9 @@ from wtforms import (
 from wtforms.validators import (
     DataRequired, AnyOf, URL,
     Length, Regexp, Optional,
-    NumberRange
+    NumberRange, ValidationError
 )
+from app.mod_calendar import timezones
 from app.mod_calendar.models import Calendar, Task
 
 class CalendarForm(FlaskForm):
@@ -32,6 +33,10 @@ class CalendarForm(FlaskForm):
     emojis_enabled = BooleanField('Enable Emojis', default=True, false_values={False, 'false', ''})
     show_view_past_btn = BooleanField('Show View Past Button', default=True, false_values={False, 'false', ''})
 
+    def validate_time_zone(form, field):
+        if not timezones.is_valid(field.data):
+            raise ValidationError('Unknown time zone, expected a name like Europe/Madrid')
+
 class TaskForm(FlaskForm):
     task_id = HiddenField('task_id')
     calendar_id = HiddenField('calendar_id')
@@ -44,6 +49,6 @@ class TaskForm(FlaskForm):
     end_time = DateTimeField('End time', format='%H:%M:%S', validators=[DataRequired()])
     is_all_day = BooleanField('All day event', default=False, false_values={False, 'false', ''})
     is_recurrent = BooleanField('Recurrent', default=False, false_values={False, 'false', ''})
-    repetition_value = StringField('Repetition value', validators=[Length(max=1)])
+    repetition_value = StringField('Repetition value', validators=[Length(max=2)])
     repetition_type = StringField('Repetition type', validators=[Length(max=1)])
     repetition_subtype = StringField('Repetition sub-type', validators=[Length(max=1)])
@@ -0,0 +1,479 @@
+import multiprocessing
+import os
+import re
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+from app.mod_calendar import recurrence, timezones
+
+'''
+iCalendar (RFC 5545) export
+    One-off tasks are exported as VEVENTs, recurrent tasks as VEVENTs with an RRULE
+    equivalent to the Task repetition columns. Recurrent tasks repeat during the year
+    of their start_time, as in the month views, so their RRULE ends on December 31st
+    and their DTSTART is the first occurrence of that year.
+    Timed tasks are written in the calendar's time zone (DTSTART;TZID=), described by a
+    VTIMEZONE component for the calendar's years, whole day tasks as DATE values.
+'''
+
+PRODID = '-//FSND capstone//Calendar//EN'
+ICAL_WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+BUFFER_SIZE = 64 * 1024
+# VEVENTs sent at a time to a parsing process
+EVENTS_PER_BATCH = 500
+DURATION_REGEX = re.compile(r'^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+
+def escape_text(text):
+    return (
+        text.replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('<br>', '\\n')
+        .replace('\r', '')
+        .replace('\n', '\\n')
+    )
+
+def fold_line(line):
+    # Content lines are folded at 75 octets, continuation lines start with a space
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    folded = []
+    start = 0
+    limit = 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Do not split a multi-byte character
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        folded.append(encoded[start:end].decode('utf-8'))
+        start = end
+        limit = 74
+    return '\r\n '.join(folded) + '\r\n'
+
+def format_datetime(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+def format_date(value):
+    return value.strftime('%Y%m%d')
+
+def format_utc(value):
+    return format_datetime(value) + 'Z'
+
+def format_offset(offset):
+    seconds = int(offset.total_seconds())
+    hours, rest = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return '%s%02d%02d%s' % ('-' if offset < timedelta(0) else '+', hours, minutes, '%02d' % seconds if seconds else '')
+
+'''
+utc_stamp(value)
+    naive UTC time of a date_modified value, a naive local time of the server
+    (CURRENT_TIMESTAMP), for DTSTAMP
+'''
+def utc_stamp(value):
+    if value is None:
+        return datetime.utcnow()
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+'''
+rrule(repetition_type, repetition_subtype, repetition_value, until, value_type='DATE-TIME')
+    RRULE value of a Task repetition, or None if the repetition is not supported
+    UNTIL has the value type of the DTSTART: a date for 'DATE', a UTC time otherwise
+'''
+def rrule(repetition_type, repetition_subtype, repetition_value, until, value_type='DATE-TIME'):
+    if repetition_type == recurrence.WEEKLY and 0 <= repetition_value <= 6:
+        rule = 'FREQ=WEEKLY;BYDAY=%s' % ICAL_WEEKDAYS[repetition_value]
+    elif repetition_type == recurrence.MONTHLY and repetition_subtype == recurrence.BY_WEEKDAY \
+            and 0 <= repetition_value <= 6:
+        rule = 'FREQ=MONTHLY;BYDAY=1%s' % ICAL_WEEKDAYS[repetition_value]
+    elif repetition_type == recurrence.MONTHLY and repetition_subtype == recurrence.BY_MONTHDAY \
+            and 1 <= repetition_value <= 31:
+        if repetition_value <= 28:
+            rule = 'FREQ=MONTHLY;BYMONTHDAY=%d' % repetition_value
+        else:
+            # Clamped to the last day of shorter months: the last existing day of 28..value
+            rule = 'FREQ=MONTHLY;BYMONTHDAY=%s;BYSETPOS=-1' % ','.join(
+                str(day) for day in range(28, repetition_value + 1))
+    else:
+        return None
+    return '%s;UNTIL=%s' % (rule, format_date(until) if value_type == 'DATE' else format_utc(until))
+
+'''
+vtimezone(time_zone, first_year, last_year)
+    VTIMEZONE component of the TZID of the timed tasks: the offset in effect on January
+    1st of first_year and one observance per kind of change, with the dates of the
+    changes until last_year as RDATEs
+'''
+def vtimezone(time_zone, first_year, last_year):
+    (offset, name, is_dst), changes = timezones.transitions(time_zone, first_year, last_year)
+    observances = OrderedDict()
+    observances[(offset, offset, name, is_dst)] = [datetime(first_year, 1, 1)]
+    for local_time, offset_from, offset_to, name, is_dst in changes:
+        observances.setdefault((offset_from, offset_to, name, is_dst), []).append(local_time)
+
+    lines = ['BEGIN:VTIMEZONE', 'TZID:%s' % time_zone]
+    for (offset_from, offset_to, name, is_dst), onsets in observances.items():
+        kind = 'DAYLIGHT' if is_dst else 'STANDARD'
+        lines.append('BEGIN:%s' % kind)
+        lines.append('DTSTART:%s' % format_datetime(onsets[0]))
+        if len(onsets) > 1:
+            lines.append('RDATE:%s' % ','.join(format_datetime(onset) for onset in onsets[1:]))
+        lines.append('TZOFFSETFROM:%s' % format_offset(offset_from))
+        lines.append('TZOFFSETTO:%s' % format_offset(offset_to))
+        if name:
+            lines.append('TZNAME:%s' % escape_text(name))
+        lines.append('END:%s' % kind)
+    lines.append('END:VTIMEZONE')
+    return ''.join(fold_line(line) for line in lines)
+
+def vevent(task, time_zone):
+    start_time = task.start_time
+    end_time = task.end_time
+    lines = [
+        'BEGIN:VEVENT',
+        'UID:task-%d@calendarapp' % task.id,
+        'DTSTAMP:%s' % format_utc(utc_stamp(task.date_modified)),
+        'SUMMARY:%s' % escape_text(task.title)
+    ]
+    if task.details:
+        lines.append('DESCRIPTION:%s' % escape_text(task.details))
+    if task.color:
+        lines.append('X-TASK-COLOR:%s' % escape_text(task.color))
+
+    if task.is_recurrent:
+        year = start_time.year
+        ordinals = recurrence.occurrence_ordinals(
+            task.repetition_type,
+            task.repetition_subtype,
+            task.repetition_value,
+            date(year, 1, 1),
+            date(year, 12, 31)
+        )
+        if task.is_all_day:
+            until, value_type = date(year, 12, 31), 'DATE'
+        else:
+            until, value_type = timezones.to_utc(time_zone, datetime(year, 12, 31, 23, 59, 59)), 'DATE-TIME'
+        rule = rrule(task.repetition_type, task.repetition_subtype, task.repetition_value, until, value_type)
+        if rule is None or not ordinals:
+            return None
+        duration = end_time - start_time
+        first_day = date.fromordinal(ordinals[0])
+        start_time = datetime.combine(first_day, start_time.time())
+        end_time = start_time + duration
+
+    if task.is_all_day:
+        lines.append('DTSTART;VALUE=DATE:%s' % format_date(start_time))
+        lines.append('DTEND;VALUE=DATE:%s' % format_date(max(end_time.date(), start_time.date()) + timedelta(days=1)))
+    else:
+        lines.append('DTSTART;TZID=%s:%s' % (time_zone, format_datetime(start_time)))
+        lines.append('DTEND;TZID=%s:%s' % (time_zone, format_datetime(max(end_time, start_time))))
+    if task.is_recurrent:
+        lines.append('RRULE:%s' % rule)
+    lines.append('END:VEVENT')
+    return ''.join(fold_line(line) for line in lines)
+
+'''
+export_calendar(calendar_settings, tasks)
+    generator of the iCalendar document of a calendar, in chunks of about BUFFER_SIZE
+    characters, tasks can be any iterable (e.g. a yield_per query) so the export
+    runs in constant memory
+'''
+def export_calendar(calendar_settings, tasks):
+    yield ''.join(fold_line(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:%s' % PRODID,
+        'CALSCALE:GREGORIAN',
+        'X-WR-CALNAME:%s' % escape_text(calendar_settings.name),
+        'X-WR-CALDESC:%s' % escape_text(calendar_settings.description),
+        'X-WR-TIMEZONE:%s' % calendar_settings.time_zone
+    )) + vtimezone(calendar_settings.time_zone, calendar_settings.min_year, calendar_settings.max_year)
+    buffer = []
+    buffered = 0
+    for task in tasks:
+        event = vevent(task, calendar_settings.time_zone)
+        if event is None:
+            continue
+        buffer.append(event)
+        buffered += len(event)
+        if buffered >= BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            buffered = 0
+    buffer.append(fold_line('END:VCALENDAR'))
+    yield ''.join(buffer)
+
+'''
+iCalendar import
+    The document is read line by line and split into VEVENTs, batches of EVENTS_PER_BATCH
+    VEVENTs are parsed by a process pool into rows with the TaskForm fields, so they go
+    through the same validation and batched writes as the JSON Lines and CSV imports
+    (see importer.import_tasks). Only a bounded number of batches are in flight, the
+    whole file is never loaded.
+
+    Supported RRULEs are the ones of the Task repetition columns: weekly on one week day,
+    monthly on the first given week day and monthly on a month day (including the
+    BYMONTHDAY=28,...,n;BYSETPOS=-1 form written by the export). UNTIL and COUNT are not
+    kept, recurrent tasks repeat during the year of their start_time. UTC times and
+    times with a known TZID are converted to the time zone of the target calendar,
+    floating times and unknown TZIDs are taken as wall-clock times.
+    EXAMPLE
+        with open('calendar.ics', newline='') as stream:
+            for row in read_rows(stream, processes=4, time_zone='Europe/Madrid'):
+                ...
+'''
+
+def unescape_text(text):
+    return re.sub(
+        r'\\([\\;,nN])',
+        lambda match: '\n' if match.group(1) in 'nN' else match.group(1),
+        text
+    )
+
+'''
+unfold_lines(stream)
+    yields the content lines of a text stream, with the folded lines joined
+'''
+def unfold_lines(stream):
+    current = None
+    for line in stream:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t'):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+'''
+read_events(stream)
+    yields the content lines of every VEVENT of the stream as a list
+    (nested components such as VALARM are dropped)
+'''
+def read_events(stream):
+    event = None
+    depth = 0
+    for line in unfold_lines(stream):
+        upper = line.upper()
+        if upper == 'BEGIN:VEVENT':
+            event = []
+            depth = 0
+        elif event is None:
+            continue
+        elif upper == 'END:VEVENT':
+            yield event
+            event = None
+        elif upper.startswith('BEGIN:'):
+            depth += 1
+        elif upper.startswith('END:'):
+            depth -= 1
+        elif depth == 0:
+            event.append(line)
+
+def parse_property(line):
+    # NAME;PARAM=VALUE;...:VALUE, colons are allowed in quoted parameter values
+    in_quotes = False
+    for index, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            break
+    else:
+        raise ValueError('Invalid content line %s' % line[:32])
+    name, *params = line[:index].split(';')
+    parameters = {}
+    for param in params:
+        key, _, value = param.partition('=')
+        parameters[key.upper()] = value.strip('"')
+    return name.upper(), parameters, line[index + 1:]
+
+'''
+parse_datetime(value, parameters, time_zone=None)
+    (datetime, is_all_day) of a DATE or DATE-TIME value, DATE-TIMEs in UTC or with a
+    known TZID are converted to the wall-clock time of time_zone (when given)
+'''
+def parse_datetime(value, parameters, time_zone=None):
+    is_utc = value.upper().endswith('Z')
+    value = value.rstrip('Zz')
+    if parameters.get('VALUE', '').upper() == 'DATE' or len(value) == 8:
+        return datetime.strptime(value[:8], '%Y%m%d'), True
+    parsed = datetime.strptime(value, '%Y%m%dT%H%M%S')
+    if time_zone is not None:
+        source_zone = parameters.get('TZID')
+        if is_utc:
+            parsed = timezones.to_local(time_zone, parsed)
+        elif source_zone not in (None, time_zone) and timezones.is_valid(source_zone):
+            parsed = timezones.to_local(time_zone, timezones.to_utc(source_zone, parsed))
+    return parsed, False
+
+def parse_duration(value):
+    match = DURATION_REGEX.match(value.upper())
+    if match is None:
+        raise ValueError('Invalid DURATION %s' % value)
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(
+        weeks=int(weeks or 0),
+        days=int(days or 0),
+        hours=int(hours or 0),
+        minutes=int(minutes or 0),
+        seconds=int(seconds or 0)
+    )
+    return -duration if sign == '-' else duration
+
+'''
+repetition(rule, start_time)
+    maps an RRULE value to (repetition_type, repetition_subtype, repetition_value),
+    raises ValueError if it has no Task equivalent
+'''
+def repetition(rule, start_time):
+    parts = {}
+    for part in rule.upper().split(';'):
+        key, _, value = part.partition('=')
+        parts[key] = value
+    unsupported = ValueError('Unsupported RRULE %s' % rule)
+    if parts.get('INTERVAL', '1') != '1' or set(parts) - {'FREQ', 'INTERVAL', 'UNTIL', 'COUNT', 'WKST',
+                                                         'BYDAY', 'BYMONTHDAY', 'BYSETPOS'}:
+        raise unsupported
+    frequency = parts.get('FREQ')
+    by_day = parts.get('BYDAY')
+    by_month_day = parts.get('BYMONTHDAY')
+
+    if frequency == 'WEEKLY':
+        if by_month_day is not None or 'BYSETPOS' in parts:
+            raise unsupported
+        if by_day is None:
+            return recurrence.WEEKLY, recurrence.BY_WEEKDAY, start_time.weekday()
+        if by_day not in ICAL_WEEKDAYS:
+            raise unsupported
+        return recurrence.WEEKLY, recurrence.BY_WEEKDAY, ICAL_WEEKDAYS.index(by_day)
+
+    if frequency != 'MONTHLY' or (by_day is not None and by_month_day is not None):
+        raise unsupported
+    if by_day is not None:
+        match = re.match(r'^(\+?1)?(MO|TU|WE|TH|FR|SA|SU)$', by_day)
+        if match is None or (match.group(1) is None) != (parts.get('BYSETPOS') == '1'):
+            raise unsupported
+        return recurrence.MONTHLY, recurrence.BY_WEEKDAY, ICAL_WEEKDAYS.index(match.group(2))
+    if by_month_day is None:
+        if 'BYSETPOS' in parts:
+            raise unsupported
+        return recurrence.MONTHLY, recurrence.BY_MONTHDAY, start_time.day
+    try:
+        days = [int(day) for day in by_month_day.split(',')]
+    except ValueError:
+        raise unsupported
+    if len(days) == 1 and 'BYSETPOS' not in parts and 1 <= days[0] <= 31:
+        return recurrence.MONTHLY, recurrence.BY_MONTHDAY, days[0]
+    if parts.get('BYSETPOS') == '-1' and days == list(range(28, days[-1] + 1)) and days[-1] <= 31:
+        return recurrence.MONTHLY, recurrence.BY_MONTHDAY, days[-1]
+    raise unsupported
+
+'''
+event_row(lines, time_zone=None)
+    maps the content lines of a VEVENT to a row with the TaskForm fields, with the times
+    in time_zone (the target calendar's)
+    returns the row, or the ValueError describing why the VEVENT can not be imported
+'''
+def event_row(lines, time_zone=None):
+    try:
+        properties = {}
+        for line in lines:
+            name, parameters, value = parse_property(line)
+            # The first occurrence of a property wins
+            properties.setdefault(name, (parameters, value))
+        if 'DTSTART' not in properties:
+            raise ValueError('VEVENT without DTSTART')
+        if 'RDATE' in properties or 'RECURRENCE-ID' in properties:
+            raise ValueError('Unsupported RDATE/RECURRENCE-ID')
+
+        start_time, is_all_day = parse_datetime(properties['DTSTART'][1], properties['DTSTART'][0], time_zone)
+        if 'DTEND' in properties:
+            end_time, _ = parse_datetime(properties['DTEND'][1], properties['DTEND'][0], time_zone)
+            if is_all_day:
+                # DTEND of a whole day event is exclusive
+                end_time -= timedelta(days=1)
+        elif 'DURATION' in properties:
+            end_time = start_time + parse_duration(properties['DURATION'][1])
+            if is_all_day:
+                end_time -= timedelta(days=1)
+        else:
+            end_time = start_time
+        end_time = max(end_time, start_time)
+
+        row = {
+            'title': unescape_text(properties.get('SUMMARY', ({}, ''))[1]).strip(),
+            'color': unescape_text(
+                properties.get('X-TASK-COLOR', properties.get('COLOR', ({}, '')))[1]
+            ),
+            'details': unescape_text(properties.get('DESCRIPTION', ({}, ''))[1]),
+            'start_date': start_time.strftime('%d/%m/%Y'),
+            'start_time': start_time.strftime('%H:%M:%S'),
+            'end_date': end_time.strftime('%d/%m/%Y'),
+            'end_time': end_time.strftime('%H:%M:%S'),
+            'is_all_day': is_all_day,
+            'is_recurrent': False
+        }
+        if 'RRULE' in properties:
+            repetition_type, repetition_subtype, repetition_value = repetition(properties['RRULE'][1], start_time)
+            # The rule days are the days of DTSTART in its own zone
+            day_shift = (start_time.date() - parse_datetime(properties['DTSTART'][1], {})[0].date()).days
+            if day_shift and repetition_type == recurrence.WEEKLY:
+                repetition_value = (repetition_value + day_shift) % 7
+            elif day_shift:
+                raise ValueError('Unsupported RRULE %s: DTSTART is another day in %s' % (
+                    properties['RRULE'][1], time_zone))
+            row.update({
+                'is_recurrent': True,
+                'repetition_type': repetition_type,
+                'repetition_subtype': repetition_subtype,
+                'repetition_value': repetition_value
+            })
+        return row
+    except ValueError as e:
+        return e
+
+def parse_events(events, time_zone=None):
+    return [event_row(lines, time_zone) for lines in events]
+
+def _event_batches(stream, batch_size):
+    batch = []
+    for event in read_events(stream):
+        batch.append(event)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+'''
+read_rows(stream, processes=None, batch_size=EVENTS_PER_BATCH, time_zone=None, start_method=None)
+    yields the rows (or ValueErrors) of the VEVENTs of an iCalendar stream, in document order
+    processes: size of the parsing pool (None: one per CPU, 0 or 1: parse in this process)
+    time_zone: time zone of the rows times (see parse_datetime)
+    start_method: multiprocessing start method of the pool (None: the platform default),
+    'forkserver' from a multi-threaded process, forking it copies the locks held by the
+    other threads
+'''
+def read_rows(stream, processes=None, batch_size=EVENTS_PER_BATCH, time_zone=None, start_method=None):
+    batches = _event_batches(stream, batch_size)
+    if processes is not None and processes <= 1:
+        for batch in batches:
+            yield from parse_events(batch, time_zone)
+        return
+
+    processes = processes or os.cpu_count() or 1
+    mp_context = multiprocessing.get_context(start_method) if start_method else None
+    with ProcessPoolExecutor(max_workers=processes, mp_context=mp_context) as executor:
+        # Keep two batches per process in flight, the rest of the file is not read yet
+        pending = deque()
+        for batch in batches:
+            pending.append(executor.submit(parse_events, batch, time_zone))
+            if len(pending) >= 2 * processes:
+                yield from pending.popleft().result()
+        for future in pending:
+            yield from future.result()
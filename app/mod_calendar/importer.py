@@ -0,0 +1,237 @@
+import csv
+import io
+import json
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from werkzeug.datastructures import MultiDict
+
+from app import db, task_details_for_markup
+from app.mod_calendar import ical
+from app.mod_calendar.forms import TaskForm
+from app.mod_calendar.models import Calendar, Task
+
+FORMATS = ('jsonl', 'csv', 'ics')
+TASK_FIELDS = (
+    'title',
+    'color',
+    'details',
+    'start_date',
+    'start_time',
+    'end_date',
+    'end_time',
+    'is_all_day',
+    'is_recurrent',
+    'repetition_value',
+    'repetition_type',
+    'repetition_subtype'
+)
+
+'''
+Bulk task import
+    Rows are read from a JSON Lines or CSV stream with the TaskForm fields
+    (start_date/end_date as dd/mm/YYYY, start_time/end_time as HH:MM:SS), or from the
+    VEVENTs of an iCalendar stream, parsed by a process pool or in this process (see
+    ical.read_rows) with the times in the calendar's time zone, validated
+    with TaskForm and written with one multi-row INSERT per chunk, each chunk in its
+    own transaction. Invalid rows and failed chunks are reported and skipped, the
+    load goes on with the next rows.
+    EXAMPLE
+        with open('tasks.jsonl') as stream:
+            report = import_tasks(calendar_id, stream, 'jsonl')
+'''
+
+# iCalendar parsing pools running in this process, see parsing_processes()
+_pools_lock = threading.Lock()
+_pools_running = 0
+
+'''
+read_rows(stream, fmt, processes=None, time_zone=None, start_method=None)
+    yields the rows of the stream as dictionaries, a row that can not be parsed
+    is yielded as the ValueError describing it
+    processes, time_zone and start_method are passed to ical.read_rows
+'''
+def read_rows(stream, fmt, processes=None, time_zone=None, start_method=None):
+    if fmt == 'ics':
+        yield from ical.read_rows(stream, processes, time_zone=time_zone, start_method=start_method)
+    elif fmt == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = e
+            if not isinstance(row, (dict, ValueError)):
+                row = ValueError('Expected a JSON object')
+            yield row
+    else:
+        for row in csv.DictReader(stream):
+            yield row
+
+def text_stream(binary_stream):
+    return io.TextIOWrapper(binary_stream, encoding='utf-8', newline='')
+
+'''
+parsing_processes(processes, max_pools)
+    context manager giving the size of the iCalendar parsing pool of an upload:
+    processes while fewer than max_pools pools run in this process, 0 (parse in the
+    request thread) otherwise
+    EXAMPLE
+        with parsing_processes(4, 1) as processes:
+            report = import_tasks(calendar_id, stream, 'ics', processes=processes, start_method='forkserver')
+'''
+@contextmanager
+def parsing_processes(processes, max_pools):
+    global _pools_running
+    if processes <= 1:
+        yield 0
+        return
+    with _pools_lock:
+        granted = _pools_running < max_pools
+        if granted:
+            _pools_running += 1
+    try:
+        yield processes if granted else 0
+    finally:
+        if granted:
+            with _pools_lock:
+                _pools_running -= 1
+
+'''
+task_mapping(calendar_id, row, decorate_details)
+    validates a row with the TaskForm rules
+    returns the task table mapping, or raises ValueError with the form errors
+'''
+def task_mapping(calendar_id, row, decorate_details=False):
+    formdata = MultiDict()
+    for field in TASK_FIELDS:
+        value = row.get(field)
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            # BooleanField false values are False, 'false' and ''
+            value = 'true' if value else 'false'
+        formdata[field] = str(value)
+    form = TaskForm(formdata=formdata, meta={'csrf': False})
+    if not form.validate():
+        raise ValueError('; '.join(
+            '%s: %s' % (key, value[0]) for key, value in form.errors.items()
+            if key not in ('task_id', 'calendar_id')
+        ))
+    details = (form.details.data or '').replace("\r", "").replace("\n", "<br>")
+    return {
+        'calendar_id': calendar_id,
+        'title': form.title.data.strip(),
+        'color': form.color.data or '',
+        'details': details,
+        'details_markup': task_details_for_markup(details) if decorate_details else None,
+        'start_time': datetime.combine(form.start_date.data, form.start_time.data.time()),
+        'end_time': datetime.combine(form.end_date.data, form.end_time.data.time()),
+        'is_all_day': form.is_all_day.data,
+        'is_recurrent': form.is_recurrent.data,
+        'repetition_value': int(form.repetition_value.data or 0),
+        'repetition_type': form.repetition_type.data or '',
+        'repetition_subtype': form.repetition_subtype.data or ''
+    }
+
+'''
+max_rss_kb()
+    memory high-water mark in KB of this process and of its terminated children
+    (the iCalendar parsing pool)
+'''
+def max_rss_kb():
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    scale = 1024 if sys.platform == 'darwin' else 1
+    return {
+        'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale
+    }
+
+def _insert_chunk(mappings):
+    try:
+        db.session.execute(Task.__table__.insert().values(mappings))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return str(e).split('\n')[0]
+    return None
+
+'''
+import_tasks(calendar_id, stream, fmt, chunk_size=1000, max_errors=100, processes=None, start_method=None)
+    imports the rows of a text stream into a calendar
+    returns a report with the number of rows read, inserted and rejected, the per row
+    and per chunk errors (the first max_errors of them), the rows per second and the
+    memory high-water mark
+    a stream that can not be read any further (not UTF-8, malformed CSV) stops the load:
+    the valid rows read before are inserted and 'stopped' describes the error
+'''
+def import_tasks(calendar_id, stream, fmt, chunk_size=1000, max_errors=100, processes=None, start_method=None):
+    if fmt not in FORMATS:
+        raise ValueError('Unknown format %s, expected one of %s' % (fmt, ', '.join(FORMATS)))
+    calendar_query = Calendar.query.get(calendar_id)
+    if calendar_query is None:
+        raise ValueError('Calendar %s not found' % calendar_id)
+    decorate_details = calendar_query.auto_decorate_task_details_hyperlink
+
+    report = {
+        'rows': 0,
+        'inserted': 0,
+        'invalid': 0,
+        'failed_chunks': 0,
+        'stopped': None,
+        'errors': []
+    }
+
+    def add_error(error):
+        if len(report['errors']) < max_errors:
+            report['errors'].append(error)
+
+    def flush(chunk, first_line):
+        error = _insert_chunk(chunk)
+        if error is None:
+            report['inserted'] += len(chunk)
+        else:
+            report['failed_chunks'] += 1
+            add_error({'chunk': [first_line, first_line + len(chunk) - 1], 'error': error})
+
+    started = time.perf_counter()
+    chunk = []
+    chunk_first_line = 1
+    rows = read_rows(stream, fmt, processes, calendar_query.time_zone, start_method)
+    line = 0
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            break
+        except (UnicodeDecodeError, csv.Error) as e:
+            report['stopped'] = 'Row %d: %s' % (line + 1, e)
+            break
+        line += 1
+        report['rows'] += 1
+        try:
+            if isinstance(row, ValueError):
+                raise row
+            mapping = task_mapping(calendar_id, row, decorate_details)
+        except (ValueError, TypeError, AttributeError) as e:
+            report['invalid'] += 1
+            add_error({'row': line, 'error': str(e)})
+            continue
+        if not chunk:
+            chunk_first_line = line
+        chunk.append(mapping)
+        if len(chunk) >= chunk_size:
+            flush(chunk, chunk_first_line)
+            chunk = []
+    if chunk:
+        flush(chunk, chunk_first_line)
+
+    report['seconds'] = time.perf_counter() - started
+    report['rows_per_second'] = report['rows'] / report['seconds'] if report['seconds'] else 0.0
+    report['max_rss_kb'] = max_rss_kb()
+    return report
@@ -1,16 +1,96 @@
 # Import the database object (db) from the main application module
 # We will define this inside /app/__init__.py in the next sections.
+import base64
 import calendar
+import heapq
+from collections import namedtuple
 from datetime import date, datetime, timedelta
-from sqlalchemy import extract, and_
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
+from sqlalchemy import extract, and_, or_, select, tuple_, union_all, cast, null
 from sqlalchemy.sql import func
 from app import db
 import json
 from app.mod_base.base_model import Base
+from app.mod_calendar import recurrence, timezones
+
+'''
+Month grids, cached per (year, month, first weekday)
+    the grids are immutable tuples shared between requests and threads, they are built
+    with a calendar.Calendar of the requested first weekday instead of the process-global
+    calendar.setfirstweekday(), so calendars with different week starts do not interfere
+'''
+@lru_cache(maxsize=4096)
+def _month_grid(year, month, first_weekday):
+    return tuple(calendar.Calendar(first_weekday).itermonthdates(year, month))
+
+@lru_cache(maxsize=4096)
+def _month_weeks(year, month, first_weekday):
+    return tuple(tuple(week) for week in calendar.Calendar(first_weekday).monthdayscalendar(year, month))
+
+'''
+CalendarSettings
+    read-only snapshot of a calendar row, safe to share between requests and threads
+'''
+CalendarSettings = namedtuple('CalendarSettings', [
+    'id',
+    'name',
+    'description',
+    'min_year',
+    'max_year',
+    'time_zone',
+    'week_starting_day',
+    'emojis_enabled',
+    'auto_decorate_task_details_hyperlink',
+    'show_view_past_btn',
+    'hide_past_tasks',
+    'days_past_to_keep_hidden_tasks'
+])
+
+'''
+TaskRecord
+    read-only projection of the task columns displayed by the month views, loaded with a
+    column select: plain tuples, without ORM instances, identity map or change tracking
+'''
+class TaskRecord(namedtuple('TaskRecord', [
+    'id',
+    'title',
+    'color',
+    'details',
+    'details_markup',
+    'start_time',
+    'end_time',
+    'is_all_day',
+    'is_recurrent',
+    'repetition_value',
+    'repetition_type',
+    'repetition_subtype'
+])):
+    __slots__ = ()
+
+    '''
+    short()
+        short form representation, as Task.short()
+    '''
+    def short(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'color': self.color,
+            'start_time': self.start_time.strftime("%d/%m/%Y, %H:%M:%S"),
+            'end_time' : self.end_time.strftime("%d/%m/%Y, %H:%M:%S")
+        }
 
 # Define a User model
 class Calendar(Base):
     __tablename__ = 'calendar'
+    __table_args__ = (
+        # Keyset pagination of the home page: newest calendars first
+        db.Index('ix_calendar_date_created_id', 'date_created', 'id'),
+        # Name prefix search uses ix_calendar_name_prefix on lower(name) text_pattern_ops,
+        # a PostgreSQL expression index created by the migration
+    )
     id  = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
     description = db.Column(db.String(256), nullable=False)
@@ -60,6 +140,13 @@ class Calendar(Base):
         self.hide_past_tasks = hide_past_tasks
         self.days_past_to_keep_hidden_tasks = days_past_to_keep_hidden_tasks
 
+    '''
+    settings()
+        read-only snapshot of the calendar settings
+    '''
+    def settings(self):
+        return CalendarSettings(*(getattr(self, field) for field in CalendarSettings._fields))
+
     @staticmethod
     def month_names():
         return [
@@ -81,10 +168,6 @@ class Calendar(Base):
     def month_name(month):
         return Calendar.month_names()[month - 1]
 
-    @staticmethod
-    def set_first_weekday(weekday):
-        calendar.setfirstweekday(weekday)
-
     @staticmethod
     def weekdays(week_starting_day):
         weekdays_headers = ["MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN"]
@@ -102,18 +185,78 @@ class Calendar(Base):
         next_month_date = date(year, month, last_day_of_month) + timedelta(days=2)
         return next_month_date.month, next_month_date.year
 
+    '''
+    current_date(time_zone=None)
+        returns (day, month, year) of today in the time zone (a Calendar.time_zone name),
+        in the server local time when time_zone is None
+    '''
     @staticmethod
-    def current_date():
-        today_date = datetime.date(datetime.now())
+    def current_date(time_zone=None):
+        now = datetime.now() if time_zone is None else timezones.local_now(time_zone)
+        today_date = now.date()
         return today_date.day, today_date.month, today_date.year
 
     @staticmethod
-    def month_days(year, month):
-        return calendar.Calendar(calendar.firstweekday()).itermonthdates(year, month)
+    def month_days(year, month, week_starting_day=0):
+        return _month_grid(year, month, week_starting_day)
+
+    @staticmethod
+    def month_days_with_weekday(year, month, week_starting_day=0):
+        return _month_weeks(year, month, week_starting_day)
+
+    '''
+    encode_cursor(calendar) / decode_cursor(cursor)
+        opaque keyset cursor of the calendar listing: the (date_created, id) of the last
+        calendar of a page, decode_cursor raises ValueError for malformed cursors
+    '''
+    @staticmethod
+    def encode_cursor(calendar):
+        key = '%s|%d' % (calendar.date_created.isoformat(), calendar.id)
+        return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            key = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+            date_created, calendar_id = key.split('|')
+            return datetime.fromisoformat(date_created), int(calendar_id)
+        except (TypeError, ValueError, UnicodeDecodeError) as e:
+            raise ValueError('Invalid cursor') from e
 
+    '''
+    page(after=None, limit=10, name_prefix=None)
+        one page of calendars, newest first, with keyset pagination: the page is read from
+        ix_calendar_date_created_id after the cursor of the previous page, so every page
+        costs the same whatever its position
+        name_prefix filters by case-insensitive name prefix
+        returns (calendars, cursor of the next page or None)
+        EXAMPLE
+            calendars, next_cursor = Calendar.page(request.args.get('after'))
+    '''
     @staticmethod
-    def month_days_with_weekday(year, month):
-        return calendar.Calendar(calendar.firstweekday()).monthdayscalendar(year, month)
+    def page(after=None, limit=10, name_prefix=None):
+        query = Calendar.query
+        if name_prefix:
+            pattern = name_prefix.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            query = query.filter(func.lower(Calendar.name).like(pattern, escape='\\'))
+        if after:
+            query = query.filter(tuple_(Calendar.date_created, Calendar.id) < Calendar.decode_cursor(after))
+        calendars = query.order_by(Calendar.date_created.desc(), Calendar.id.desc()).limit(limit + 1).all()
+        if len(calendars) > limit:
+            return calendars[:limit], Calendar.encode_cursor(calendars[limit - 1])
+        return calendars, None
+
+    '''
+    short()
+        short form representation of the Calendar model
+    '''
+    def short(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'date_created': self.date_created.strftime("%d/%m/%Y, %H:%M:%S")
+        }
 
     '''
     insert()
@@ -154,12 +297,25 @@ class Calendar(Base):
 
 class Task(Base):
     __tablename__ = 'task'
+    __table_args__ = (
+        # Non recurrent tasks: calendar + [start_time, end_time) window
+        db.Index('ix_task_calendar_end_start', 'calendar_id', 'end_time', 'start_time',
+            postgresql_where=db.text('NOT is_recurrent')),
+        # Recurrent tasks: calendar + year of start_time
+        db.Index('ix_task_calendar_recurrent_start', 'calendar_id', 'start_time',
+            postgresql_where=db.text('is_recurrent')),
+        # Upcoming non recurrent tasks: calendar + start_time order
+        db.Index('ix_task_calendar_start', 'calendar_id', 'start_time',
+            postgresql_where=db.text('NOT is_recurrent')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     calendar_id = db.Column(db.Integer, db.ForeignKey('calendar.id'), nullable=False)
     title = db.Column(db.String(128), nullable=False)
     color = db.Column(db.String(32), nullable=False)
     details = db.Column(db.String(256), nullable=False)
+    # details with decorated hyperlinks, stored when the calendar auto decorates them
+    details_markup = db.Column(db.Text, nullable=True)
     start_time = db.Column(db.DateTime, nullable=False, default=func.current_timestamp())
     end_time = db.Column(db.DateTime, nullable=False, default=func.current_timestamp())
     is_all_day = db.Column(db.Boolean, nullable=False, default=False)
@@ -231,13 +387,7 @@ class Task(Base):
         return json.dumps(self.long())
 
     @staticmethod
-    def _add_task_to_task_list(tasks_list, day, month, task, view_past_tasks=True):
-        if not view_past_tasks:
-            # Check if this task should be hidden
-            start_time = datetime.now()
-            task_end_time = datetime(start_time.year, month, day, task.end_time.hour, task.end_time.minute, task.end_time.second)
-            if task_end_time < start_time:
-                return
+    def _add_task_to_task_list(tasks_list, day, month, task):
         if month not in tasks_list:
             tasks_list[month] = {}
         if day not in tasks_list[month]:
@@ -245,99 +395,303 @@ class Task(Base):
         tasks_list[month][day].append(task)
 
     @staticmethod
-    def getTasks(calendar_id, year, month, view_past_tasks):
-        tasks = {}
-        if True:
-            if view_past_tasks:
-                m, y = Calendar.previous_month_and_year(year, month)
-                start_time = datetime(y, m, 24)
-            else:
-                start_time = datetime.now()
-            m, y = Calendar.next_month_and_year(year, month)
-            end_time = datetime(y, m, 6)
+    def _one_off_filter(start_time, end_time):
+        # The non recurrent tasks in the window
+        return and_(
+            Task.is_recurrent == False,
+            Task.end_time >= start_time,
+            Task.start_time < end_time
+        )
 
-            # Query and add non recurrent tasks
-            tasks_query = Task.query.join(Calendar).filter(Task.calendar_id == calendar_id).filter(
-                Task.is_recurrent == False,
-                Task.end_time >= start_time,
-                Task.start_time < end_time
-            ).all()
-            for task in tasks_query:
+    @staticmethod
+    def _rule_filter(first_year, last_year):
+        # The recurrent tasks of the years first_year to last_year whose rule can produce an occurrence
+        return and_(
+            Task.is_recurrent == True,
+            Task.start_time >= datetime(first_year, 1, 1),
+            Task.start_time < datetime(last_year + 1, 1, 1),
+            or_(
+                # Weekly repetition: repetition_value is a week day
+                and_(
+                    Task.repetition_type == 'w',
+                    Task.repetition_value.between(0, 6)
+                ),
+                # Monthly repetition: repetition_value is a week day
+                and_(
+                    Task.repetition_type == 'm',
+                    Task.repetition_subtype == 'w',
+                    Task.repetition_value.between(0, 6)
+                ),
+                # Monthly repetition: repetition_value is a day, clamped to the month length
+                and_(
+                    Task.repetition_type == 'm',
+                    Task.repetition_subtype == 'm',
+                    Task.repetition_value.between(1, 31)
+                )
+            )
+        )
+
+    @staticmethod
+    def _range_filter(calendar_id, start_time, end_time, first_year, last_year):
+        return and_(
+            Task.calendar_id == calendar_id,
+            or_(
+                Task._one_off_filter(start_time, end_time),
+                Task._rule_filter(first_year, last_year)
+            )
+        )
+
+    @staticmethod
+    def _month_filter(calendar_id, year, month, start_time, end_time):
+        # Recurrent tasks only repeat in the year of their start_time
+        return Task._range_filter(calendar_id, start_time, end_time, year, year)
+
+    @staticmethod
+    def _month_query(calendar_id, year, month, start_time, end_time):
+        # One round trip for the whole month
+        return Task.query.filter(Task._month_filter(calendar_id, year, month, start_time, end_time))
+
+    @staticmethod
+    def _records(where):
+        columns = [Task.__table__.c[field] for field in TaskRecord._fields]
+        return map(TaskRecord._make, db.session.execute(select(columns).where(where)))
+
+    @staticmethod
+    def _month_records(calendar_id, year, month, start_time, end_time):
+        # Same rows as _month_query, as TaskRecord tuples
+        return Task._records(Task._month_filter(calendar_id, year, month, start_time, end_time))
+
+    @staticmethod
+    def _materialized_month_records(calendar_id, start_time, end_time, first_day, last_day):
+        # The non recurrent tasks of the window (day is NULL) and the materialized
+        # occurrences of the month: two indexed range scans, one round trip
+        columns = [Task.__table__.c[field] for field in TaskRecord._fields]
+        occurrence = TaskOccurrence.__table__
+        rows = db.session.execute(union_all(
+            select(columns + [cast(null(), db.Date).label('day')]).where(and_(
+                Task.calendar_id == calendar_id,
+                Task._one_off_filter(start_time, end_time)
+            )),
+            select(columns + [occurrence.c.day]).select_from(
+                occurrence.join(Task.__table__, occurrence.c.task_id == Task.id)
+            ).where(and_(
+                occurrence.c.calendar_id == calendar_id,
+                occurrence.c.day.between(first_day, last_day)
+            ))
+        ))
+        for row in rows:
+            values = tuple(row)
+            yield TaskRecord._make(values[:-1]), values[-1]
+
+    '''
+    getMonthVersion(calendar_id, year, month, week_starting_day=0)
+        returns (number of tasks, latest date_modified) of the tasks a month view displays,
+        with a single aggregate query, to build cheap ETags
+    '''
+    @staticmethod
+    def getMonthVersion(calendar_id, year, month, week_starting_day=0):
+        start_time, end_time = Task._month_window(year, month, week_starting_day)
+        return db.session.query(func.count(Task.id), func.max(Task.date_modified)).filter(
+            Task._month_filter(calendar_id, year, month, start_time, end_time)
+        ).one()
+
+    @staticmethod
+    def _month_window(year, month, week_starting_day=0):
+        # The window covers the days of the neighbour months displayed in the grid
+        month_days = Calendar.month_days(year, month, week_starting_day)
+        start_time = datetime(month_days[0].year, month_days[0].month, month_days[0].day)
+        end_time = datetime(month_days[-1].year, month_days[-1].month, month_days[-1].day) + timedelta(days=1)
+        return start_time, end_time
+
+    '''
+    getTasks(calendar_id, year, month, view_past_tasks, week_starting_day=0, read_only=False, time_zone=None,
+             keep_days=0, materialized=False)
+        returns the tasks of a month view indexed by month and day
+        read_only: the tasks are TaskRecord tuples instead of Task instances, for views that
+        only display them
+        time_zone: the calendar's time zone, the past tasks are hidden according to its
+        current time (server local time when None)
+        keep_days: when the past tasks are hidden, the ones ended in the last keep_days days
+        are still displayed (Calendar.days_past_to_keep_hidden_tasks)
+        materialized: the occurrences of the recurrent tasks are read from task_occurrence
+        instead of being expanded, the month must be in the materialized horizon
+        (occurrence_store.covers), the tasks are TaskRecord tuples
+    '''
+    @staticmethod
+    def getTasks(calendar_id, year, month, view_past_tasks, week_starting_day=0, read_only=False, time_zone=None,
+                 keep_days=0, materialized=False):
+        tasks = {}
+        start_time, end_time = Task._month_window(year, month, week_starting_day)
+        cutoff = Task._cutoff(view_past_tasks, time_zone, keep_days)
+        if cutoff is not None:
+            # The non recurrent tasks ended before the cutoff are not loaded
+            start_time = max(start_time, cutoff)
+
+        first_day = date(year, month, 1)
+        last_day = date(year, month, calendar.monthrange(year, month)[1])
+        if materialized:
+            for task, day in Task._materialized_month_records(calendar_id, start_time, end_time, first_day, last_day):
+                if day is None:
+                    Task._add_task_to_task_list(tasks, task.start_time.day, task.start_time.month, task)
+                elif day >= Task._first_visible_day(task, first_day, cutoff):
+                    Task._add_task_to_task_list(tasks, day.day, month, task)
+            return tasks
+
+        if read_only:
+            rows = Task._month_records(calendar_id, year, month, start_time, end_time)
+        else:
+            rows = Task._month_query(calendar_id, year, month, start_time, end_time)
+        recurrent_tasks = []
+        for task in rows:
+            if not task.is_recurrent:
                 task_day = task.start_time.day
                 task_month = task.start_time.month
                 Task._add_task_to_task_list(tasks, task_day, task_month, task)
+            else:
+                recurrent_tasks.append(task)
+
+        first_ordinal = first_day.toordinal()
+        for task in recurrent_tasks:
+            for ordinal in recurrence.occurrence_ordinals(
+                task.repetition_type,
+                task.repetition_subtype,
+                task.repetition_value,
+                Task._first_visible_day(task, first_day, cutoff),
+                last_day
+            ):
+                day = ordinal - first_ordinal + 1
+                Task._add_task_to_task_list(tasks, day, month, task)
 
-            # Query and add recurrent tasks
-            recurrent_tasks_query = Task.query.join(Calendar).filter(Task.calendar_id == calendar_id).filter(
-                Task.is_recurrent == True,
-                extract('year', Task.start_time) == year
-            ).all()
-            for task in recurrent_tasks_query:
-                monthly_repetition_done = False
-                for week in Calendar.month_days_with_weekday(year, month):
-                    for weekday, day in enumerate(week):
-                        if day == 0:
-                            continue
-                        if task.repetition_type == 'w':
-                            # Weekly repetition: repetition_value is a week day
-                            if task.repetition_value == weekday:
-                                Task._add_task_to_task_list(tasks, day, month, task, view_past_tasks)
-                        elif task.repetition_type == 'm':
-                            if task.repetition_subtype == 'w':
-                                # Monthly repetition: repetition_value is a week day
-                                if task.repetition_value == weekday and not monthly_repetition_done:
-                                    Task._add_task_to_task_list(tasks, day, month, task, view_past_tasks)
-                                    monthly_repetition_done = True
-                            elif task.repetition_subtype == 'm':
-                                # Monthly repetition: repetition_value is a day
-                                if task.repetition_value == day:
-                                    Task._add_task_to_task_list(tasks, day, month, task, view_past_tasks)
-        else:
-            today = datetime.today()
-            today = datetime(today.year, today.month, today.day)
-            #last_day = Calendar.month_days(year, month)
-
-            if view_past_tasks:
-                past_tasks_query = Task.query.join(Calendar).filter(Task.calendar_id == calendar_id).filter(
-                    Task.is_recurrent == False,
-                    Task.start_time < today,
-                    extract('year', Task.start_time) == year
-                ).all()
-
-                for el in past_tasks_query:
-                    task_day = el.start_time.day
-                    task_month = el.start_time.month
-                    if task_month not in tasks:
-                        tasks[task_month] = {}
-                    if task_day not in tasks[task_month]:
-                        tasks[task_month][task_day] = []
-                    # tasks[str(month)][str(task_day)].append(el)
-                    tasks[task_month][task_day].append(el)
-
-            upcoming_tasks_query = Task.query.join(Calendar).filter(Task.calendar_id == calendar_id).filter(
+        return tasks
+
+    '''
+    getTasksRange(calendar_id, first_day, last_day, view_past_tasks=True, time_zone=None, keep_days=0)
+        returns the occurrences between the dates first_day and last_day (both included),
+        grouped by month and day in date order: [((year, month), [(day, [tasks])])],
+        the tasks of a day sorted by start time
+        one query for the whole range and one recurrence expansion pass, the tasks are
+        TaskRecord tuples
+        EXAMPLE
+            for (year, month), days in Task.getTasksRange(1, date(2020, 1, 1), date(2020, 12, 31)):
+                for day, tasks in days:
+                    ...
+    '''
+    @staticmethod
+    def getTasksRange(calendar_id, first_day, last_day, view_past_tasks=True, time_zone=None, keep_days=0):
+        start_time = datetime(first_day.year, first_day.month, first_day.day)
+        end_time = datetime(last_day.year, last_day.month, last_day.day) + timedelta(days=1)
+        cutoff = Task._cutoff(view_past_tasks, time_zone, keep_days)
+        if cutoff is not None:
+            start_time = max(start_time, cutoff)
+
+        first_ordinal = first_day.toordinal()
+        last_ordinal = last_day.toordinal()
+        occurrences = {}
+        for task in Task._records(Task._range_filter(calendar_id, start_time, end_time, first_day.year, last_day.year)):
+            if not task.is_recurrent:
+                # Placed on their start day, as in the month view
+                ordinal = task.start_time.toordinal()
+                if first_ordinal <= ordinal <= last_ordinal:
+                    occurrences.setdefault(ordinal, []).append(task)
+                continue
+            # Recurrent tasks only repeat in the year of their start_time
+            year = task.start_time.year
+            for ordinal in recurrence.occurrence_ordinals(
+                task.repetition_type,
+                task.repetition_subtype,
+                task.repetition_value,
+                Task._first_visible_day(task, max(first_day, date(year, 1, 1)), cutoff),
+                min(last_day, date(year, 12, 31))
+            ):
+                occurrences.setdefault(ordinal, []).append(task)
+
+        # One sweep over the days of the range, no sort of the whole range
+        months = []
+        for ordinal in range(first_ordinal, last_ordinal + 1):
+            day_tasks = occurrences.get(ordinal)
+            if day_tasks is None:
+                continue
+            day = date.fromordinal(ordinal)
+            if not months or months[-1][0] != (day.year, day.month):
+                months.append(((day.year, day.month), []))
+            day_tasks.sort(key=Task._start_clock)
+            months[-1][1].append((day, day_tasks))
+        return months
+
+    '''
+    getUpcoming(calendar_id, limit, time_zone=None, max_year=None)
+        returns the next limit occurrences starting from now, as (start, end, task) tuples in
+        start order, the tasks are TaskRecord tuples
+        the non recurrent tasks are read in start_time order (ix_task_calendar_start, at most
+        limit rows) and merged with a heap with the occurrences of the recurrent tasks, which
+        are generated on demand: the merge stops as soon as limit occurrences are produced
+    '''
+    @staticmethod
+    def getUpcoming(calendar_id, limit, time_zone=None, max_year=None):
+        now = datetime.now() if time_zone is None else timezones.local_now(time_zone)
+        columns = [Task.__table__.c[field] for field in TaskRecord._fields]
+        one_offs = db.session.execute(
+            select(columns).where(and_(
+                Task.calendar_id == calendar_id,
                 Task.is_recurrent == False,
-                Task.start_time >= today,
-                extract('year', Task.start_time) == year,
-                extract('month', Task.start_time) == month
-            ).all()
-            #upcoming_tasks_query = Task.query.filter(Task.calendar_id == calendar_id).all()
-
-            for el in upcoming_tasks_query:
-                task_day = el.start_time.day
-                task_month = el.start_time.month
-                if task_month not in tasks:
-                    tasks[task_month] = {}
-                if task_day not in tasks[task_month]:
-                    tasks[task_month][task_day] = []
-                # tasks[str(month)][str(task_day)].append(el)
-                tasks[task_month][task_day].append(el)
-
-            recurrent_tasks_query = Task.query.join(Calendar).filter(Task.calendar_id == calendar_id).filter(
-                Task.is_recurrent == True,
-                extract('year', Task.start_time) == year
-            ).all()
+                Task.start_time >= now
+            )).order_by(Task.start_time).limit(limit)
+        )
+        # Recurrent tasks only repeat in the year of their start_time
+        rules = Task._records(and_(
+            Task.calendar_id == calendar_id,
+            Task.is_recurrent == True,
+            Task.start_time >= datetime(now.year, 1, 1),
+            Task.start_time < datetime((max_year or now.year) + 1, 1, 1)
+        ))
+        streams = [((task.start_time, task.end_time, task) for task in map(TaskRecord._make, one_offs))]
+        streams.extend(Task._upcoming_occurrences(task, now) for task in rules)
+        return list(islice(heapq.merge(*streams, key=itemgetter(0)), limit))
 
-        return tasks
+    @staticmethod
+    def _upcoming_occurrences(task, now):
+        year = task.start_time.year
+        start_clock = task.start_time.time()
+        end_clock = task.end_time.time()
+        for ordinal in recurrence.iter_occurrence_ordinals(
+            task.repetition_type,
+            task.repetition_subtype,
+            task.repetition_value,
+            max(now.date(), date(year, 1, 1)),
+            date(year, 12, 31)
+        ):
+            day = date.fromordinal(ordinal)
+            start = datetime.combine(day, start_clock)
+            # Only the occurrence of today can have started already
+            if start >= now:
+                yield start, datetime.combine(day, end_clock), task
+
+    @staticmethod
+    def _start_clock(task):
+        return task.start_time.time()
+
+    '''
+    _cutoff(view_past_tasks, time_zone, keep_days)
+        the occurrences ended before the cutoff are hidden, None when the past tasks are viewed
+        computed once per request, in the wall clock time of the calendar
+    '''
+    @staticmethod
+    def _cutoff(view_past_tasks, time_zone, keep_days):
+        if view_past_tasks:
+            return None
+        now = datetime.now() if time_zone is None else timezones.local_now(time_zone)
+        return now - timedelta(days=keep_days)
+
+    @staticmethod
+    def _first_visible_day(task, first_day, cutoff):
+        # An occurrence ends on its day at the end_time clock: the first one not ended at
+        # the cutoff starts the expansion, the past ones are never generated
+        if cutoff is None:
+            return first_day
+        ordinal = cutoff.toordinal()
+        if task.end_time.time() < cutoff.time():
+            ordinal += 1
+        return max(first_day, date.fromordinal(ordinal))
 
     # @staticmethod
     # def getTask(calendar_id, task_id, is_recurrent, year, month, day):
@@ -397,3 +751,31 @@ class Task(Base):
     '''
     def update(self):
         db.session.commit()
+
+'''
+TaskOccurrence
+    materialized occurrence of a recurrent task, for the days of the occurrence horizon
+    (see app/mod_calendar/occurrences.py), month views read them with a range scan of
+    ix_task_occurrence_calendar_day
+'''
+class TaskOccurrence(db.Model):
+    __tablename__ = 'task_occurrence'
+    __table_args__ = (
+        db.Index('ix_task_occurrence_calendar_day', 'calendar_id', 'day'),
+    )
+
+    task_id = db.Column(db.Integer, db.ForeignKey('task.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    calendar_id = db.Column(db.Integer, db.ForeignKey('calendar.id', ondelete='CASCADE'), nullable=False)
+
+'''
+OccurrenceHorizon
+    single row: the days [first_day, last_day] materialized in task_occurrence
+'''
+class OccurrenceHorizon(db.Model):
+    __tablename__ = 'occurrence_horizon'
+
+    id = db.Column(db.Integer, primary_key=True)
+    first_day = db.Column(db.Date, nullable=False)
+    last_day = db.Column(db.Date, nullable=False)
+    date_modified = db.Column(db.DateTime, default=func.current_timestamp(), server_default=func.current_timestamp(), onupdate=func.current_timestamp())
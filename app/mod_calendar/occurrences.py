@@ -0,0 +1,253 @@
+import calendar
+import threading
+import time
+from datetime import date
+
+from sqlalchemy import and_, select
+
+from app import db
+from app.mod_calendar import recurrence
+from app.mod_calendar.models import OccurrenceHorizon, Task, TaskOccurrence
+
+# Occurrence rows written per INSERT by rebuild() and advance()
+ROWS_PER_INSERT = 5000
+
+'''
+Materialized occurrences (optional, OCCURRENCES_ENABLED)
+    The occurrences of the recurrent tasks are stored in task_occurrence for a rolling
+    horizon of OCCURRENCES_HORIZON_MONTHS months from the current month, so the month
+    views inside the horizon read them with a range scan instead of expanding the rules.
+    - rebuild(): recomputes the whole table (manage.py rebuild_occurrences)
+    - advance(): the incremental job, run daily (manage.py advance_occurrences): the
+      months entering the horizon are expanded, the rows of the days that left it are
+      deleted one run later, so workers with a cached horizon still find their rows
+    - refresh_task(), remove_task(), refresh_calendar(): called by the task and calendar
+      writes; when one fails the horizon is dropped, the views expand the rules again
+      until the next rebuild
+    - check(): compares the stored occurrences with the on-the-fly expansion
+    The horizon is cached per process for OCCURRENCES_HORIZON_TTL seconds.
+    EXAMPLE
+        materialized = occurrence_store.covers_month(year, month)
+        tasks = Task.getTasks(calendar_id, year, month, True, read_only=True, materialized=materialized)
+'''
+
+def rolling_horizon(today, months):
+    year, month = divmod(today.year * 12 + today.month - 1 + months - 1, 12)
+    month += 1
+    return date(today.year, today.month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+'''
+task_days(task, first_day, last_day)
+    the ordinals of the occurrences of a recurrent task between first_day and last_day,
+    as Task.getTasks expands them: only in the year of the task start_time
+'''
+def task_days(task, first_day, last_day):
+    year = task.start_time.year
+    return recurrence.occurrence_ordinals(
+        task.repetition_type,
+        task.repetition_subtype,
+        task.repetition_value,
+        max(first_day, date(year, 1, 1)),
+        min(last_day, date(year, 12, 31))
+    )
+
+def _rules(where):
+    columns = [Task.id, Task.calendar_id, Task.start_time, Task.repetition_type, Task.repetition_subtype,
+               Task.repetition_value]
+    return db.session.execute(select(columns).where(where))
+
+def _insert(rows):
+    if rows:
+        db.session.execute(TaskOccurrence.__table__.insert(), rows)
+
+def _materialize(where, first_day, last_day):
+    rows = []
+    inserted = 0
+    for task in _rules(and_(where, Task._rule_filter(first_day.year, last_day.year))):
+        for ordinal in task_days(task, first_day, last_day):
+            rows.append({'task_id': task.id, 'calendar_id': task.calendar_id, 'day': date.fromordinal(ordinal)})
+        if len(rows) >= ROWS_PER_INSERT:
+            _insert(rows)
+            inserted += len(rows)
+            rows = []
+    _insert(rows)
+    return inserted + len(rows)
+
+class OccurrenceStore():
+    def __init__(self):
+        self.enabled = False
+        self.horizon_months = 18
+        self.ttl = 60
+        self._lock = threading.Lock()
+        self._horizon = None
+        self._expires_at = 0.0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('OCCURRENCES_ENABLED', False)
+        self.horizon_months = app.config.get('OCCURRENCES_HORIZON_MONTHS', 18)
+        self.ttl = app.config.get('OCCURRENCES_HORIZON_TTL', 60)
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._horizon = None
+            self._expires_at = 0.0
+
+    '''
+    horizon()
+        (first_day, last_day) of the materialized days, None before the first rebuild
+    '''
+    def horizon(self):
+        now = time.monotonic()
+        with self._lock:
+            if now < self._expires_at:
+                return self._horizon
+        row = OccurrenceHorizon.query.get(1)
+        horizon = (row.first_day, row.last_day) if row is not None else None
+        with self._lock:
+            self._horizon = horizon
+            self._expires_at = now + self.ttl
+        return horizon
+
+    def covers(self, first_day, last_day):
+        if not self.enabled:
+            return False
+        horizon = self.horizon()
+        return horizon is not None and horizon[0] <= first_day and last_day <= horizon[1]
+
+    def covers_month(self, year, month):
+        return self.covers(date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1]))
+
+    def _set_horizon(self, first_day, last_day):
+        row = OccurrenceHorizon.query.get(1)
+        if row is None:
+            db.session.add(OccurrenceHorizon(id=1, first_day=first_day, last_day=last_day))
+        else:
+            row.first_day = first_day
+            row.last_day = last_day
+
+    def _drop_horizon(self, error):
+        print('Materialized occurrences disabled until the next rebuild: %s' % error)
+        db.session.rollback()
+        OccurrenceHorizon.query.filter(OccurrenceHorizon.id == 1).delete()
+        db.session.commit()
+        self.clear()
+
+    def _maintain(self, delete_where, materialize_where):
+        if not self.enabled:
+            return
+        try:
+            # Not the cached horizon: the rows must cover the horizon the job last set
+            row = OccurrenceHorizon.query.get(1)
+            if row is None:
+                return
+            TaskOccurrence.query.filter(delete_where).delete(synchronize_session=False)
+            if materialize_where is not None:
+                _materialize(materialize_where, row.first_day, row.last_day)
+            db.session.commit()
+        except Exception as e:
+            self._drop_horizon(e)
+
+    '''
+    refresh_task(task) / remove_task(task_id) / refresh_calendar(calendar_id) / remove_calendar(calendar_id)
+        keep the occurrences of a written task or calendar up to date, after the write is
+        committed (remove_* before the delete)
+    '''
+    def refresh_task(self, task):
+        self._maintain(TaskOccurrence.task_id == task.id, Task.id == task.id)
+
+    def remove_task(self, task_id):
+        self._maintain(TaskOccurrence.task_id == task_id, None)
+
+    def refresh_calendar(self, calendar_id):
+        self._maintain(TaskOccurrence.calendar_id == calendar_id, Task.calendar_id == calendar_id)
+
+    def remove_calendar(self, calendar_id):
+        self._maintain(TaskOccurrence.calendar_id == calendar_id, None)
+
+    '''
+    rebuild(today=None)
+        recomputes every occurrence of the horizon starting at the month of today
+        returns a report: the horizon and the rows deleted and written
+    '''
+    def rebuild(self, today=None):
+        first_day, last_day = rolling_horizon(today or date.today(), self.horizon_months)
+        deleted = TaskOccurrence.query.delete(synchronize_session=False)
+        inserted = _materialize(Task.id.isnot(None), first_day, last_day)
+        self._set_horizon(first_day, last_day)
+        db.session.commit()
+        self.clear()
+        return {'first_day': first_day.isoformat(), 'last_day': last_day.isoformat(), 'deleted': deleted,
+                'inserted': inserted}
+
+    '''
+    advance(today=None)
+        moves the horizon to the month of today: expands the months entering the horizon
+        and deletes the rows before the previous horizon, rebuilds when there is none
+        returns a report as rebuild()
+    '''
+    def advance(self, today=None):
+        row = OccurrenceHorizon.query.get(1)
+        if row is None:
+            return self.rebuild(today)
+        first_day, last_day = rolling_horizon(today or date.today(), self.horizon_months)
+        deleted = TaskOccurrence.query.filter(TaskOccurrence.day < row.first_day).delete(
+            synchronize_session=False)
+        inserted = 0
+        if last_day > row.last_day:
+            inserted = _materialize(Task.id.isnot(None), date.fromordinal(row.last_day.toordinal() + 1), last_day)
+        first_day, last_day = max(first_day, row.first_day), max(last_day, row.last_day)
+        self._set_horizon(first_day, last_day)
+        db.session.commit()
+        self.clear()
+        return {'first_day': first_day.isoformat(), 'last_day': last_day.isoformat(), 'deleted': deleted,
+                'inserted': inserted}
+
+    '''
+    check(calendar_id=None)
+        compares the stored occurrences of the horizon with the expansion of the rules
+        returns a report: the tasks and occurrences checked, the missing and extra rows and
+        the ids of the inconsistent tasks
+    '''
+    def check(self, calendar_id=None):
+        row = OccurrenceHorizon.query.get(1)
+        if row is None:
+            return {'consistent': False, 'message': 'No materialized horizon, run rebuild_occurrences'}
+        first_day, last_day = row.first_day, row.last_day
+
+        stored = {}
+        query = db.session.query(TaskOccurrence.task_id, TaskOccurrence.day).filter(
+            TaskOccurrence.day.between(first_day, last_day))
+        if calendar_id is not None:
+            query = query.filter(TaskOccurrence.calendar_id == calendar_id)
+        for task_id, day in query:
+            stored.setdefault(task_id, set()).add(day.toordinal())
+
+        expected = {}
+        where = Task.id.isnot(None) if calendar_id is None else Task.calendar_id == calendar_id
+        for task in _rules(and_(where, Task._rule_filter(first_day.year, last_day.year))):
+            ordinals = set(task_days(task, first_day, last_day))
+            if ordinals:
+                expected[task.id] = ordinals
+
+        missing = extra = 0
+        inconsistent = []
+        for task_id in sorted(set(stored) | set(expected)):
+            stored_days = stored.get(task_id, set())
+            expected_days = expected.get(task_id, set())
+            if stored_days != expected_days:
+                missing += len(expected_days - stored_days)
+                extra += len(stored_days - expected_days)
+                inconsistent.append(task_id)
+        return {
+            'consistent': not inconsistent,
+            'first_day': first_day.isoformat(),
+            'last_day': last_day.isoformat(),
+            'tasks': len(expected),
+            'occurrences': sum(len(days) for days in expected.values()),
+            'missing': missing,
+            'extra': extra,
+            'inconsistent_tasks': inconsistent[:100]
+        }
+
+occurrence_store = OccurrenceStore()
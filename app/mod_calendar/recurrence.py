@@ -0,0 +1,123 @@
+import calendar
+from datetime import date
+
+# Task.repetition_type values
+WEEKLY = 'w'
+MONTHLY = 'm'
+# Task.repetition_subtype values for monthly repetitions
+BY_WEEKDAY = 'w'
+BY_MONTHDAY = 'm'
+
+'''
+Recurrence expansion
+    Occurrences are computed arithmetically on date ordinals (date.toordinal()),
+    without walking the days of the window:
+    - weekly: repetition_value is a week day (0: Monday, 6: Sunday)
+    - monthly by week day: repetition_value is a week day, the nth one of each month
+      is used (1 is the first one, -1 the last one)
+    - monthly by day: repetition_value is a month day, clamped to the last day of
+      shorter months (31 is the 30th in April and the 28th or 29th in February)
+'''
+
+def _months(first, last):
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        yield year, month
+        if month == 12:
+            year, month = year + 1, 1
+        else:
+            month += 1
+
+def weekly_ordinals(weekday, first, last):
+    first_ordinal = first.toordinal()
+    offset = (weekday - first.weekday()) % 7
+    return range(first_ordinal + offset, last.toordinal() + 1, 7)
+
+def nth_weekday(year, month, weekday, nth=1):
+    first_weekday, days_in_month = calendar.monthrange(year, month)
+    if nth > 0:
+        day = 1 + (weekday - first_weekday) % 7 + 7 * (nth - 1)
+    else:
+        last_weekday = (first_weekday + days_in_month - 1) % 7
+        day = days_in_month - (last_weekday - weekday) % 7 + 7 * (nth + 1)
+    if day < 1 or day > days_in_month:
+        return None
+    return day
+
+def clamped_monthday(year, month, day):
+    return min(day, calendar.monthrange(year, month)[1])
+
+'''
+occurrence_ordinals(repetition_type, repetition_subtype, repetition_value, first, last, nth=1)
+    returns the ordinals of the occurrences of a rule between the dates first and last (both included)
+    unknown rules have no occurrences
+'''
+def occurrence_ordinals(repetition_type, repetition_subtype, repetition_value, first, last, nth=1):
+    if last < first:
+        return []
+    if repetition_type == WEEKLY:
+        if not 0 <= repetition_value <= 6:
+            return []
+        return weekly_ordinals(repetition_value, first, last)
+    if repetition_type != MONTHLY:
+        return []
+
+    first_ordinal = first.toordinal()
+    last_ordinal = last.toordinal()
+    ordinals = []
+    for year, month in _months(first, last):
+        if repetition_subtype == BY_WEEKDAY:
+            if not 0 <= repetition_value <= 6:
+                return []
+            day = nth_weekday(year, month, repetition_value, nth)
+            if day is None:
+                continue
+        elif repetition_subtype == BY_MONTHDAY:
+            if not 1 <= repetition_value <= 31:
+                return []
+            day = clamped_monthday(year, month, repetition_value)
+        else:
+            return []
+        ordinal = date(year, month, day).toordinal()
+        if first_ordinal <= ordinal <= last_ordinal:
+            ordinals.append(ordinal)
+    return ordinals
+
+'''
+expand(rules, first, last)
+    rules: iterable of (key, repetition_type, repetition_subtype, repetition_value) tuples
+    returns the (ordinal, key) tuples of every occurrence between first and last (both included),
+    sorted by ordinal
+    EXAMPLE
+        rules = [(task.id, task.repetition_type, task.repetition_subtype, task.repetition_value)]
+        for ordinal, task_id in expand(rules, date(2020, 1, 1), date(2020, 12, 31)):
+            day = date.fromordinal(ordinal)
+'''
+def expand(rules, first, last):
+    occurrences = []
+    for key, repetition_type, repetition_subtype, repetition_value in rules:
+        occurrences.extend(
+            (ordinal, key)
+            for ordinal in occurrence_ordinals(repetition_type, repetition_subtype, repetition_value, first, last)
+        )
+    occurrences.sort(key=lambda occurrence: occurrence[0])
+    return occurrences
+
+'''
+iter_occurrence_ordinals(repetition_type, repetition_subtype, repetition_value, first, last)
+    same ordinals as occurrence_ordinals, generated on demand: the monthly rules are expanded
+    one month at a time, so a consumer that stops early does not pay for the whole window
+'''
+def iter_occurrence_ordinals(repetition_type, repetition_subtype, repetition_value, first, last):
+    if repetition_type != MONTHLY:
+        # Weekly occurrences are already a lazy range
+        yield from occurrence_ordinals(repetition_type, repetition_subtype, repetition_value, first, last)
+        return
+    for year, month in _months(first, last):
+        yield from occurrence_ordinals(
+            repetition_type,
+            repetition_subtype,
+            repetition_value,
+            max(first, date(year, month, 1)),
+            min(last, date(year, month, calendar.monthrange(year, month)[1]))
+        )
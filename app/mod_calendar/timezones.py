@@ -0,0 +1,95 @@
+import bisect
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import pytz
+
+'''
+Calendar time zones
+    Task times are stored as naive wall clock times of the calendar's time zone
+    (Calendar.time_zone), as they are entered in the task form. Month windows are built
+    from those wall clock dates and need no conversion, only "now" has to be moved from
+    UTC to the calendar's zone, once per request:
+    - zones are resolved once per process (zone_info), unknown names fall back to UTC
+    - the UTC offset of a zone is memoized per UTC day (_day_offset); the days with a
+      daylight saving transition are converted exactly
+    EXAMPLE
+        today = local_now(calendar_settings.time_zone).date()
+'''
+
+@lru_cache(maxsize=1024)
+def zone_info(time_zone):
+    try:
+        return pytz.timezone(time_zone or 'UTC')
+    except pytz.UnknownTimeZoneError:
+        print('Unknown time zone %r, using UTC' % time_zone)
+        return pytz.utc
+
+@lru_cache(maxsize=1024)
+def is_valid(time_zone):
+    try:
+        pytz.timezone(time_zone)
+    except (pytz.UnknownTimeZoneError, AttributeError):
+        return False
+    return True
+
+def _offset(zone, utc_time):
+    return zone.fromutc(utc_time.replace(tzinfo=zone)).utcoffset()
+
+'''
+_day_offset(time_zone, utc_ordinal)
+    UTC offset of the zone for the whole UTC day utc_ordinal (date.toordinal()),
+    None when the offset changes during the day
+'''
+@lru_cache(maxsize=4096)
+def _day_offset(time_zone, utc_ordinal):
+    zone = zone_info(time_zone)
+    day = datetime.fromordinal(utc_ordinal)
+    offset = _offset(zone, day)
+    if _offset(zone, day + timedelta(days=1) - timedelta(microseconds=1)) != offset:
+        return None
+    return offset
+
+'''
+to_local(time_zone, utc_time)
+    naive wall clock time of the zone at the naive UTC time utc_time
+'''
+def to_local(time_zone, utc_time):
+    offset = _day_offset(time_zone, utc_time.toordinal())
+    if offset is None:
+        offset = _offset(zone_info(time_zone), utc_time)
+    return utc_time + offset
+
+def local_now(time_zone):
+    return to_local(time_zone, datetime.utcnow())
+
+def to_utc(time_zone, local_time):
+    zone = zone_info(time_zone)
+    return zone.localize(local_time).astimezone(pytz.utc).replace(tzinfo=None)
+
+'''
+transitions(time_zone, first_year, last_year)
+    UTC offset changes of the zone from first_year to last_year, as they are applied by
+    to_local, for VTIMEZONE components
+    returns the (offset, name, is_dst) in effect at the start of first_year and the list
+    of changes (local_time, offset_from, offset_to, name, is_dst), local_time being the
+    wall clock time of the change before it happens
+'''
+def transitions(time_zone, first_year, last_year):
+    zone = zone_info(time_zone)
+    start = datetime(first_year, 1, 1)
+    utc_times = getattr(zone, '_utc_transition_times', None)
+    if not utc_times:
+        return (zone.utcoffset(start), zone.tzname(start), False), []
+
+    end = datetime(last_year + 1, 1, 1)
+    index = max(bisect.bisect_right(utc_times, start) - 1, 0)
+    offset, dst, name = zone._transition_info[index]
+    initial = (offset, name, bool(dst))
+    changes = []
+    for utc_time, (offset_to, dst, name) in zip(utc_times[index + 1:], zone._transition_info[index + 1:]):
+        if utc_time >= end:
+            break
+        changes.append((utc_time + offset, offset, offset_to, name, bool(dst)))
+        offset = offset_to
+    return initial, changes
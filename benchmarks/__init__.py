@@ -0,0 +1 @@
+__all__ = ['bench_auth', 'bench_recurrence', 'bench_markup', 'bench_projection', 'bench_workers', 'load_pool', 'seed', 'suite']
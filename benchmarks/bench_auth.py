@@ -0,0 +1,76 @@
+'''
+Per-request authentication overhead, with and without the verified-token cache.
+
+The signing keys are generated locally and served from a jwks.json file, so the
+benchmark runs offline and only measures the RS256 verification and claims checks.
+
+    python -m benchmarks.bench_auth [requests]
+'''
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+from Crypto.PublicKey import RSA
+from jose import jwt
+
+import app.mod_auth.auth as auth
+from app.mod_auth.jwks import JWKSCache
+from app.mod_auth.tokens import TokenCache
+
+KID = 'benchmark-key'
+
+def _b64_uint(value):
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+'''
+signed_token(jwks_dir, ttl, permissions)
+    generates an RSA key, writes its jwks.json into jwks_dir and returns
+    (jwks_path, token) where token is an RS256 token accepted by verify_decode_jwt
+'''
+def signed_token(jwks_dir, ttl=3600, permissions=('get:calendars',)):
+    key = RSA.generate(2048)
+    jwks_path = os.path.join(jwks_dir, 'jwks.json')
+    with open(jwks_path, 'w') as jwks_file:
+        json.dump({'keys': [{
+            'kty': 'RSA',
+            'kid': KID,
+            'use': 'sig',
+            'n': _b64_uint(key.n),
+            'e': _b64_uint(key.e)
+        }]}, jwks_file)
+    now = int(time.time())
+    token = jwt.encode({
+        'iss': 'https://' + auth.AUTH0_DOMAIN + '/',
+        'aud': auth.API_AUDIENCE,
+        'sub': 'benchmark|user',
+        'iat': now,
+        'exp': now + ttl,
+        'permissions': list(permissions)
+    }, key.export_key('PEM').decode('ascii'), algorithm='RS256', headers={'kid': KID})
+    return jwks_path, token
+
+def run(requests=2000):
+    with tempfile.TemporaryDirectory() as jwks_dir:
+        jwks_path, token = signed_token(jwks_dir)
+        auth.jwks_cache = JWKSCache(jwks_path)
+
+        results = {}
+        for label, size in (('cache_off', 0), ('cache_on', 1024)):
+            auth.token_cache = TokenCache(size)
+            auth.verify_decode_jwt_cached(token)
+            seconds = timeit.timeit(lambda: auth.verify_decode_jwt_cached(token), number=requests)
+            results[label] = {
+                'requests': requests,
+                'us_per_request': seconds / requests * 1e6
+            }
+        results['speedup'] = results['cache_off']['us_per_request'] / results['cache_on']['us_per_request']
+        return results
+
+if __name__ == '__main__':
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(json.dumps(run(requests), indent=4))
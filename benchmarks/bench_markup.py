@@ -0,0 +1,66 @@
+'''
+Hyperlink decoration of the task details for a month with 2k tasks:
+the former per-call re.split, the memoized task_details_for_markup and the
+details_markup stored with the task at write time.
+
+    python -m benchmarks.bench_markup [tasks] [distinct_details]
+'''
+import json
+import random
+import re
+import sys
+import time
+
+from app import task_details_for_markup
+
+def legacy_task_details_for_markup(details):
+    URLS_REGEX_PATTERN = r"(https?\:\/\/[\w/\-?=%.]+\.[\w/\+\-?=%.~&\[\]\#]+)"
+    DECORATED_URL_FORMAT = '<a href="{}" target="_blank">{}</a>'
+    decorated_fragments = []
+    fragments = re.split(URLS_REGEX_PATTERN, details)
+    for index, fragment in enumerate(fragments):
+        if index % 2 == 1:
+            decorated_fragments.append(DECORATED_URL_FORMAT.format(fragment, fragment))
+        else:
+            decorated_fragments.append(fragment)
+
+    return "".join(decorated_fragments)
+
+def month_details(tasks=2000, distinct_details=300, seed=0):
+    rnd = random.Random(seed)
+    details = [
+        'Shift %d task, see https://example.com/shifts/%d?week=%d<br>and http://wiki.example.org/page%d' % (
+            index, index, rnd.randrange(52), rnd.randrange(1000))
+        for index in range(distinct_details)
+    ]
+    return [rnd.choice(details) for _ in range(tasks)]
+
+def run(tasks=2000, distinct_details=300, renders=20):
+    details = month_details(tasks, distinct_details)
+    stored = [(text, task_details_for_markup(text)) for text in details]
+    task_details_for_markup.cache_clear()
+
+    def legacy():
+        for text in details:
+            legacy_task_details_for_markup(text)
+
+    def memoized():
+        for text in details:
+            task_details_for_markup(text)
+
+    def precomputed():
+        for text, markup in stored:
+            markup if markup is not None else task_details_for_markup(text)
+
+    results = {'tasks': tasks, 'distinct_details': distinct_details, 'renders': renders}
+    for label, render in (('legacy', legacy), ('memoized', memoized), ('stored', precomputed)):
+        started = time.perf_counter()
+        for _ in range(renders):
+            render()
+        results[label] = {'ms_per_render': (time.perf_counter() - started) / renders * 1000}
+    return results
+
+if __name__ == '__main__':
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    distinct_details = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    print(json.dumps(run(tasks, distinct_details), indent=4))
@@ -0,0 +1,93 @@
+'''
+Month view with ORM Task instances vs TaskRecord tuples (Task.getTasks read_only):
+time, peak memory and objects allocated per request (getTasks + month grid render),
+on a calendar seeded with one month of tasks.
+
+    DATABASE_URL=sqlite:// python -m benchmarks.bench_projection [tasks] [recurrent_ratio]
+
+The tables are created when the database is SQLite, on Postgres the seeded calendar
+and its tasks are deleted at the end.
+'''
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from flask import render_template
+
+from app import app, db
+from app.mod_calendar.models import Calendar, Task
+from benchmarks.seed import create_tables, drop_calendars, seed_calendars
+
+def seed_month(year, month, tasks=2000, recurrent_ratio=0.1, seed=0):
+    return seed_calendars(datetime(year, month, 1), 1, tasks, 28, recurrent_ratio, seed=seed)[0]
+
+def render_month(calendar_id, year, month, read_only):
+    tasks = Task.getTasks(calendar_id, year, month, True, 0, read_only=read_only)
+    html = render_template(
+        "calendar/month.html",
+        calendar_id=calendar_id,
+        month=month,
+        current_year=year,
+        current_month=month,
+        current_day=1,
+        month_days=Calendar.month_days(year, month, 0),
+        tasks=tasks
+    )
+    # End of request: the session (and its identity map) is released
+    db.session.remove()
+    return html
+
+def measure(calendar_id, year, month, read_only, renders):
+    render_month(calendar_id, year, month, read_only)
+
+    started = time.perf_counter()
+    for _ in range(renders):
+        render_month(calendar_id, year, month, read_only)
+    seconds = (time.perf_counter() - started) / renders
+
+    gc.collect()
+    gc_objects = len(gc.get_objects())
+    tracemalloc.start()
+    render_month(calendar_id, year, month, read_only)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Objects allocated while the tasks are held, before the response is built
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tasks = Task.getTasks(calendar_id, year, month, True, 0, read_only=read_only)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    tracked = len(gc.get_objects()) - gc_objects
+    del tasks
+    db.session.remove()
+
+    return {
+        'ms_per_request': seconds * 1000,
+        'peak_kb_per_request': peak / 1024,
+        'allocated_blocks_held_by_tasks': blocks,
+        'gc_tracked_objects_held_by_tasks': tracked
+    }
+
+def run(tasks=2000, recurrent_ratio=0.1, renders=20):
+    year, month = 2020, 7
+    with app.test_request_context():
+        create_tables()
+        calendar_id = seed_month(year, month, tasks, recurrent_ratio)
+        try:
+            results = {'tasks': tasks, 'recurrent_ratio': recurrent_ratio, 'renders': renders}
+            results['orm'] = measure(calendar_id, year, month, False, renders)
+            results['records'] = measure(calendar_id, year, month, True, renders)
+        finally:
+            drop_calendars([calendar_id])
+    return results
+
+if __name__ == '__main__':
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    recurrent_ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    print(json.dumps(run(tasks, recurrent_ratio), indent=4))
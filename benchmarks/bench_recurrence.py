@@ -0,0 +1,70 @@
+'''
+Recurrence expansion of 10k rules over a year: the arithmetic expansion of
+app.mod_calendar.recurrence against the former walk of the month grid.
+
+    python -m benchmarks.bench_recurrence [rules]
+'''
+import calendar
+import json
+import random
+import sys
+import time
+from datetime import date
+
+from app.mod_calendar import recurrence
+
+def random_rules(count, seed=0):
+    rnd = random.Random(seed)
+    rules = []
+    for key in range(count):
+        kind = rnd.randrange(3)
+        if kind == 0:
+            rules.append((key, 'w', '', rnd.randrange(7)))
+        elif kind == 1:
+            rules.append((key, 'm', 'w', rnd.randrange(7)))
+        else:
+            rules.append((key, 'm', 'm', rnd.randrange(1, 32)))
+    return rules
+
+def grid_walk(rules, year):
+    # Nested week/day loops over every month, as Task.getTasks used to do
+    occurrences = []
+    grid = calendar.Calendar(0)
+    for month in range(1, 13):
+        weeks = grid.monthdayscalendar(year, month)
+        for key, repetition_type, repetition_subtype, repetition_value in rules:
+            monthly_repetition_done = False
+            for week in weeks:
+                for weekday, day in enumerate(week):
+                    if day == 0:
+                        continue
+                    if repetition_type == 'w':
+                        if repetition_value == weekday:
+                            occurrences.append((date(year, month, day).toordinal(), key))
+                    elif repetition_subtype == 'w':
+                        if repetition_value == weekday and not monthly_repetition_done:
+                            occurrences.append((date(year, month, day).toordinal(), key))
+                            monthly_repetition_done = True
+                    elif repetition_value == day:
+                        occurrences.append((date(year, month, day).toordinal(), key))
+    return occurrences
+
+def run(count=10000, year=2020):
+    rules = random_rules(count)
+    results = {'rules': count, 'year': year}
+    for label, expand in (
+        ('grid_walk', lambda: grid_walk(rules, year)),
+        ('arithmetic', lambda: recurrence.expand(rules, date(year, 1, 1), date(year, 12, 31)))
+    ):
+        started = time.perf_counter()
+        occurrences = expand()
+        results[label] = {
+            'seconds': time.perf_counter() - started,
+            'occurrences': len(occurrences)
+        }
+    results['speedup'] = results['grid_walk']['seconds'] / results['arithmetic']['seconds']
+    return results
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print(json.dumps(run(count), indent=4))
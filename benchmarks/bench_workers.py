@@ -0,0 +1,180 @@
+'''
+get_calendar requests/sec and latency percentiles under each gunicorn worker class.
+
+For every worker class gunicorn is started with gunicorn.conf.py, a signed session is
+forged with a local signing key (AUTH0_JWKS_SOURCE points to a generated jwks.json, as
+in bench_auth) and concurrent keep-alive clients request the month view of a seeded
+calendar. The month cache is disabled so every request runs the whole pipeline.
+
+    DATABASE_URL=postgresql://localhost/calendarapp \
+        python -m benchmarks.bench_workers [concurrency] [seconds] [worker_classes] [--dry-run]
+
+worker_classes is a comma separated list (default sync,gthread,gevent), gevent is
+skipped when it is not installed. --dry-run only starts every worker class and makes
+one request through wait_until_ready, to check the setup before a long run.
+'''
+import argparse
+import http.client
+import json
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+
+import app.mod_auth.constants as constants
+from app import app, db
+from app.mod_calendar.models import Calendar, Task
+from benchmarks.bench_auth import signed_token
+from benchmarks.bench_projection import seed_month
+
+HOST = '127.0.0.1'
+PORT = 8765
+YEAR, MONTH = 2020, 7
+
+'''
+month_path(calendar_id, year, month)
+    path of the month view, with the trailing slash of the route: without it flask
+    answers with a redirect and every request would count as an error
+'''
+def month_path(calendar_id, year, month):
+    return '/calendar/%d/?y=%d&m=%d' % (calendar_id, year, month)
+
+def session_cookie(secret_key, token):
+    signer = Flask(__name__)
+    signer.secret_key = secret_key
+    serializer = SecureCookieSessionInterface().get_signing_serializer(signer)
+    return serializer.dumps({
+        constants.PROFILE_KEY: {'user_id': 'benchmark|user', 'name': 'benchmark', 'picture': ''},
+        constants.JWT_TOKEN: token
+    })
+
+def wait_until_ready(path, cookie, deadline=30):
+    started = time.time()
+    while time.time() - started < deadline:
+        try:
+            connection = http.client.HTTPConnection(HOST, PORT, timeout=5)
+            connection.request('GET', path, headers={'Cookie': 'session=' + cookie})
+            status = connection.getresponse().status
+            connection.close()
+            if status == 200:
+                return
+            raise RuntimeError('GET %s returned %d' % (path, status))
+        except (ConnectionError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start')
+
+def load(path, cookie, concurrency, seconds):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+
+    def client():
+        connection = http.client.HTTPConnection(HOST, PORT, timeout=30)
+        own = []
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers={'Cookie': 'session=' + cookie})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise RuntimeError(response.status)
+                own.append(time.perf_counter() - started)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                connection.close()
+                connection = http.client.HTTPConnection(HOST, PORT, timeout=30)
+        connection.close()
+        with lock:
+            latencies.extend(own)
+
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+
+    latencies.sort()
+    def percentile(value):
+        return latencies[min(int(len(latencies) * value), len(latencies) - 1)] * 1000 if latencies else 0.0
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'requests_per_second': len(latencies) / seconds,
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99)
+    }
+
+def serve(worker_class, env):
+    env = dict(env, GUNICORN_WORKER_CLASS=worker_class)
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', '%s:%d' % (HOST, PORT), 'app:app'],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+def run(concurrency=32, seconds=10, worker_classes=('sync', 'gthread', 'gevent'), dry_run=False):
+    with tempfile.TemporaryDirectory() as jwks_dir, app.app_context():
+        jwks_path, token = signed_token(jwks_dir)
+        secret_key = secrets.token_hex(32)
+        cookie = session_cookie(secret_key, token)
+        if db.engine.url.drivername.startswith('sqlite'):
+            db.create_all()
+        calendar_id = seed_month(YEAR, MONTH, 500)
+        path = month_path(calendar_id, YEAR, MONTH)
+        env = dict(
+            os.environ,
+            SECRET_KEY=secret_key,
+            AUTH0_JWKS_SOURCE=jwks_path,
+            MONTH_CACHE_BACKEND='null',
+            WEB_CONCURRENCY=os.environ.get('WEB_CONCURRENCY', '2')
+        )
+
+        results = {'concurrency': concurrency, 'seconds': seconds, 'workers': int(env['WEB_CONCURRENCY']),
+                   'path': path}
+        try:
+            for worker_class in worker_classes:
+                if worker_class == 'gevent':
+                    try:
+                        import gevent
+                    except ImportError:
+                        results[worker_class] = {'skipped': 'gevent is not installed'}
+                        continue
+                server = serve(worker_class, env)
+                try:
+                    wait_until_ready(path, cookie)
+                    if dry_run:
+                        results[worker_class] = {'ready': True}
+                    else:
+                        results[worker_class] = load(path, cookie, concurrency, seconds)
+                finally:
+                    server.send_signal(signal.SIGTERM)
+                    server.wait()
+        finally:
+            Task.query.filter(Task.calendar_id == calendar_id).delete()
+            Calendar.query.filter(Calendar.id == calendar_id).delete()
+            db.session.commit()
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='get_calendar throughput per gunicorn worker class')
+    parser.add_argument('concurrency', type=int, nargs='?', default=32)
+    parser.add_argument('seconds', type=int, nargs='?', default=10)
+    parser.add_argument('worker_classes', nargs='?', default='sync,gthread,gevent',
+                        help='comma separated worker classes')
+    parser.add_argument('--dry-run', action='store_true', help='one request per worker class, no load')
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.concurrency, args.seconds, args.worker_classes.split(','), args.dry_run), indent=4))
+
+if __name__ == '__main__':
+    main()
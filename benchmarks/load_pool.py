@@ -0,0 +1,121 @@
+'''
+Connection pool load test against a local PostgreSQL (DATABASE_URL or config.py).
+
+Starts several worker processes, as gunicorn does without --preload, releases them
+at the same time with many concurrent requests each and samples pg_stat_activity
+during the run. With the pool settings of config.py (DB_*) the number of server
+connections stays bounded by workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) and each
+worker opens its connections once, instead of one connection per request.
+
+    python -m benchmarks.load_pool [workers] [threads_per_worker] [requests_per_thread]
+'''
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+import config
+
+APPLICATION_NAME = 'calendarapp-load-pool'
+
+def database_url():
+    return os.environ.get('DATABASE_URL', config.SQLALCHEMY_DATABASE_URI)
+
+def worker(start, results, threads, requests, query_seconds):
+    # Imported here, every worker builds its own app and engine
+    from app import app, db
+    from app.mod_base.pool import pool_metrics
+
+    latencies = []
+    errors = []
+
+    def client():
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                with app.app_context():
+                    db.session.execute(text('SELECT pg_sleep(:seconds)'), {'seconds': query_seconds})
+                    db.session.remove()
+            except Exception as e:
+                errors.append(str(e).split('\n')[0])
+            latencies.append(time.perf_counter() - started)
+
+    clients = [threading.Thread(target=client) for _ in range(threads)]
+    start.wait()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+
+    latencies.sort()
+    stats = pool_metrics.stats(db.engine)
+    stats['requests'] = len(latencies)
+    stats['errors'] = errors[:5]
+    stats['p50_ms'] = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+    stats['p99_ms'] = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0
+    results.put(stats)
+
+def server_connections(engine):
+    with engine.connect() as connection:
+        return connection.execute(
+            text('SELECT count(*) FROM pg_stat_activity WHERE application_name = :name'),
+            {'name': APPLICATION_NAME}
+        ).scalar()
+
+def run(workers=4, threads=32, requests=20, query_seconds=0.01):
+    # Inherited by the workers, read by config.py when they import the application
+    os.environ['DB_APPLICATION_NAME'] = APPLICATION_NAME
+    monitor_engine = create_engine(database_url(), poolclass=NullPool)
+    context = multiprocessing.get_context('spawn')
+    start = context.Event()
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(start, results, threads, requests, query_seconds))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    # Let the workers import the application before releasing the load
+    time.sleep(3)
+
+    samples = []
+    done = threading.Event()
+
+    def monitor():
+        while not done.is_set():
+            samples.append(server_connections(monitor_engine))
+            time.sleep(0.05)
+
+    sampler = threading.Thread(target=monitor)
+    started = time.perf_counter()
+    start.set()
+    sampler.start()
+    worker_stats = [results.get() for _ in processes]
+    seconds = time.perf_counter() - started
+    done.set()
+    sampler.join()
+    for process in processes:
+        process.join()
+
+    return {
+        'workers': workers,
+        'threads_per_worker': threads,
+        'requests': sum(stats['requests'] for stats in worker_stats),
+        'requests_per_second': sum(stats['requests'] for stats in worker_stats) / seconds,
+        'connection_bound': workers * (config.DB_POOL_SIZE + config.DB_MAX_OVERFLOW),
+        'peak_server_connections': max(samples) if samples else 0,
+        'connects': sum(stats['connects'] for stats in worker_stats),
+        'wait_seconds_max': max(stats['wait_seconds_max'] for stats in worker_stats),
+        'worker_pools': worker_stats
+    }
+
+if __name__ == '__main__':
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    requests = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    print(json.dumps(run(workers, threads, requests), indent=4))
@@ -0,0 +1,88 @@
+'''
+Synthetic calendars for the benchmarks, on SQLite or PostgreSQL (DATABASE_URL).
+
+Tasks are spread over spread_days days from start, a recurrent_ratio share of them
+repeat with the recurrence_mix weights (weekly, monthly by week day, monthly by month
+day). The same seed produces the same rows, so runs on different commits compare the
+same data.
+'''
+import random
+from datetime import timedelta
+
+from app import db
+from app.mod_calendar import recurrence
+from app.mod_calendar.models import Calendar, Task
+
+# (repetition_type, repetition_subtype) of each recurrence_mix key
+RECURRENCE_KINDS = {
+    'weekly': (recurrence.WEEKLY, recurrence.BY_WEEKDAY),
+    'monthly_weekday': (recurrence.MONTHLY, recurrence.BY_WEEKDAY),
+    'monthly_day': (recurrence.MONTHLY, recurrence.BY_MONTHDAY)
+}
+DEFAULT_RECURRENCE_MIX = {'weekly': 0.5, 'monthly_weekday': 0.25, 'monthly_day': 0.25}
+
+def task_rows(calendar_id, start, spread_days, tasks, recurrent_ratio=0.1, recurrence_mix=None, seed=0):
+    rnd = random.Random(seed)
+    mix = recurrence_mix or DEFAULT_RECURRENCE_MIX
+    kinds = [RECURRENCE_KINDS[kind] for kind in mix]
+    weights = list(mix.values())
+    rows = []
+    for index in range(tasks):
+        start_time = start + timedelta(days=rnd.randrange(max(spread_days, 1)), hours=rnd.randrange(24))
+        is_all_day = rnd.random() < 0.1
+        repetition_type, repetition_subtype, repetition_value = '', '', 0
+        is_recurrent = rnd.random() < recurrent_ratio
+        if is_recurrent:
+            repetition_type, repetition_subtype = rnd.choices(kinds, weights)[0]
+            if repetition_subtype == recurrence.BY_MONTHDAY:
+                repetition_value = rnd.randint(1, 31)
+            else:
+                repetition_value = rnd.randrange(7)
+        rows.append({
+            'calendar_id': calendar_id,
+            'title': 'Task %d' % index,
+            'color': '#B19CDA',
+            'details': 'Details of task %d https://example.com/tasks/%d' % (index, index),
+            'start_time': start_time,
+            'end_time': start_time + timedelta(hours=1),
+            'is_all_day': is_all_day,
+            'is_recurrent': is_recurrent,
+            'repetition_value': repetition_value,
+            'repetition_type': repetition_type,
+            'repetition_subtype': repetition_subtype
+        })
+    return rows
+
+'''
+seed_calendars(start, calendars, tasks, spread_days, recurrent_ratio, recurrence_mix, seed)
+    creates calendars calendars with tasks tasks each, returns the calendar ids
+    EXAMPLE
+        calendar_ids = seed_calendars(datetime(2020, 1, 1), calendars=10, tasks=1000, spread_days=365)
+        ...
+        drop_calendars(calendar_ids)
+'''
+def seed_calendars(start, calendars=1, tasks=2000, spread_days=28, recurrent_ratio=0.1, recurrence_mix=None,
+                   seed=0, name='bench'):
+    calendar_ids = []
+    for index in range(calendars):
+        calendar = Calendar(name='%s %d' % (name, index), description='benchmark', min_year=2000, max_year=2200,
+                            time_zone='Europe/Madrid', week_starting_day=0, emojis_enabled=True,
+                            show_view_past_btn=True)
+        calendar.insert()
+        rows = task_rows(calendar.id, start, spread_days, tasks, recurrent_ratio, recurrence_mix, seed + index)
+        if rows:
+            # executemany: no limit on the number of bound parameters (SQLite)
+            db.session.execute(Task.__table__.insert(), rows)
+        db.session.commit()
+        calendar_ids.append(calendar.id)
+    return calendar_ids
+
+def drop_calendars(calendar_ids):
+    db.session.rollback()
+    Task.query.filter(Task.calendar_id.in_(calendar_ids)).delete(synchronize_session=False)
+    Calendar.query.filter(Calendar.id.in_(calendar_ids)).delete(synchronize_session=False)
+    db.session.commit()
+
+def create_tables():
+    if db.engine.url.drivername.startswith('sqlite'):
+        db.create_all()
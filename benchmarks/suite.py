@@ -0,0 +1,254 @@
+'''
+Benchmark suite: month queries, month view, task writes and authentication, on seeded
+synthetic calendars. Prints (or writes with --output) one JSON document with the run
+settings, the environment (commit, python, database driver) and, for every case, the
+latency mean, median, p95, min and max in milliseconds.
+
+    DATABASE_URL=sqlite:// python -m benchmarks.suite
+    DATABASE_URL=postgresql://localhost/calendarapp python -m benchmarks.suite \
+        --calendars 5 --tasks 5000 --recurrent-ratio 0.2 --spread-days 365 --repeat 50 --output before.json
+
+Cases:
+    get_tasks_orm, get_tasks_records: Task.getTasks of the seeded month (ORM instances, read-only records)
+    year_by_month, year_range: the tasks of the seeded year, with 12 Task.getTasks or one Task.getTasksRange
+    get_calendar_uncached, get_calendar_cached: GET /calendar/<id>/ without and with the month cache
+    create_task, update_task, delete_task: the task form endpoints
+    auth_verify_uncached, auth_verify_cached: verify_decode_jwt_cached without and with the token cache
+
+The signing keys are generated locally (as in bench_auth), the session is set through
+the test client and CSRF is disabled, so the suite runs offline. The tables are created
+when the database is SQLite, the seeded calendars are deleted at the end.
+'''
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+import sqlalchemy
+
+import app.mod_auth.auth as auth
+import app.mod_auth.constants as constants
+from app import app, db
+from app.mod_auth.jwks import JWKSCache
+from app.mod_auth.tokens import TokenCache
+from app.mod_calendar.cache import LRUCacheBackend, NullCacheBackend, calendar_settings_cache, month_cache
+from app.mod_calendar.models import Task
+from benchmarks.bench_auth import signed_token
+from benchmarks.seed import create_tables, drop_calendars, seed_calendars
+
+PERMISSIONS = ('get:calendars', 'post:tasks', 'patch:tasks', 'delete:tasks')
+
+def summary(seconds):
+    milliseconds = sorted(value * 1000 for value in seconds)
+    count = len(milliseconds)
+    return {
+        'runs': count,
+        'mean_ms': sum(milliseconds) / count,
+        'p50_ms': milliseconds[count // 2],
+        'p95_ms': milliseconds[min(int(count * 0.95), count - 1)],
+        'min_ms': milliseconds[0],
+        'max_ms': milliseconds[-1]
+    }
+
+'''
+measure(fn, repeat, warmup)
+    calls fn warmup times, then repeat times, and returns the summary of the timed calls
+'''
+def measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - started)
+    return summary(seconds)
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def task_form(year, month, index):
+    day = '%d-%02d-%02d' % (year, month, index % 28 + 1)
+    return {
+        'title': 'Benchmark task %d' % index,
+        'start_date': day,
+        'end_date': day,
+        'start_time': '09:00',
+        'end_time': '10:00',
+        'details': 'Benchmark details https://example.com',
+        'color': '#B19CDA',
+        'repeats': '0',
+        'repetition_type': '',
+        'repetition_subtype': '',
+        'repetition_value': '0',
+        'is_all_day': '0'
+    }
+
+def check(request, response, statuses=(200,)):
+    if response.status_code not in statuses:
+        raise RuntimeError('%s returned %d' % (request, response.status_code))
+
+def bench_queries(calendar_ids, year, month, repeat):
+    results = {}
+    for label, read_only in (('get_tasks_orm', False), ('get_tasks_records', True)):
+        def get_tasks():
+            for calendar_id in calendar_ids:
+                Task.getTasks(calendar_id, year, month, True, 0, read_only=read_only)
+            # End of request: the session (and its identity map) is released
+            db.session.remove()
+        results[label] = measure(get_tasks, repeat)
+
+    def year_months():
+        for calendar_id in calendar_ids:
+            for year_month in range(1, 13):
+                Task.getTasks(calendar_id, year, year_month, True, 0, read_only=True)
+        db.session.remove()
+    results['year_by_month'] = measure(year_months, repeat)
+
+    def year_range():
+        for calendar_id in calendar_ids:
+            Task.getTasksRange(calendar_id, date(year, 1, 1), date(year, 12, 31))
+        db.session.remove()
+    results['year_range'] = measure(year_range, repeat)
+    return results
+
+def bench_views(client, calendar_ids, year, month, repeat):
+    results = {}
+    backend = month_cache.backend
+    try:
+        for label, cache_backend in (('get_calendar_uncached', NullCacheBackend()),
+                                     ('get_calendar_cached', LRUCacheBackend())):
+            month_cache.backend = cache_backend
+            def get_calendar():
+                for calendar_id in calendar_ids:
+                    path = '/calendar/%d/?y=%d&m=%d' % (calendar_id, year, month)
+                    check('GET ' + path, client.get(path))
+            results[label] = measure(get_calendar, repeat)
+    finally:
+        month_cache.backend = backend
+    return results
+
+def bench_writes(client, calendar_id, year, month, repeat):
+    created = []
+    def create_task():
+        path = '/calendar/%d/tasks' % calendar_id
+        check('POST ' + path, client.post(path, data=task_form(year, month, len(created))), (302,))
+        created.append(None)
+    results = {'create_task': measure(create_task, repeat)}
+
+    # The update and delete cases use the tasks created above
+    task_ids = [task_id for task_id, in db.session.query(Task.id).filter(
+        Task.calendar_id == calendar_id,
+        Task.title.like('Benchmark task %')
+    ).order_by(Task.id)]
+    db.session.remove()
+
+    updates = iter(task_ids)
+    def update_task():
+        task_id = next(updates)
+        path = '/calendar/%d/tasks/%d' % (calendar_id, task_id)
+        check('POST ' + path, client.post(path, data=task_form(year, month, task_id)), (302,))
+    results['update_task'] = measure(update_task, min(repeat, len(task_ids) - 1))
+
+    deletes = iter(task_ids)
+    def delete_task():
+        path = '/calendar/%d/tasks/%d' % (calendar_id, next(deletes))
+        check('DELETE ' + path, client.delete(path))
+    results['delete_task'] = measure(delete_task, min(repeat, len(task_ids) - 1))
+    return results
+
+def bench_verification(token, repeat):
+    results = {}
+    token_cache = auth.token_cache
+    try:
+        for label, size in (('auth_verify_uncached', 0), ('auth_verify_cached', 1024)):
+            auth.token_cache = TokenCache(size)
+            results[label] = measure(lambda: auth.verify_decode_jwt_cached(token), repeat)
+    finally:
+        auth.token_cache = token_cache
+    return results
+
+def run(calendars=1, tasks=2000, recurrent_ratio=0.1, spread_days=28, year=2020, month=7, repeat=20, seed=0):
+    settings = {
+        'calendars': calendars,
+        'tasks_per_calendar': tasks,
+        'recurrent_ratio': recurrent_ratio,
+        'spread_days': spread_days,
+        'year': year,
+        'month': month,
+        'repeat': repeat,
+        'seed': seed
+    }
+    with tempfile.TemporaryDirectory() as jwks_dir, app.app_context():
+        jwks_path, token = signed_token(jwks_dir, permissions=PERMISSIONS)
+        jwks_cache = auth.jwks_cache
+        auth.jwks_cache = JWKSCache(jwks_path)
+        csrf_enabled = app.config.get('WTF_CSRF_ENABLED', True)
+        app.config['WTF_CSRF_ENABLED'] = False
+
+        create_tables()
+        calendar_ids = seed_calendars(datetime(year, month, 1), calendars, tasks, spread_days, recurrent_ratio,
+                                      seed=seed)
+        calendar_settings_cache.clear()
+        try:
+            client = app.test_client()
+            with client.session_transaction() as client_session:
+                client_session[constants.PROFILE_KEY] = {'user_id': 'benchmark|user', 'name': 'benchmark',
+                                                         'picture': ''}
+                client_session[constants.JWT_TOKEN] = token
+
+            results = {}
+            results.update(bench_queries(calendar_ids, year, month, repeat))
+            results.update(bench_views(client, calendar_ids, year, month, repeat))
+            results.update(bench_writes(client, calendar_ids[0], year, month, repeat))
+            results.update(bench_verification(token, repeat))
+        finally:
+            drop_calendars(calendar_ids)
+            app.config['WTF_CSRF_ENABLED'] = csrf_enabled
+            auth.jwks_cache = jwks_cache
+
+    return {
+        'suite': 'calendarapp',
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'environment': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'database': db.engine.url.drivername
+        },
+        'settings': settings,
+        'results': results
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Calendar benchmark suite')
+    parser.add_argument('--calendars', type=int, default=1, help='seeded calendars')
+    parser.add_argument('--tasks', type=int, default=2000, help='tasks per calendar')
+    parser.add_argument('--recurrent-ratio', type=float, default=0.1, help='share of recurrent tasks')
+    parser.add_argument('--spread-days', type=int, default=28, help='days the task start times are spread over')
+    parser.add_argument('--year', type=int, default=2020)
+    parser.add_argument('--month', type=int, default=7)
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per case')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file to write, stdout by default')
+    args = parser.parse_args(argv)
+
+    report = run(args.calendars, args.tasks, args.recurrent_ratio, args.spread_days, args.year, args.month,
+                 args.repeat, args.seed)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=4)
+    else:
+        json.dump(report, sys.stdout, indent=4)
+        print()
+
+if __name__ == '__main__':
+    main()
@@ -4,8 +4,73 @@ import os
 DEBUG = True
 WTF_CSRF_ENABLED = True
 SQLALCHEMY_DATABASE_URI = 'postgresql://acrespo@localhost:5432/calendarapp'
-# Secret key for signing cookies
-SECRET_KEY = os.urandom(32)
+# Secret key for signing cookies, it must be the same for every gunicorn worker
+# (gunicorn.conf.py sets one for its workers when SECRET_KEY is not in the environment)
+SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32)
+
+# PostgreSQL connection pool, per gunicorn worker: at most DB_POOL_SIZE + DB_MAX_OVERFLOW
+# connections. Dead connections are detected on checkout (pre-ping) and connections
+# are recycled after DB_POOL_RECYCLE seconds.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+# Server side statement timeout in milliseconds (0: none) and pg_stat_activity name
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+DB_APPLICATION_NAME = os.environ.get('DB_APPLICATION_NAME', 'calendarapp')
+
+# Request profiling: a PROFILING_SAMPLE_RATE share of the requests is logged as JSON
+# lines on the 'app.profiling' logger (wall, auth, SQL and render time, bytes out) and
+# described in a Server-Timing response header
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.01))
+PROFILING_SERVER_TIMING = True
+
+# GET /metrics: with a METRICS_MULTIPROC_DIR every worker writes its metrics to the
+# directory (at most every METRICS_FLUSH_INTERVAL seconds) and the endpoint sums them,
+# gunicorn.conf.py sets one for its workers
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+METRICS_FLUSH_INTERVAL = 1.0
+
+# Calendars per page of the home page listing
+CALENDARS_PAGE_SIZE = 10
+# Longest range of the agenda views, in days
+AGENDA_MAX_DAYS = 366
+# Occurrences returned by /calendar/<id>/upcoming, by default and at most
+UPCOMING_DEFAULT_TASKS = 10
+UPCOMING_MAX_TASKS = 100
+
+# Rendered month grids cache: 'lru' (in-process), 'filesystem' (shared by the gunicorn
+# workers of the host, use it when running more than one worker) or 'null' (disabled)
+MONTH_CACHE_BACKEND = os.environ.get('MONTH_CACHE_BACKEND', 'lru')
+MONTH_CACHE_MAX_ENTRIES = 512
+# Directory of the 'filesystem' backend, gunicorn.conf.py sets one for its workers
+if os.environ.get('MONTH_CACHE_DIR'):
+    MONTH_CACHE_DIR = os.environ['MONTH_CACHE_DIR']
+# Seconds a month grid is cached: the writes made through another process are seen
+# after at most this long with the per-process 'lru' backend
+MONTH_CACHE_TIMEOUT = int(os.environ.get('MONTH_CACHE_TIMEOUT', 300))
+MONTH_CACHE_HIDDEN_PAST_TIMEOUT = 60
+# Seconds the calendar settings are cached by each worker
+CALENDAR_SETTINGS_CACHE_TTL = 30
+# Rows written per INSERT/transaction by the tasks bulk import
+TASKS_IMPORT_CHUNK_SIZE = 1000
+# Rows fetched at a time by the iCalendar export server-side cursor
+ICAL_EXPORT_YIELD_PER = 1000
+# Processes parsing the VEVENTs of an uploaded iCalendar file (0: parse in the request
+# thread), started with forkserver, at most ICAL_IMPORT_MAX_POOLS pools per worker
+# (the next uploads are parsed in their request thread); manage.py import_tasks -p
+# uses one per CPU
+ICAL_IMPORT_PROCESSES = int(os.environ.get('ICAL_IMPORT_PROCESSES', 0))
+ICAL_IMPORT_MAX_POOLS = int(os.environ.get('ICAL_IMPORT_MAX_POOLS', 1))
+# Materialized occurrences of the recurrent tasks (task_occurrence), built with
+# manage.py rebuild_occurrences and moved daily with manage.py advance_occurrences
+OCCURRENCES_ENABLED = os.environ.get('OCCURRENCES_ENABLED', '0') == '1'
+# Months materialized from the current one
+OCCURRENCES_HORIZON_MONTHS = int(os.environ.get('OCCURRENCES_HORIZON_MONTHS', 18))
+# Seconds a worker caches the materialized horizon
+OCCURRENCES_HORIZON_TTL = 60
 
 # Colors for new task buttons
 BUTTON_CUSTOM_COLOR_VALUE = "#3EB34F"
@@ -9,6 +9,8 @@ SQLALCHEMY_DATABASE_URI = 'postgresql://acrespo@localhost:5432/test_calendarapp'
 # Secret key for signing cookies
 SECRET_KEY = os.urandom(32)
 
+MONTH_CACHE_BACKEND = 'lru'
+
 # Colors for new task buttons
 BUTTON_CUSTOM_COLOR_VALUE = "#3EB34F"
 BUTTONS_COLORS_LIST = (
@@ -0,0 +1,66 @@
+'''
+gunicorn settings, read by the Procfile command
+
+    GUNICORN_WORKER_CLASS: 'gthread' (default), 'gevent' or 'sync'
+        gthread: GUNICORN_THREADS requests per worker, each in its own thread
+        gevent: GUNICORN_WORKER_CONNECTIONS requests per worker, needs the gevent and
+            psycogreen packages (pip install gevent psycogreen) so psycopg2 yields to
+            the other requests while waiting for PostgreSQL
+        sync: one request at a time per worker
+    WEB_CONCURRENCY: number of worker processes (default 2 * CPUs + 1)
+
+The workers import the application themselves (no preload), so every worker opens its
+own connection pool after the fork. The DB pool is sized to the threads of a worker
+unless DB_POOL_SIZE is set.
+'''
+import glob
+import multiprocessing
+import os
+import secrets
+import tempfile
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+# Recycle the workers now and then, the jitter avoids restarting them all at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+preload_app = False
+
+# Inherited by the workers: the session cookies signed by a worker must be accepted
+# by the others, and a worker must not have more threads than pooled connections
+os.environ.setdefault('SECRET_KEY', secrets.token_hex(32))
+if worker_class == 'gthread':
+    os.environ.setdefault('DB_POOL_SIZE', str(threads))
+# Workers metrics, summed by GET /metrics
+os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'calendarapp-metrics'))
+# Month grids cache shared by the workers: a task written through one worker must
+# invalidate the fragments of all of them
+os.environ.setdefault('MONTH_CACHE_BACKEND', 'filesystem')
+os.environ.setdefault('MONTH_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'calendarapp-month-cache'))
+
+def on_starting(server):
+    # Counters start from zero with the master
+    os.makedirs(os.environ['METRICS_MULTIPROC_DIR'], exist_ok=True)
+    for path in glob.glob(os.path.join(os.environ['METRICS_MULTIPROC_DIR'], '*.json')):
+        os.remove(path)
+    # Month grids of a previous run may predate writes made while it was down
+    for path in glob.glob(os.path.join(os.environ['MONTH_CACHE_DIR'], '*')):
+        os.remove(path)
+    if workers > 1 and os.environ['MONTH_CACHE_BACKEND'] == 'lru':
+        server.log.warning('MONTH_CACHE_BACKEND=lru with %d workers: a task write only invalidates the month '
+                           'grids cached by the worker serving it', workers)
+
+def post_fork(server, worker):
+    if worker_class != 'gevent':
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning('psycogreen is not installed, PostgreSQL queries block the gevent workers')
+        return
+    patch_psycopg()
@@ -1,3 +1,5 @@
+import json
+import sys
 from flask_script import Manager
 from flask_migrate import Migrate, MigrateCommand
 
@@ -9,5 +11,65 @@ manager = Manager(app)
 manager.add_command('db', MigrateCommand)
 
 
+@manager.option('-c', '--calendar', dest='calendar_id', type=int, required=True, help='Calendar id')
+@manager.option('-f', '--format', dest='fmt', default=None, help='jsonl, csv or ics (default: file extension)')
+@manager.option('-s', '--chunk-size', dest='chunk_size', type=int, default=1000, help='Rows per INSERT/transaction')
+@manager.option('-p', '--processes', dest='processes', type=int, default=None,
+                help='iCalendar parsing processes (default: one per CPU)')
+@manager.option('path', help='JSON Lines, CSV or iCalendar file, - for stdin')
+def import_tasks(calendar_id, path, fmt=None, chunk_size=1000, processes=None):
+    """Bulk import tasks into a calendar"""
+    from app.mod_calendar import importer
+    from app.mod_calendar.cache import LRUCacheBackend, month_cache
+    from app.mod_calendar.occurrences import occurrence_store
+
+    if fmt is None:
+        fmt = 'jsonl' if path == '-' else path.rsplit('.', 1)[-1].lower()
+    stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        report = importer.import_tasks(calendar_id, stream, fmt, chunk_size=chunk_size, processes=processes)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    if report['inserted']:
+        occurrence_store.refresh_calendar(calendar_id)
+        # Only reaches the web workers through a shared backend (same MONTH_CACHE_DIR)
+        month_cache.invalidate_calendar(calendar_id)
+        if isinstance(month_cache.backend, LRUCacheBackend):
+            print('MONTH_CACHE_BACKEND=lru: the month grids cached by the web workers are not invalidated, '
+                  'they show the imported tasks after MONTH_CACHE_TIMEOUT', file=sys.stderr)
+    print(json.dumps(report, indent=4))
+
+
+
+@manager.option('-m', '--months', dest='months', type=int, default=None,
+                help='Months materialized from the current one (default: OCCURRENCES_HORIZON_MONTHS)')
+def rebuild_occurrences(months=None):
+    """Recompute the materialized occurrences of the recurrent tasks"""
+    from app.mod_calendar.occurrences import occurrence_store
+
+    if months is not None:
+        occurrence_store.horizon_months = months
+    print(json.dumps(occurrence_store.rebuild(), indent=4))
+
+
+@manager.command
+def advance_occurrences():
+    """Move the materialized occurrences horizon to the current month (run daily)"""
+    from app.mod_calendar.occurrences import occurrence_store
+
+    print(json.dumps(occurrence_store.advance(), indent=4))
+
+
+@manager.option('-c', '--calendar', dest='calendar_id', type=int, default=None, help='Calendar id (default: all)')
+def check_occurrences(calendar_id=None):
+    """Compare the materialized occurrences with the expansion of the recurrence rules"""
+    from app.mod_calendar.occurrences import occurrence_store
+
+    report = occurrence_store.check(calendar_id)
+    print(json.dumps(report, indent=4))
+    if not report['consistent']:
+        sys.exit(1)
+
 if __name__ == '__main__':
     manager.run()
@@ -0,0 +1,42 @@
+"""Add task occurrence
+
+Revision ID: a4c9e6d1f852
+Revises: f3b8d2a61c47
+Create Date: 2026-10-18 20:31:07.114586
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c9e6d1f852'
+down_revision = 'f3b8d2a61c47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('task_occurrence',
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('calendar_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['calendar_id'], ['calendar.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['task_id'], ['task.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('task_id', 'day')
+    )
+    # Month views read the occurrences of a calendar by day range
+    op.create_index('ix_task_occurrence_calendar_day', 'task_occurrence', ['calendar_id', 'day'], unique=False)
+    op.create_table('occurrence_horizon',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('first_day', sa.Date(), nullable=False),
+    sa.Column('last_day', sa.Date(), nullable=False),
+    sa.Column('date_modified', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('occurrence_horizon')
+    op.drop_index('ix_task_occurrence_calendar_day', table_name='task_occurrence')
+    op.drop_table('task_occurrence')
@@ -0,0 +1,30 @@
+"""Add task indexes
+
+Revision ID: c5956d496b56
+Revises: 91aac5980055
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5956d496b56'
+down_revision = '91aac5980055'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Non recurrent tasks are looked up by calendar and by the [start_time, end_time) window
+    op.create_index('ix_task_calendar_end_start', 'task', ['calendar_id', 'end_time', 'start_time'], unique=False,
+        postgresql_where=sa.text('NOT is_recurrent'))
+    # Recurrent tasks are looked up by calendar and by the year of start_time
+    op.create_index('ix_task_calendar_recurrent_start', 'task', ['calendar_id', 'start_time'], unique=False,
+        postgresql_where=sa.text('is_recurrent'))
+
+
+def downgrade():
+    op.drop_index('ix_task_calendar_recurrent_start', table_name='task')
+    op.drop_index('ix_task_calendar_end_start', table_name='task')
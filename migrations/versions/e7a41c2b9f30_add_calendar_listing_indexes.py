@@ -0,0 +1,28 @@
+"""Add calendar listing indexes
+
+Revision ID: e7a41c2b9f30
+Revises: d659f11eba64
+Create Date: 2026-10-18 16:40:12.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a41c2b9f30'
+down_revision = 'd659f11eba64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keyset pagination of the home page, newest calendars first
+    op.create_index('ix_calendar_date_created_id', 'calendar', ['date_created', 'id'], unique=False)
+    # Case-insensitive name prefix search: lower(name) LIKE 'prefix%'
+    op.create_index('ix_calendar_name_prefix', 'calendar', [sa.text('lower(name) text_pattern_ops')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_calendar_name_prefix', table_name='calendar')
+    op.drop_index('ix_calendar_date_created_id', table_name='calendar')
@@ -0,0 +1,26 @@
+"""Add task start index
+
+Revision ID: f3b8d2a61c47
+Revises: e7a41c2b9f30
+Create Date: 2026-10-18 19:05:44.731902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d2a61c47'
+down_revision = 'e7a41c2b9f30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Upcoming non recurrent tasks are read by calendar in start_time order
+    op.create_index('ix_task_calendar_start', 'task', ['calendar_id', 'start_time'], unique=False,
+        postgresql_where=sa.text('NOT is_recurrent'))
+
+
+def downgrade():
+    op.drop_index('ix_task_calendar_start', table_name='task')
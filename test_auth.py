@@ -0,0 +1,174 @@
+import os
+import json
+import tempfile
+import threading
+import time
+import unittest
+
+from app.mod_auth.jwks import JWKSCache, JWKSError
+from app.mod_auth.tokens import TokenCache
+
+def jwks_key(kid):
+    return {'kty': 'RSA', 'kid': kid, 'use': 'sig', 'n': 'n-' + kid, 'e': 'AQAB', 'alg': 'RS256'}
+
+class JWKSCacheTestCase(unittest.TestCase):
+    """This class represents the signing keys cache test case"""
+
+    def setUp(self):
+        """Write a local jwks.json so the cache runs offline."""
+        self.jwks_dir = tempfile.TemporaryDirectory()
+        self.jwks_path = os.path.join(self.jwks_dir.name, 'jwks.json')
+        self.write_jwks(['key-1'])
+
+    def write_jwks(self, kids):
+        with open(self.jwks_path, 'w') as jwks_file:
+            json.dump({'keys': [jwks_key(kid) for kid in kids]}, jwks_file)
+
+    def tearDown(self):
+        """Executed after reach test"""
+        self.jwks_dir.cleanup()
+
+    def test_get_key_fetches_once(self):
+        cache = JWKSCache('file://' + self.jwks_path)
+        for _ in range(5):
+            key = cache.get_key('key-1')
+        self.assertEqual(key['n'], 'n-key-1')
+        self.assertNotIn('alg', key)
+        stats = cache.stats()
+        self.assertEqual(stats['refreshes'], 1)
+        self.assertEqual(stats['hits'], 5)
+        self.assertEqual(stats['misses'], 0)
+
+    def test_get_key_refetches_unknown_kid(self):
+        cache = JWKSCache(self.jwks_path, min_refetch_interval=0)
+        cache.get_key('key-1')
+        self.write_jwks(['key-1', 'key-2'])
+        self.assertEqual(cache.get_key('key-2')['kid'], 'key-2')
+        self.assertIsNone(cache.get_key('key-3'))
+        stats = cache.stats()
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['refreshes'], 3)
+
+    def test_get_key_unknown_kid_rate_limited(self):
+        cache = JWKSCache(self.jwks_path, min_refetch_interval=3600)
+        cache.get_key('key-1')
+        for _ in range(5):
+            self.assertIsNone(cache.get_key('forged'))
+        self.assertEqual(cache.stats()['refreshes'], 1)
+
+    def test_get_key_ttl_refresh(self):
+        cache = JWKSCache(self.jwks_path, ttl=0)
+        cache.get_key('key-1')
+        cache.get_key('key-1')
+        self.assertEqual(cache.stats()['refreshes'], 2)
+
+    def test_get_key_stale_on_error(self):
+        cache = JWKSCache(self.jwks_path, ttl=0)
+        cache.get_key('key-1')
+        os.remove(self.jwks_path)
+        self.assertEqual(cache.get_key('key-1')['kid'], 'key-1')
+        self.assertEqual(cache.stats()['errors'], 1)
+
+    def test_get_key_missing_source(self):
+        cache = JWKSCache(os.path.join(self.jwks_dir.name, 'missing.json'))
+        with self.assertRaises(JWKSError):
+            cache.get_key('key-1')
+
+    def test_get_key_single_flight(self):
+        cache = JWKSCache(self.jwks_path)
+        threads = [threading.Thread(target=cache.get_key, args=('key-1',)) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.stats()['refreshes'], 1)
+
+    def concurrent_lookups(self, cache, kid, threads=8):
+        errors = []
+        def lookup():
+            try:
+                cache.get_key(kid)
+            except JWKSError as e:
+                errors.append(e)
+        lookups = [threading.Thread(target=lookup) for _ in range(threads)]
+        for thread in lookups:
+            thread.start()
+        for thread in lookups:
+            thread.join()
+        return errors
+
+    def test_get_key_single_flight_on_error(self):
+        loads = []
+        class FailingJWKSCache(JWKSCache):
+            def _load(self):
+                loads.append(1)
+                time.sleep(0.1)
+                if len(loads) > 1:
+                    raise OSError('provider down')
+                return super()._load()
+
+        cache = FailingJWKSCache(self.jwks_path, ttl=60)
+        cache.get_key('key-1')
+        cache._fetched_at -= 120
+        self.assertEqual(self.concurrent_lookups(cache, 'key-1'), [])
+        # The threads waiting on the failed refresh served the stale keys without refetching
+        self.assertEqual(len(loads), 2)
+        self.assertEqual(cache.stats()['errors'], 1)
+
+    def test_get_key_single_flight_on_first_error(self):
+        loads = []
+        class FailingJWKSCache(JWKSCache):
+            def _load(self):
+                loads.append(1)
+                time.sleep(0.1)
+                raise OSError('provider down')
+
+        cache = FailingJWKSCache(self.jwks_path)
+        errors = self.concurrent_lookups(cache, 'key-1')
+        self.assertEqual(len(errors), 8)
+        self.assertEqual(len(loads), 1)
+
+class TokenCacheTestCase(unittest.TestCase):
+    """This class represents the verified tokens cache test case"""
+
+    def test_get_cached_payload(self):
+        cache = TokenCache(8)
+        payload = {'sub': 'user', 'exp': time.time() + 60}
+        self.assertIsNone(cache.get('token'))
+        cache.put('token', payload)
+        self.assertIs(cache.get('token'), payload)
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_get_expired_payload(self):
+        cache = TokenCache(8)
+        cache.put('token', {'sub': 'user', 'exp': time.time() - 1})
+        self.assertIsNone(cache.get('token'))
+        self.assertEqual(cache.stats()['expired'], 1)
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_put_without_exp_not_cached(self):
+        cache = TokenCache(8)
+        cache.put('token', {'sub': 'user'})
+        self.assertIsNone(cache.get('token'))
+
+    def test_put_evicts_least_recently_used(self):
+        cache = TokenCache(2)
+        exp = time.time() + 60
+        cache.put('token-1', {'exp': exp})
+        cache.put('token-2', {'exp': exp})
+        cache.get('token-1')
+        cache.put('token-3', {'exp': exp})
+        self.assertIsNotNone(cache.get('token-1'))
+        self.assertIsNone(cache.get('token-2'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_disabled_cache(self):
+        cache = TokenCache(0)
+        cache.put('token', {'exp': time.time() + 60})
+        self.assertIsNone(cache.get('token'))
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from werkzeug.routing import RequestRedirect
+
+from app import app
+import benchmarks.bench_workers as bench_workers
+
+class TrailingSlashHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200 if self.path.split('?')[0].endswith('/') else 308)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class BenchWorkersTestCase(unittest.TestCase):
+    """This class represents the gunicorn worker benchmark smoke test case"""
+
+    def test_month_path_matches_the_route(self):
+        path, query = bench_workers.month_path(1, 2020, 7).split('?')
+        adapter = app.url_map.bind('localhost', query_args=query)
+        try:
+            endpoint, arguments = adapter.match(path)
+        except RequestRedirect as redirect:
+            self.fail('%s redirects to %s' % (path, redirect.new_url))
+        self.assertEqual(endpoint, 'calendar.get_calendar')
+        self.assertEqual(arguments, {'calendar_id': 1})
+
+    def test_wait_until_ready(self):
+        server = HTTPServer((bench_workers.HOST, 0), TrailingSlashHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        port = bench_workers.PORT
+        bench_workers.PORT = server.server_address[1]
+        try:
+            bench_workers.wait_until_ready(bench_workers.month_path(1, 2020, 7), 'cookie', deadline=5)
+            with self.assertRaises(RuntimeError):
+                bench_workers.wait_until_ready('/calendar/1?y=2020&m=7', 'cookie', deadline=5)
+        finally:
+            bench_workers.PORT = port
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
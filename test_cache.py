@@ -0,0 +1,117 @@
+import tempfile
+import time
+import unittest
+from datetime import date, datetime
+
+from app.mod_calendar.cache import (
+    CalendarSettingsCache,
+    FileSystemCacheBackend,
+    LRUCacheBackend,
+    MonthCache
+)
+from app.mod_calendar.models import Task
+
+class MonthCacheTestCase(unittest.TestCase):
+    """This class represents the rendered month grids cache test case"""
+
+    def setUp(self):
+        self.cache = MonthCache(LRUCacheBackend(8))
+        self.today = date(2020, 7, 15)
+
+    def key(self, year=2020, month=7, view_past_tasks=True):
+        return self.cache.key(1, year, month, view_past_tasks, 0, self.today)
+
+    def task(self, start_time, is_recurrent=False):
+        return Task(calendar_id=1, start_time=start_time, end_time=start_time, is_recurrent=is_recurrent)
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get(self.key()))
+        self.cache.set(self.key(), '<ul></ul>')
+        self.assertEqual(self.cache.get(self.key()), '<ul></ul>')
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_invalidate_task_neighbour_months(self):
+        for month in (6, 7, 8, 9):
+            self.cache.set(self.key(month=month), str(month))
+        self.cache.invalidate_task(self.task(datetime(2020, 7, 30)))
+        self.assertIsNone(self.cache.get(self.key(month=6)))
+        self.assertIsNone(self.cache.get(self.key(month=7)))
+        self.assertIsNone(self.cache.get(self.key(month=8)))
+        self.assertEqual(self.cache.get(self.key(month=9)), '9')
+
+    def test_invalidate_recurrent_task(self):
+        self.cache.set(self.key(month=1), '1')
+        self.cache.set(self.key(month=12), '12')
+        self.cache.invalidate_task(self.task(datetime(2020, 7, 30), is_recurrent=True))
+        self.assertIsNone(self.cache.get(self.key(month=1)))
+        self.assertIsNone(self.cache.get(self.key(month=12)))
+
+    def test_hidden_past_fragment_expires(self):
+        self.cache.hidden_past_timeout = 0
+        self.cache.set(self.key(view_past_tasks=False), '<ul></ul>', view_past_tasks=False)
+        self.assertIsNone(self.cache.get(self.key(view_past_tasks=False)))
+
+    def test_view_past_fragment_expires(self):
+        self.cache.timeout = 0
+        self.cache.set(self.key(), '<ul></ul>')
+        self.assertIsNone(self.cache.get(self.key()))
+
+    def test_counters_survive_eviction(self):
+        backend = LRUCacheBackend(2)
+        backend.incr('version:1')
+        for index in range(10):
+            backend.set('fragment:%d' % index, index)
+        self.assertEqual(backend.get_counter('version:1'), 1)
+
+    def test_filesystem_backend_shared(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            worker_1 = MonthCache(FileSystemCacheBackend(cache_dir))
+            worker_2 = MonthCache(FileSystemCacheBackend(cache_dir))
+            key = worker_1.key(1, 2020, 7, True, 0, self.today)
+            worker_1.set(key, '<ul></ul>')
+            self.assertEqual(worker_2.get(key), '<ul></ul>')
+            worker_2.invalidate_month(1, 2020, 7)
+            self.assertIsNone(worker_1.get(worker_1.key(1, 2020, 7, True, 0, self.today)))
+
+class CalendarSettingsCacheTestCase(unittest.TestCase):
+    """This class represents the calendar settings cache test case"""
+
+    def setUp(self):
+        self.loads = []
+
+    def loader(self, calendar_id):
+        self.loads.append(calendar_id)
+        return None if calendar_id == 0 else {'id': calendar_id}
+
+    def test_get_loads_once(self):
+        cache = CalendarSettingsCache(ttl=60)
+        self.assertEqual(cache.get(1, self.loader), {'id': 1})
+        self.assertEqual(cache.get(1, self.loader), {'id': 1})
+        self.assertEqual(self.loads, [1])
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_missing_calendar_not_cached(self):
+        cache = CalendarSettingsCache(ttl=60)
+        self.assertIsNone(cache.get(0, self.loader))
+        self.assertIsNone(cache.get(0, self.loader))
+        self.assertEqual(self.loads, [0, 0])
+
+    def test_invalidate(self):
+        cache = CalendarSettingsCache(ttl=60)
+        cache.get(1, self.loader)
+        cache.invalidate(1)
+        cache.get(1, self.loader)
+        self.assertEqual(self.loads, [1, 1])
+
+    def test_ttl(self):
+        cache = CalendarSettingsCache(ttl=0)
+        cache.get(1, self.loader)
+        cache.get(1, self.loader)
+        self.assertEqual(self.loads, [1, 1])
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -4,12 +4,13 @@ import unittest
 import json
 from flask import session
 import uuid
-from datetime import datetime
+from datetime import date, datetime, timedelta
 import pickle
 
-from app import create_app
+from app import create_app, db, task_details_for_markup
 from app.mod_calendar.models import Calendar
 from app.mod_calendar.models import Task
+from app.mod_calendar.models import TaskRecord
 
 class CalendarTestCase(unittest.TestCase):
     """This class represents the trivia test case"""
@@ -46,6 +47,37 @@ class CalendarTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertIn('Calendar - Arturo Crespo de la Viña', res.data.decode())
 
+    def test_list_calendars_api_pages(self):
+        with self.app.app_context():
+            prefix = 'Page %s' % uuid.uuid4()
+            calendars = []
+            for index in range(3):
+                calendar = Calendar(name='%s %d' % (prefix, index), description='', min_year=2000, max_year=2200,
+                                    time_zone='Europe/Madrid', week_starting_day=0, emojis_enabled=True,
+                                    show_view_past_btn=True)
+                calendar.insert()
+                calendars.append(calendar.id)
+            try:
+                res = self.client().get('/calendar/api/calendars', query_string={'q': prefix.upper(), 'limit': 2})
+                data = json.loads(res.data)
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual([calendar['id'] for calendar in data['calendars']], calendars[:0:-1])
+                self.assertIsNotNone(data['next'])
+                res = self.client().get('/calendar/api/calendars',
+                                        query_string={'q': prefix, 'limit': 2, 'after': data['next']})
+                data = json.loads(res.data)
+                self.assertEqual([calendar['id'] for calendar in data['calendars']], calendars[:1])
+                self.assertIsNone(data['next'])
+            finally:
+                Calendar.query.filter(Calendar.id.in_(calendars)).delete(synchronize_session=False)
+                db.session.commit()
+
+    def test_list_calendars_api_invalid_cursor(self):
+        res = self.client().get('/calendar/api/calendars?after=not-a-cursor')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+
     def test_get_home_invalid_failed(self):
         res = self.client().get('/calendars')
         self.assertEqual(res.status_code, 404)
@@ -221,6 +253,462 @@ class CalendarTestCase(unittest.TestCase):
             self.assertEqual(data['success'], True)
             self.assertEqual(data['task_id'], task.id)
 
+    def markup_calendar(self, auto_decorate):
+        calendar = Calendar(
+            name = 'Test Calendar',
+            description = str(uuid.uuid4()) + str(uuid.uuid4()),
+            min_year = 2000,
+            max_year = 2050,
+            time_zone = 'Europe/Madrid',
+            week_starting_day = 0,
+            emojis_enabled = True,
+            show_view_past_btn = True,
+            auto_decorate_task_details_hyperlink = auto_decorate
+        )
+        calendar.insert()
+        return calendar.id
+
+    def task_form(self, details):
+        return {
+            'title': 'Test Task',
+            'color': '#B19CDA',
+            'details': details,
+            'start_date': '2020-07-10',
+            'start_time': '10:00',
+            'end_date': '2020-07-10',
+            'end_time': '11:00',
+            'repetition_value': 0
+        }
+
+    def test_details_markup_stored_on_create_and_update(self):
+        calendar_id = self.markup_calendar(True)
+        try:
+            with self.app.test_client() as client:
+                self.login(client)
+                details = 'Docs https://example.com/%s' % uuid.uuid4()
+                res = client.post('/calendar/%d/tasks' % calendar_id, data=self.task_form(details))
+                self.assertEqual(res.status_code, 302)
+                task = Task.query.filter_by(details=details).one()
+                self.assertEqual(task.details_markup, task_details_for_markup(details))
+                self.assertIn('<a href="https://example.com/', task.details_markup)
+
+                details = 'Moved to https://example.org/%s' % uuid.uuid4()
+                res = client.post('/calendar/%d/tasks/%d' % (calendar_id, task.id), data=self.task_form(details))
+                self.assertEqual(res.status_code, 302)
+                db.session.expire_all()
+                task = Task.query.get(task.id)
+                self.assertEqual(task.details_markup, task_details_for_markup(details))
+        finally:
+            Task.query.filter(Task.calendar_id == calendar_id).delete()
+            Calendar.query.filter(Calendar.id == calendar_id).delete()
+            db.session.commit()
+
+    def test_details_markup_not_stored_without_auto_decorate(self):
+        calendar_id = self.markup_calendar(False)
+        try:
+            with self.app.test_client() as client:
+                self.login(client)
+                details = 'Docs https://example.com/%s' % uuid.uuid4()
+                client.post('/calendar/%d/tasks' % calendar_id, data=self.task_form(details))
+                task = Task.query.filter_by(details=details).one()
+                self.assertIsNone(task.details_markup)
+
+                client.post('/calendar/%d/tasks/%d' % (calendar_id, task.id), data=self.task_form(details + ' again'))
+                db.session.expire_all()
+                self.assertIsNone(Task.query.get(task.id).details_markup)
+        finally:
+            Task.query.filter(Task.calendar_id == calendar_id).delete()
+            Calendar.query.filter(Calendar.id == calendar_id).delete()
+            db.session.commit()
+
+    def test_month_grid_renders_details_markup(self):
+        calendar_id = self.markup_calendar(True)
+        try:
+            for details, markup in (
+                ('Stored', '<em>stored markup</em>'),
+                ('Fallback https://example.com/fallback', None)
+            ):
+                task = Task(
+                    calendar_id = calendar_id,
+                    title = 'Test Task',
+                    color = '#B19CDA',
+                    details = details,
+                    start_time = datetime(2020, 7, 10, 10),
+                    end_time = datetime(2020, 7, 10, 11),
+                    is_all_day = False,
+                    is_recurrent = False,
+                    repetition_value = 0,
+                    repetition_type = ' ',
+                    repetition_subtype = ' '
+                )
+                task.details_markup = markup
+                task.insert()
+            with self.app.test_client() as client:
+                self.login(client)
+                res = client.get('/calendar/%d/?y=2020&m=7' % calendar_id)
+                self.assertEqual(res.status_code, 200)
+                html = res.data.decode()
+                # The stored markup is rendered as is, the NULL one is decorated by the filter
+                self.assertIn('<em>stored markup</em>', html)
+                self.assertIn('<a href="https://example.com/fallback" target="_blank">', html)
+        finally:
+            Task.query.filter(Task.calendar_id == calendar_id).delete()
+            Calendar.query.filter(Calendar.id == calendar_id).delete()
+            db.session.commit()
+
+    def test_task_details_for_markup_memoized(self):
+        details = 'See https://example.com/%s' % uuid.uuid4()
+        markup = task_details_for_markup(details)
+        hits = task_details_for_markup.cache_info().hits
+        self.assertEqual(task_details_for_markup(details), markup)
+        self.assertEqual(task_details_for_markup.cache_info().hits, hits + 1)
+        self.assertEqual(markup, 'See <a href="{0}" target="_blank">{0}</a>'.format(details[4:]))
+
+    def test_get_tasks_month(self):
+        with self.app.app_context():
+            tasks = Task.getTasks(1, 2020, 7, True)
+            titles = [task.title for task in tasks[7][30]]
+            self.assertIn('Task 1', titles)
+            self.assertIn('Final project date', titles)
+            self.assertEqual([task.title for task in tasks[7][25]], ['Task 2'])
+
+    def test_get_tasks_month_read_only(self):
+        with self.app.app_context():
+            tasks = Task.getTasks(1, 2020, 7, True)
+            records = Task.getTasks(1, 2020, 7, True, read_only=True)
+            self.assertEqual(
+                {month: {day: [task.id for task in day_tasks] for day, day_tasks in days.items()}
+                 for month, days in tasks.items()},
+                {month: {day: [task.id for task in day_tasks] for day, day_tasks in days.items()}
+                 for month, days in records.items()}
+            )
+            record = records[7][25][0]
+            self.assertIsInstance(record, TaskRecord)
+            self.assertEqual(record.short(), tasks[7][25][0].short())
+
+    def test_get_tasks_month_clamps_recurrent_day(self):
+        with self.app.app_context():
+            tasks = Task.getTasks(1, 2020, 2, True)
+            self.assertEqual([task.title for task in tasks[2][29]], ['Task 1'])
+
+    def test_get_tasks_month_hides_past_tasks(self):
+        with self.app.app_context():
+            self.assertEqual(Task.getTasks(1, 2020, 7, False), {})
+            self.assertEqual(Task.getTasks(1, 2020, 7, False, read_only=True), {})
+
+    def test_get_tasks_month_keeps_recent_past_tasks(self):
+        with self.app.app_context():
+            keep_days = (datetime.now() - datetime(2020, 6, 1)).days
+            records = Task.getTasks(1, 2020, 7, True, read_only=True)
+            kept = Task.getTasks(1, 2020, 7, False, read_only=True, keep_days=keep_days)
+            self.assertEqual(
+                {day: [task.id for task in day_tasks] for day, day_tasks in records[7].items()},
+                {day: [task.id for task in day_tasks] for day, day_tasks in kept[7].items()}
+            )
+
+    def test_get_tasks_range_matches_months(self):
+        with self.app.app_context():
+            months = Task.getTasksRange(1, date(2020, 1, 1), date(2020, 12, 31))
+            self.assertEqual([key for key, _ in months], sorted(key for key, _ in months))
+            by_month = dict(months)
+            for month in range(1, 13):
+                tasks = Task.getTasks(1, 2020, month, True, read_only=True).get(month, {})
+                self.assertEqual(
+                    {day.day: sorted(task.id for task in day_tasks) for day, day_tasks in by_month.get((2020, month), [])},
+                    {day: sorted(task.id for task in day_tasks) for day, day_tasks in tasks.items()}
+                )
+
+    def test_get_agenda_api_logged_in(self):
+        with self.app.test_client() as client:
+            self.login(client)
+            res = client.get('/calendar/1/api/agenda?y=2020')
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(data['success'], True)
+            self.assertEqual(data['from'], '2020-01-01')
+            self.assertEqual(data['to'], '2020-12-31')
+            july = [month for month in data['months'] if month['month'] == 7][0]
+            self.assertIn('Task 2', [task['title'] for day in july['days'] for task in day['tasks']])
+
+    def test_get_agenda_api_range_too_long(self):
+        with self.app.test_client() as client:
+            self.login(client)
+            res = client.get('/calendar/1/api/agenda?from=2020-01-01&to=2021-06-30')
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 422)
+            self.assertEqual(data['success'], False)
+
+    def test_get_agenda_logged_in(self):
+        with self.app.test_client() as client:
+            self.login(client)
+            res = client.get('/calendar/1/agenda?from=2020-07-01&to=2020-07-31')
+            self.assertEqual(res.status_code, 200)
+            self.assertIn(b'Task 2', res.data)
+
+    def test_get_upcoming_logged_in(self):
+        with self.app.test_client() as client:
+            self.login(client)
+            start_time = datetime.now().replace(microsecond=0) + timedelta(days=2)
+            tasks = [
+                Task(calendar_id=1, title='Upcoming task', color='#B19CDA', details=str(uuid.uuid4()),
+                     start_time=start_time, end_time=start_time + timedelta(hours=1), is_all_day=False,
+                     is_recurrent=False, repetition_value=0, repetition_type='', repetition_subtype=''),
+                Task(calendar_id=1, title='Upcoming recurrent task', color='#B19CDA', details=str(uuid.uuid4()),
+                     start_time=start_time, end_time=start_time + timedelta(hours=1), is_all_day=False,
+                     is_recurrent=True, repetition_value=start_time.weekday(), repetition_type='w',
+                     repetition_subtype='w')
+            ]
+            for task in tasks:
+                task.insert()
+            try:
+                res = client.get('/calendar/1/upcoming?n=5')
+                data = json.loads(res.data)
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(data['success'], True)
+                self.assertLessEqual(len(data['tasks']), 5)
+                starts = [task['start'] for task in data['tasks']]
+                self.assertEqual(starts, sorted(starts))
+                ids = [task['id'] for task in data['tasks']]
+                self.assertIn(tasks[0].id, ids)
+                self.assertIn(tasks[1].id, ids)
+            finally:
+                for task in tasks:
+                    task.delete()
+
+    def test_get_upcoming_invalid_limit(self):
+        with self.app.test_client() as client:
+            self.login(client)
+            res = client.get('/calendar/1/upcoming?n=0')
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 422)
+            self.assertEqual(data['success'], False)
+
+    def test_current_date_time_zone(self):
+        # UTC+14 and UTC-11: at any time, the two calendars are on different days
+        kiritimati = Calendar.current_date('Pacific/Kiritimati')
+        pago_pago = Calendar.current_date('Pacific/Pago_Pago')
+        self.assertNotEqual(kiritimati, pago_pago)
+        self.assertEqual(Calendar.current_date('UTC')[2], datetime.utcnow().year)
+
+    def test_get_calendar_tasks_api_logged_in(self):
+        with self.app.test_client() as client:
+            self.login(client)
+            res = client.get('/calendar/1/api/tasks?y=2020&m=7')
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(data['success'], True)
+            self.assertIn('Task 2', [task['title'] for task in data['tasks']])
+            self.assertIn('2020-07-30', [task['date'] for task in data['tasks'] if task['title'] == 'Task 1'])
+            etag = res.headers['ETag']
+
+            res = client.get('/calendar/1/api/tasks?y=2020&m=7', headers={'If-None-Match': etag})
+            self.assertEqual(res.status_code, 304)
+            self.assertEqual(res.data, b'')
+
+    def test_get_calendar_tasks_api_etag_changes(self):
+        with self.app.test_client() as client:
+            self.login(client)
+            etag = client.get('/calendar/1/api/tasks?y=2020&m=7').headers['ETag']
+            task = Task(
+                calendar_id = 1,
+                title = 'Test Task',
+                color = '#B19CDA',
+                details = str(uuid.uuid4()),
+                start_time = datetime(2020, 7, 10, 10),
+                end_time = datetime(2020, 7, 10, 11),
+                is_all_day = False,
+                is_recurrent = False,
+                repetition_value = 0,
+                repetition_type = ' ',
+                repetition_subtype =  ' '
+            )
+            task.insert()
+            try:
+                res = client.get('/calendar/1/api/tasks?y=2020&m=7', headers={'If-None-Match': etag})
+                self.assertEqual(res.status_code, 200)
+                self.assertNotEqual(res.headers['ETag'], etag)
+            finally:
+                task.delete()
+
+    def test_get_calendar_tasks_api_logged_out(self):
+        with self.app.test_client() as client:
+            res = client.get('/calendar/1/api/tasks')
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 401)
+            self.assertEqual(data['success'], False)
+
+    def test_import_calendar_tasks_logged_in(self):
+        with self.app.test_client() as client:
+            self.login(client)
+            details = str(uuid.uuid4())
+            rows = [
+                {'title': 'Imported 1', 'color': '#B19CDA', 'details': details,
+                 'start_date': '10/07/2020', 'start_time': '10:00:00',
+                 'end_date': '10/07/2020', 'end_time': '11:00:00'},
+                {'title': 'Imported 2', 'color': '#B19CDA', 'details': details,
+                 'start_date': '11/07/2020', 'start_time': '10:00:00',
+                 'end_date': '11/07/2020', 'end_time': '11:00:00',
+                 'is_recurrent': True, 'repetition_type': 'm', 'repetition_subtype': 'm', 'repetition_value': 11},
+                {'title': '', 'details': details, 'start_date': '2020-07-12'}
+            ]
+            body = '\n'.join(json.dumps(row) for row in rows) + '\n{not json'
+            try:
+                res = client.post('/calendar/1/tasks/import?format=jsonl', data=body)
+                data = json.loads(res.data)
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(data['success'], False)
+                self.assertEqual(data['rows'], 4)
+                self.assertEqual(data['inserted'], 2)
+                self.assertEqual(data['invalid'], 2)
+                self.assertEqual([error['row'] for error in data['errors']], [3, 4])
+                tasks = Task.query.filter_by(details=details).order_by(Task.start_time).all()
+                self.assertEqual([task.title for task in tasks], ['Imported 1', 'Imported 2'])
+                self.assertEqual(tasks[1].repetition_value, 11)
+            finally:
+                Task.query.filter_by(details=details).delete()
+                db.session.commit()
+
+    def test_import_calendar_tasks_stops_on_undecodable_bytes(self):
+        from app.mod_calendar.cache import month_cache
+        with self.app.test_client() as client:
+            self.login(client)
+            details = str(uuid.uuid4())
+            # Rows past the first decoded block, then a byte that is not UTF-8
+            body = 'title,color,details,start_date,start_time,end_date,end_time\n' + ''.join(
+                'Imported %d,#B19CDA,%s,10/07/2020,10:00:00,10/07/2020,11:00:00\n' % (index, details)
+                for index in range(300)
+            )
+            version = month_cache.backend.get_counter('version:1')
+            try:
+                res = client.post('/calendar/1/tasks/import?format=csv', data=body.encode('utf-8') + b'\xff\xfe\n')
+                data = json.loads(res.data)
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(data['success'], False)
+                self.assertIn('codec', data['stopped'])
+                self.assertGreater(data['inserted'], 0)
+                self.assertEqual(data['inserted'], data['rows'])
+                self.assertEqual(Task.query.filter_by(details=details).count(), data['inserted'])
+                # The rows inserted before the error are not hidden by the month cache
+                self.assertGreater(month_cache.backend.get_counter('version:1'), version)
+            finally:
+                Task.query.filter_by(details=details).delete()
+                db.session.commit()
+
+    def test_import_calendar_ics_logged_in(self):
+        with self.app.test_client() as client:
+            self.login(client)
+            details = str(uuid.uuid4())
+            body = '\r\n'.join([
+                'BEGIN:VCALENDAR',
+                'BEGIN:VEVENT',
+                'SUMMARY:Imported event',
+                'DESCRIPTION:%s' % details,
+                'DTSTART:20200710T100000',
+                'DTEND:20200710T110000',
+                'END:VEVENT',
+                'BEGIN:VEVENT',
+                'SUMMARY:Imported rule',
+                'DESCRIPTION:%s' % details,
+                'DTSTART;VALUE=DATE:20200106',
+                'RRULE:FREQ=WEEKLY;BYDAY=MO',
+                'END:VEVENT',
+                'BEGIN:VEVENT',
+                'SUMMARY:Unsupported rule',
+                'DTSTART:20200710T100000',
+                'RRULE:FREQ=YEARLY',
+                'END:VEVENT',
+                'END:VCALENDAR'
+            ])
+            try:
+                res = client.post('/calendar/1/tasks/import?format=ics', data=body)
+                data = json.loads(res.data)
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(data['rows'], 3)
+                self.assertEqual(data['inserted'], 2)
+                self.assertEqual([error['row'] for error in data['errors']], [3])
+                self.assertGreater(data['max_rss_kb']['self'], 0)
+                tasks = Task.query.filter_by(details=details).order_by(Task.start_time).all()
+                self.assertEqual([task.title for task in tasks], ['Imported rule', 'Imported event'])
+                self.assertEqual((tasks[0].is_recurrent, tasks[0].repetition_type, tasks[0].repetition_value),
+                                 (True, 'w', 0))
+            finally:
+                Task.query.filter_by(details=details).delete()
+                db.session.commit()
+
+    def test_import_calendar_tasks_logged_out(self):
+        with self.app.test_client() as client:
+            res = client.post('/calendar/1/tasks/import?format=jsonl', data='')
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 401)
+            self.assertEqual(data['success'], False)
+
+    def test_export_calendar_logged_in(self):
+        with self.app.test_client() as client:
+            self.login(client)
+            res = client.get('/calendar/1/export.ics')
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.mimetype, 'text/calendar')
+            document = res.data.decode()
+            self.assertTrue(document.startswith('BEGIN:VCALENDAR'))
+            self.assertIn('SUMMARY:Final project date', document)
+            self.assertIn('RRULE:FREQ=MONTHLY', document)
+
+    def test_export_calendar_logged_out(self):
+        with self.app.test_client() as client:
+            res = client.get('/calendar/1/export.ics')
+            self.assertEqual(res.status_code, 401)
+
+    def test_month_days_per_week_start(self):
+        monday_grid = Calendar.month_days(2020, 7, 0)
+        sunday_grid = Calendar.month_days(2020, 7, 6)
+        self.assertEqual(monday_grid[0], datetime(2020, 6, 29).date())
+        self.assertEqual(sunday_grid[0], datetime(2020, 6, 28).date())
+        self.assertIs(Calendar.month_days(2020, 7, 6), sunday_grid)
+        self.assertEqual(Calendar.month_days_with_weekday(2020, 7, 6)[0], (0, 0, 0, 1, 2, 3, 4))
+
+    def test_get_tasks_month_uses_task_indexes(self):
+        with self.app.app_context():
+            calendar = Calendar(
+                name = 'Test Calendar',
+                description = str(uuid.uuid4()) + str(uuid.uuid4()),
+                min_year = 2000,
+                max_year = 2050,
+                time_zone = 'Europe/Madrid',
+                week_starting_day = 0,
+                emojis_enabled = True,
+                show_view_past_btn = True
+            )
+            calendar.insert()
+            try:
+                # Seed ten years of tasks, one in twenty of them recurrent
+                first_day = datetime(2015, 1, 1, 9)
+                db.session.bulk_insert_mappings(Task, [{
+                    'calendar_id': calendar.id,
+                    'title': 'Task %d' % index,
+                    'color': '#B19CDA',
+                    'details': '',
+                    'start_time': first_day + timedelta(hours=index * 17),
+                    'end_time': first_day + timedelta(hours=index * 17 + 1),
+                    'is_all_day': False,
+                    'is_recurrent': index % 20 == 0,
+                    'repetition_value': 3 if index % 20 == 0 else 0,
+                    'repetition_type': 'w' if index % 20 == 0 else ' ',
+                    'repetition_subtype': ' '
+                } for index in range(5000)])
+                db.session.commit()
+                db.session.execute('ANALYZE task')
+
+                query = Task._month_query(calendar.id, 2020, 7, datetime(2020, 6, 24), datetime(2020, 8, 6))
+                statement = query.statement.compile(dialect=db.engine.dialect)
+                plan = '\n'.join(row[0] for row in db.session.connection().execute(
+                    'EXPLAIN ' + str(statement), statement.params))
+                self.assertIn('ix_task_calendar_end_start', plan)
+                self.assertIn('ix_task_calendar_recurrent_start', plan)
+                self.assertNotIn('Seq Scan', plan)
+            finally:
+                Task.query.filter(Task.calendar_id == calendar.id).delete()
+                calendar.delete()
+
 # Make the tests conveniently executable
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,237 @@
+import io
+import os
+import time
+import unittest
+from datetime import date, datetime
+
+from app.mod_calendar import ical, importer
+from app.mod_calendar.models import CalendarSettings, Task
+
+def make_task(task_id, start_time, end_time, is_all_day=False, is_recurrent=False,
+              repetition_value=0, repetition_type=' ', repetition_subtype=' '):
+    task = Task(
+        calendar_id=1,
+        title='Task, %d' % task_id,
+        color='#B19CDA',
+        details='Line 1<br>Line 2',
+        start_time=start_time,
+        end_time=end_time,
+        is_all_day=is_all_day,
+        is_recurrent=is_recurrent,
+        repetition_value=repetition_value,
+        repetition_type=repetition_type,
+        repetition_subtype=repetition_subtype
+    )
+    task.id = task_id
+    task.date_modified = datetime(2020, 7, 1, 12)
+    return task
+
+class ICalendarExportTestCase(unittest.TestCase):
+    """This class represents the iCalendar export test case"""
+
+    def setUp(self):
+        self.settings = CalendarSettings(1, 'Main', 'Main floor', 2000, 2200, 'Europe/Madrid', 0,
+                                         True, True, True, False, 62)
+
+    def test_rrule(self):
+        until = datetime(2020, 12, 31, 22, 59, 59)
+        self.assertEqual(ical.rrule('w', '', 2, until), 'FREQ=WEEKLY;BYDAY=WE;UNTIL=20201231T225959Z')
+        self.assertEqual(ical.rrule('m', 'w', 0, until), 'FREQ=MONTHLY;BYDAY=1MO;UNTIL=20201231T225959Z')
+        self.assertEqual(ical.rrule('m', 'm', 15, until), 'FREQ=MONTHLY;BYMONTHDAY=15;UNTIL=20201231T225959Z')
+        self.assertEqual(ical.rrule('m', 'm', 30, until),
+                         'FREQ=MONTHLY;BYMONTHDAY=28,29,30;BYSETPOS=-1;UNTIL=20201231T225959Z')
+        self.assertEqual(ical.rrule('w', '', 2, date(2020, 12, 31), 'DATE'), 'FREQ=WEEKLY;BYDAY=WE;UNTIL=20201231')
+        self.assertIsNone(ical.rrule(' ', ' ', 0, until))
+
+    def test_fold_line(self):
+        folded = ical.fold_line('DESCRIPTION:' + 'é' * 80)
+        lines = folded[:-2].split('\r\n')
+        self.assertTrue(all(len(line.encode('utf-8')) <= 75 for line in lines))
+        self.assertTrue(all(line.startswith(' ') for line in lines[1:]))
+        self.assertEqual(''.join(line[1:] if index else line for index, line in enumerate(lines)),
+                         'DESCRIPTION:' + 'é' * 80)
+
+    def test_vevent_one_off(self):
+        event = ical.vevent(make_task(7, datetime(2020, 7, 25, 10), datetime(2020, 7, 25, 11)), 'Europe/Madrid')
+        self.assertIn('UID:task-7@calendarapp\r\n', event)
+        self.assertIn('SUMMARY:Task\\, 7\r\n', event)
+        self.assertIn('DESCRIPTION:Line 1\\nLine 2\r\n', event)
+        self.assertIn('DTSTART;TZID=Europe/Madrid:20200725T100000\r\n', event)
+        self.assertNotIn('RRULE', event)
+
+    def test_vevent_recurrent_starts_on_first_occurrence(self):
+        task = make_task(8, datetime(2020, 6, 30), datetime(2020, 6, 30), is_all_day=True, is_recurrent=True,
+                         repetition_value=30, repetition_type='m', repetition_subtype='m')
+        event = ical.vevent(task, 'Europe/Madrid')
+        self.assertIn('DTSTART;VALUE=DATE:20200130\r\n', event)
+        self.assertIn('DTEND;VALUE=DATE:20200131\r\n', event)
+        self.assertIn('RRULE:FREQ=MONTHLY;BYMONTHDAY=28,29,30;BYSETPOS=-1;UNTIL=20201231\r\n', event)
+
+    def test_vevent_recurrent_timed_until_in_utc(self):
+        task = make_task(9, datetime(2020, 3, 2, 8), datetime(2020, 3, 2, 9), is_recurrent=True,
+                         repetition_value=0, repetition_type='w', repetition_subtype='w')
+        # December 31st 23:59:59 CET is 22:59:59 UTC
+        self.assertIn('RRULE:FREQ=WEEKLY;BYDAY=MO;UNTIL=20201231T225959Z\r\n', ical.vevent(task, 'Europe/Madrid'))
+        self.assertIn('RRULE:FREQ=WEEKLY;BYDAY=MO;UNTIL=20210101T045959Z\r\n', ical.vevent(task, 'America/New_York'))
+
+    def test_vevent_dtstamp_in_utc(self):
+        time_zone = os.environ.get('TZ')
+        os.environ['TZ'] = 'Europe/Madrid'
+        time.tzset()
+        try:
+            event = ical.vevent(make_task(10, datetime(2020, 7, 25, 10), datetime(2020, 7, 25, 11)), 'Asia/Tokyo')
+        finally:
+            if time_zone is None:
+                del os.environ['TZ']
+            else:
+                os.environ['TZ'] = time_zone
+            time.tzset()
+        # date_modified is 2020-07-01 12:00 CEST, server local time
+        self.assertIn('DTSTAMP:20200701T100000Z\r\n', event)
+
+    def test_vtimezone(self):
+        component = ical.vtimezone('Europe/Madrid', 2019, 2020)
+        self.assertTrue(component.startswith('BEGIN:VTIMEZONE\r\nTZID:Europe/Madrid\r\n'))
+        self.assertIn(
+            'BEGIN:DAYLIGHT\r\nDTSTART:20190331T020000\r\nRDATE:20200329T020000\r\n'
+            'TZOFFSETFROM:+0100\r\nTZOFFSETTO:+0200\r\nTZNAME:CEST\r\nEND:DAYLIGHT\r\n', component)
+        self.assertIn(
+            'BEGIN:STANDARD\r\nDTSTART:20191027T030000\r\nRDATE:20201025T030000\r\n'
+            'TZOFFSETFROM:+0200\r\nTZOFFSETTO:+0100\r\nTZNAME:CET\r\nEND:STANDARD\r\n', component)
+        self.assertTrue(component.endswith('END:VTIMEZONE\r\n'))
+
+        # Without changes, one observance
+        component = ical.vtimezone('Asia/Kolkata', 2020, 2020)
+        self.assertEqual(component.count('BEGIN:STANDARD'), 1)
+        self.assertIn('TZOFFSETFROM:+0530\r\nTZOFFSETTO:+0530\r\n', component)
+
+    def test_export_calendar(self):
+        tasks = (make_task(index, datetime(2020, 7, 1, 10), datetime(2020, 7, 1, 11)) for index in range(3000))
+        chunks = list(ical.export_calendar(self.settings, tasks))
+        self.assertGreater(len(chunks), 2)
+        document = ''.join(chunks)
+        self.assertTrue(document.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(document.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(document.count('BEGIN:VEVENT'), 3000)
+        # One VTIMEZONE for the TZID of the timed tasks, before them
+        self.assertEqual(document.count('BEGIN:VTIMEZONE\r\nTZID:Europe/Madrid\r\n'), 1)
+        self.assertLess(document.index('BEGIN:VTIMEZONE'), document.index('BEGIN:VEVENT'))
+
+class ICalendarImportTestCase(unittest.TestCase):
+    """This class represents the iCalendar import test case"""
+
+    def setUp(self):
+        self.document = '\r\n'.join([
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            'BEGIN:VEVENT',
+            'SUMMARY:Team\\, meeting',
+            'DESCRIPTION:Room 1\\nFloor 2 with a long description that is folded',
+            '  across two lines',
+            'DTSTART;TZID=Europe/Madrid:20200725T100000',
+            'DURATION:PT1H30M',
+            'BEGIN:VALARM',
+            'DESCRIPTION:Reminder',
+            'END:VALARM',
+            'END:VEVENT',
+            'BEGIN:VEVENT',
+            'SUMMARY:Holidays',
+            'DTSTART;VALUE=DATE:20200801',
+            'DTEND;VALUE=DATE:20200815',
+            'END:VEVENT',
+            'BEGIN:VEVENT',
+            'SUMMARY:Every second Tuesday',
+            'DTSTART:20200107T090000Z',
+            'RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=TU',
+            'END:VEVENT',
+            'END:VCALENDAR',
+            ''
+        ])
+
+    def test_read_rows(self):
+        rows = list(ical.read_rows(io.StringIO(self.document), processes=0))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['title'], 'Team, meeting')
+        self.assertEqual(rows[0]['details'], 'Room 1\nFloor 2 with a long description that is folded across two lines')
+        self.assertEqual((rows[0]['start_date'], rows[0]['start_time']), ('25/07/2020', '10:00:00'))
+        self.assertEqual((rows[0]['end_date'], rows[0]['end_time']), ('25/07/2020', '11:30:00'))
+        self.assertEqual(rows[1]['is_all_day'], True)
+        self.assertEqual(rows[1]['end_date'], '14/08/2020')
+        self.assertIsInstance(rows[2], ValueError)
+
+    def test_repetition(self):
+        start_time = datetime(2020, 1, 31)
+        self.assertEqual(ical.repetition('FREQ=WEEKLY', start_time), ('w', 'w', 4))
+        self.assertEqual(ical.repetition('FREQ=WEEKLY;BYDAY=SU;UNTIL=20201231T235959', start_time), ('w', 'w', 6))
+        self.assertEqual(ical.repetition('FREQ=MONTHLY;BYDAY=1WE', start_time), ('m', 'w', 2))
+        self.assertEqual(ical.repetition('FREQ=MONTHLY;BYDAY=WE;BYSETPOS=1', start_time), ('m', 'w', 2))
+        self.assertEqual(ical.repetition('FREQ=MONTHLY', start_time), ('m', 'm', 31))
+        self.assertEqual(ical.repetition('FREQ=MONTHLY;BYMONTHDAY=28,29,30;BYSETPOS=-1', start_time), ('m', 'm', 30))
+        for rule in ('FREQ=DAILY', 'FREQ=MONTHLY;BYDAY=2MO', 'FREQ=WEEKLY;BYDAY=MO,WE', 'FREQ=MONTHLY;BYMONTHDAY=-1'):
+            with self.assertRaises(ValueError):
+                ical.repetition(rule, start_time)
+
+    def test_export_round_trip(self):
+        settings = CalendarSettings(1, 'Main', '', 2000, 2200, 'Europe/Madrid', 0, True, True, True, False, 62)
+        tasks = [
+            make_task(1, datetime(2020, 7, 25, 10), datetime(2020, 7, 25, 11)),
+            make_task(2, datetime(2020, 6, 30), datetime(2020, 6, 30), is_all_day=True, is_recurrent=True,
+                      repetition_value=31, repetition_type='m', repetition_subtype='m'),
+            make_task(3, datetime(2020, 3, 2, 8), datetime(2020, 3, 2, 9), is_recurrent=True,
+                      repetition_value=0, repetition_type='m', repetition_subtype='w')
+        ]
+        document = ''.join(ical.export_calendar(settings, tasks))
+        rows = list(ical.read_rows(io.StringIO(document), processes=0))
+        self.assertEqual([row['title'] for row in rows], ['Task, 1', 'Task, 2', 'Task, 3'])
+        self.assertEqual(rows[0]['details'], 'Line 1\nLine 2')
+        self.assertEqual(rows[0]['color'], '#B19CDA')
+        self.assertEqual((rows[1]['start_date'], rows[1]['end_date']), ('31/01/2020', '31/01/2020'))
+        self.assertEqual(
+            [(row['repetition_type'], row['repetition_subtype'], row['repetition_value']) for row in rows[1:]],
+            [('m', 'm', 31), ('m', 'w', 0)]
+        )
+
+    def test_read_rows_process_pool(self):
+        event = 'BEGIN:VEVENT\r\nSUMMARY:Task %d\r\nDTSTART:20200725T100000\r\nEND:VEVENT\r\n'
+        document = 'BEGIN:VCALENDAR\r\n' + ''.join(event % index for index in range(2000)) + 'END:VCALENDAR\r\n'
+        rows = list(ical.read_rows(io.StringIO(document), processes=2, batch_size=100))
+        self.assertEqual([row['title'] for row in rows], ['Task %d' % index for index in range(2000)])
+        rows = list(ical.read_rows(io.StringIO(document), processes=2, batch_size=500, start_method='forkserver'))
+        self.assertEqual(len(rows), 2000)
+
+    def test_times_in_calendar_time_zone(self):
+        rows = list(ical.read_rows(io.StringIO(self.document), processes=0, time_zone='America/New_York'))
+        # 10:00 in Madrid (CEST) is 04:00 in New York (EDT)
+        self.assertEqual((rows[0]['start_date'], rows[0]['start_time']), ('25/07/2020', '04:00:00'))
+        self.assertEqual((rows[0]['end_date'], rows[0]['end_time']), ('25/07/2020', '05:30:00'))
+        # Whole day events are not converted
+        self.assertEqual((rows[1]['start_date'], rows[1]['start_time']), ('01/08/2020', '00:00:00'))
+
+        start_time, is_all_day = ical.parse_datetime('20200107T090000Z', {}, 'Europe/Madrid')
+        self.assertEqual((start_time, is_all_day), (datetime(2020, 1, 7, 10), False))
+        # Floating times and unknown zones are wall-clock times
+        self.assertEqual(ical.parse_datetime('20200107T090000', {}, 'Europe/Madrid')[0], datetime(2020, 1, 7, 9))
+        self.assertEqual(ical.parse_datetime('20200107T090000', {'TZID': 'W. Europe Standard Time'}, 'Asia/Tokyo')[0],
+                         datetime(2020, 1, 7, 9))
+
+    def test_weekly_rule_moved_to_calendar_day(self):
+        lines = ['SUMMARY:Late call', 'DTSTART;TZID=America/New_York:20200106T220000', 'RRULE:FREQ=WEEKLY;BYDAY=MO']
+        # Monday 22:00 in New York is Tuesday 04:00 in Madrid
+        row = ical.event_row(lines, 'Europe/Madrid')
+        self.assertEqual((row['start_date'], row['start_time']), ('07/01/2020', '04:00:00'))
+        self.assertEqual(row['repetition_value'], 1)
+        lines[-1] = 'RRULE:FREQ=MONTHLY;BYMONTHDAY=6'
+        self.assertIsInstance(ical.event_row(lines, 'Europe/Madrid'), ValueError)
+
+    def test_parsing_processes_capped(self):
+        with importer.parsing_processes(0, 1) as processes:
+            self.assertEqual(processes, 0)
+        with importer.parsing_processes(4, 1) as first:
+            with importer.parsing_processes(4, 1) as second:
+                self.assertEqual((first, second), (4, 0))
+        with importer.parsing_processes(4, 1) as processes:
+            self.assertEqual(processes, 4)
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from app.mod_base.metrics import MetricsRegistry
+
+class MetricsRegistryTestCase(unittest.TestCase):
+    """This class represents the metrics registry test case"""
+
+    def test_render(self):
+        registry = MetricsRegistry(buckets=(0.1, 1.0))
+        labels = (('endpoint', 'calendar.get_calendar'),)
+        registry.inc('http_requests_total', labels)
+        registry.inc('http_requests_total', labels)
+        registry.observe('http_request_duration_seconds', 0.05, labels)
+        registry.observe('http_request_duration_seconds', 0.5, labels)
+        registry.observe('http_request_duration_seconds', 5.0, labels)
+        registry.add_collector(lambda: [('gauge', 'db_pool_checked_out', (), 3), ('gauge', 'db_pool_idle', (), None)])
+        lines = registry.render().splitlines()
+        self.assertIn('# TYPE http_requests_total counter', lines)
+        self.assertIn('http_requests_total{endpoint="calendar.get_calendar"} 2', lines)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', lines)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="calendar.get_calendar",le="0.1"} 1', lines)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="calendar.get_calendar",le="1.0"} 2', lines)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="calendar.get_calendar",le="+Inf"} 3', lines)
+        self.assertIn('http_request_duration_seconds_count{endpoint="calendar.get_calendar"} 3', lines)
+        self.assertIn('db_pool_checked_out 3', lines)
+        self.assertFalse(any(line.startswith('db_pool_idle') for line in lines))
+
+    def test_add_collector_once(self):
+        registry = MetricsRegistry()
+        collector = lambda: [('counter', 'cache_hits_total', (('cache', 'month'),), 2)]
+        registry.add_collector(collector)
+        registry.add_collector(collector)
+        self.assertIn('cache_hits_total{cache="month"} 2', registry.render().splitlines())
+
+    def test_create_app_collectors(self):
+        from app import create_app, runtime_metrics
+        from app.mod_base.metrics import metrics
+        create_app('config_test')
+        create_app('config_test')
+        self.assertEqual(metrics._collectors.count(runtime_metrics), 1)
+
+    def test_multiprocess(self):
+        multiproc_dir = tempfile.mkdtemp()
+        try:
+            exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+            exited.wait()
+            with open(os.path.join(multiproc_dir, 'metrics-%d.json' % exited.pid), 'w') as snapshot_file:
+                json.dump({
+                    'pid': exited.pid,
+                    'counters': [['http_requests_total', [['endpoint', 'index']], 5]],
+                    'histograms': [],
+                    'gauges': [['db_pool_checked_out', [], 4]]
+                }, snapshot_file)
+
+            registry = MetricsRegistry()
+            registry.multiproc_dir = multiproc_dir
+            registry.inc('http_requests_total', (('endpoint', 'index'),))
+            registry.add_collector(lambda: [('gauge', 'db_pool_checked_out', (), 1)])
+            lines = registry.render().splitlines()
+            self.assertIn('http_requests_total{endpoint="index"} 6', lines)
+            # Gauges of exited workers are dropped, their counters kept
+            self.assertIn('db_pool_checked_out 1', lines)
+            self.assertEqual(sorted(os.listdir(multiproc_dir)), ['.lock', 'archived.json', 'metrics-%d.json' % os.getpid()])
+            self.assertIn('http_requests_total{endpoint="index"} 6', registry.render().splitlines())
+        finally:
+            shutil.rmtree(multiproc_dir)
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import unittest
+import uuid
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from app import create_app, db
+from app.mod_calendar.models import Task, TaskOccurrence
+from app.mod_calendar.occurrences import occurrence_store, rolling_horizon, task_days
+
+Rule = namedtuple('Rule', ['start_time', 'repetition_type', 'repetition_subtype', 'repetition_value'])
+
+class OccurrencesTestCase(unittest.TestCase):
+    """This class represents the materialized occurrences test case"""
+
+    def setUp(self):
+        self.app = create_app('config_test')
+        with self.app.app_context():
+            from flask_migrate import upgrade as _upgrade
+            _upgrade(directory=os.path.join(os.path.dirname(__file__), 'migrations'))
+        occurrence_store.enabled = True
+        occurrence_store.horizon_months = 3
+        occurrence_store.ttl = 0
+
+    def tearDown(self):
+        occurrence_store.enabled = False
+
+    def recurrent_task(self, start_time):
+        task = Task(
+            calendar_id=1,
+            title='Recurrent task',
+            color='#B19CDA',
+            details=str(uuid.uuid4()),
+            start_time=start_time,
+            end_time=start_time + timedelta(hours=1),
+            is_all_day=False,
+            is_recurrent=True,
+            repetition_value=start_time.weekday(),
+            repetition_type='w',
+            repetition_subtype='w'
+        )
+        task.insert()
+        return task
+
+    def test_rolling_horizon(self):
+        self.assertEqual(rolling_horizon(date(2020, 7, 15), 18), (date(2020, 7, 1), date(2021, 12, 31)))
+        self.assertEqual(rolling_horizon(date(2020, 11, 2), 3), (date(2020, 11, 1), date(2021, 1, 31)))
+
+    def test_task_days_in_start_year(self):
+        rule = Rule(datetime(2020, 3, 1), 'm', 'm', 31)
+        days = [date.fromordinal(ordinal) for ordinal in task_days(rule, date(2020, 11, 1), date(2021, 2, 28))]
+        self.assertEqual(days, [date(2020, 11, 30), date(2020, 12, 31)])
+
+    def test_rebuild_and_check(self):
+        with self.app.app_context():
+            task = self.recurrent_task(datetime.now().replace(microsecond=0))
+            try:
+                report = occurrence_store.rebuild()
+                self.assertGreater(report['inserted'], 0)
+                self.assertTrue(occurrence_store.check()['consistent'])
+
+                # Materialized and expanded month views are the same
+                today = date.today()
+                self.assertTrue(occurrence_store.covers_month(today.year, today.month))
+                expanded = Task.getTasks(1, today.year, today.month, True, read_only=True)
+                materialized = Task.getTasks(1, today.year, today.month, True, read_only=True, materialized=True)
+                self.assertEqual(
+                    {month: {day: sorted(task.id for task in day_tasks) for day, day_tasks in days.items()}
+                     for month, days in expanded.items()},
+                    {month: {day: sorted(task.id for task in day_tasks) for day, day_tasks in days.items()}
+                     for month, days in materialized.items()}
+                )
+
+                # Writes keep the table up to date
+                task.repetition_value = (task.repetition_value + 1) % 7
+                task.update()
+                occurrence_store.refresh_task(task)
+                self.assertTrue(occurrence_store.check()['consistent'])
+
+                # An out of band write is reported
+                db.session.execute(TaskOccurrence.__table__.delete().where(TaskOccurrence.task_id == task.id))
+                db.session.commit()
+                report = occurrence_store.check(1)
+                self.assertFalse(report['consistent'])
+                self.assertIn(task.id, report['inconsistent_tasks'])
+                occurrence_store.refresh_task(task)
+            finally:
+                occurrence_store.remove_task(task.id)
+                task.delete()
+            self.assertEqual(TaskOccurrence.query.filter(TaskOccurrence.task_id == task.id).count(), 0)
+
+    def test_advance(self):
+        with self.app.app_context():
+            occurrence_store.rebuild(date(2020, 1, 15))
+            report = occurrence_store.advance(date(2020, 3, 2))
+            self.assertEqual(report['first_day'], '2020-03-01')
+            self.assertEqual(report['last_day'], '2020-05-31')
+            self.assertTrue(occurrence_store.check()['consistent'])
+            occurrence_store.rebuild()
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+
+from app.mod_base.pool import MeteredQueuePool, PoolMetrics, engine_options, pool_metrics
+
+class EngineOptionsTestCase(unittest.TestCase):
+    """This class represents the engine options test case"""
+
+    def test_postgres_options(self):
+        options = engine_options({
+            'SQLALCHEMY_DATABASE_URI': 'postgresql://localhost/calendarapp',
+            'DB_POOL_SIZE': 3,
+            'DB_MAX_OVERFLOW': 2,
+            'DB_POOL_RECYCLE': 600,
+            'DB_STATEMENT_TIMEOUT_MS': 5000,
+            'DB_APPLICATION_NAME': 'calendarapp-test'
+        })
+        self.assertIs(options['poolclass'], MeteredQueuePool)
+        self.assertEqual(options['pool_size'], 3)
+        self.assertEqual(options['max_overflow'], 2)
+        self.assertEqual(options['pool_recycle'], 600)
+        self.assertTrue(options['pool_pre_ping'])
+        self.assertEqual(options['connect_args'], {
+            'application_name': 'calendarapp-test',
+            'options': '-c statement_timeout=5000'
+        })
+
+    def test_explicit_engine_options_win(self):
+        options = engine_options({
+            'SQLALCHEMY_DATABASE_URI': 'postgresql://localhost/calendarapp',
+            'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': 20},
+            'DB_POOL_SIZE': 3,
+            'DB_STATEMENT_TIMEOUT_MS': 0
+        })
+        self.assertEqual(options['pool_size'], 20)
+        self.assertNotIn('options', options['connect_args'])
+
+    def test_sqlite_keeps_defaults(self):
+        self.assertEqual(engine_options({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'DB_POOL_SIZE': 3}), {})
+
+class MeteredQueuePoolTestCase(unittest.TestCase):
+    """This class represents the metered pool test case"""
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        pool_metrics.reset()
+        self.engine = create_engine('sqlite:///' + self.path, poolclass=MeteredQueuePool,
+                                    pool_size=2, max_overflow=1)
+
+    def tearDown(self):
+        self.engine.dispose()
+        os.remove(self.path)
+
+    def test_metrics(self):
+        connections = [self.engine.connect() for _ in range(3)]
+        stats = pool_metrics.stats(self.engine)
+        self.assertEqual(stats['connects'], 3)
+        self.assertEqual(stats['checkouts'], 3)
+        self.assertEqual(stats['checked_out'], 3)
+        self.assertEqual(stats['overflow'], 1)
+        for connection in connections:
+            connection.close()
+        for _ in range(5):
+            self.engine.connect().close()
+        stats = pool_metrics.stats(self.engine)
+        self.assertEqual(stats['connects'], 3)
+        self.assertEqual(stats['checkouts'], 8)
+        self.assertEqual(stats['checkins'], 8)
+        self.assertEqual(stats['checked_out'], 0)
+        self.assertGreaterEqual(stats['wait_seconds_max'], 0.0)
+
+    def test_listeners_not_added_on_dispose(self):
+        for _ in range(2):
+            self.engine.dispose()
+        pool_metrics.reset()
+        self.engine.connect().close()
+        stats = pool_metrics.stats(self.engine)
+        self.assertEqual(stats['checkouts'], 1)
+        self.assertEqual(stats['checkins'], 1)
+        self.assertEqual(stats['connects'], 1)
+
+    def test_stats_without_engine(self):
+        stats = PoolMetrics().stats()
+        self.assertEqual(stats['pid'], os.getpid())
+        self.assertNotIn('checked_out', stats)
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
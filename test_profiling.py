@@ -0,0 +1,76 @@
+import json
+import logging
+import unittest
+
+from flask import Flask, render_template_string
+from sqlalchemy import create_engine, text
+
+from app.mod_base.profiling import RequestProfiler, logger, span
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(json.loads(record.getMessage()))
+
+class RequestProfilerTestCase(unittest.TestCase):
+    """This class represents the request profiler test case"""
+
+    def create_app(self, sample_rate):
+        app = Flask(__name__)
+        app.config['PROFILING_SAMPLE_RATE'] = sample_rate
+        engine = create_engine('sqlite://')
+        RequestProfiler().init_app(app)
+
+        @app.route('/profiled')
+        def profiled():
+            with span('auth'):
+                pass
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1')).scalar()
+                connection.execute(text('SELECT 2')).scalar()
+            return render_template_string('{{ value }}', value='rendered')
+
+        return app
+
+    def setUp(self):
+        self.handler = RecordingHandler()
+        logger.addHandler(self.handler)
+
+    def tearDown(self):
+        logger.removeHandler(self.handler)
+
+    def test_sampled_request(self):
+        res = self.create_app(1.0).test_client().get('/profiled')
+        self.assertEqual(res.data.decode(), 'rendered')
+        server_timing = res.headers['Server-Timing']
+        for metric in ('app;dur=', 'auth;dur=', 'db;dur=', 'render;dur='):
+            self.assertIn(metric, server_timing)
+        self.assertIn('desc="2 queries"', server_timing)
+        record = self.handler.records[-1]
+        self.assertEqual(record['endpoint'], 'profiled')
+        self.assertEqual(record['sql_count'], 2)
+        self.assertEqual(record['bytes_out'], len('rendered'))
+        self.assertGreaterEqual(record['wall_ms'], record['sql_ms'])
+
+    def test_sampled_request_after_logging_config(self):
+        # As left by the migrations fileConfig(alembic.ini) of the other test cases
+        logger.disabled = True
+        self.test_sampled_request()
+
+    def test_unsampled_request(self):
+        res = self.create_app(0.0).test_client().get('/profiled')
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn('Server-Timing', res.headers)
+        self.assertEqual(self.handler.records, [])
+
+    def test_span_outside_request(self):
+        with span('auth'):
+            value = 1
+        self.assertEqual(value, 1)
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from datetime import date
+
+from app.mod_calendar import recurrence
+
+def days(ordinals):
+    return [date.fromordinal(ordinal) for ordinal in ordinals]
+
+class RecurrenceTestCase(unittest.TestCase):
+    """This class represents the recurrence expansion test case"""
+
+    def test_weekly(self):
+        # Wednesdays of July 2020
+        self.assertEqual(
+            days(recurrence.occurrence_ordinals('w', '', 2, date(2020, 7, 1), date(2020, 7, 31))),
+            [date(2020, 7, 1), date(2020, 7, 8), date(2020, 7, 15), date(2020, 7, 22), date(2020, 7, 29)])
+
+    def test_weekly_arbitrary_range(self):
+        ordinals = recurrence.occurrence_ordinals('w', '', 6, date(2019, 12, 30), date(2021, 1, 3))
+        self.assertEqual(len(ordinals), 53)
+        self.assertTrue(all(day.weekday() == 6 for day in days(ordinals)))
+
+    def test_monthly_by_weekday(self):
+        # First Monday of each month
+        self.assertEqual(
+            days(recurrence.occurrence_ordinals('m', 'w', 0, date(2020, 6, 1), date(2020, 8, 31))),
+            [date(2020, 6, 1), date(2020, 7, 6), date(2020, 8, 3)])
+
+    def test_nth_weekday(self):
+        self.assertEqual(recurrence.nth_weekday(2020, 7, 4, 2), 10)
+        self.assertEqual(recurrence.nth_weekday(2020, 7, 4, -1), 31)
+        self.assertEqual(recurrence.nth_weekday(2020, 7, 0, -1), 27)
+        self.assertIsNone(recurrence.nth_weekday(2020, 7, 0, 5))
+
+    def test_monthly_by_monthday_clamped(self):
+        self.assertEqual(
+            days(recurrence.occurrence_ordinals('m', 'm', 31, date(2020, 1, 1), date(2020, 4, 30))),
+            [date(2020, 1, 31), date(2020, 2, 29), date(2020, 3, 31), date(2020, 4, 30)])
+
+    def test_window_bounds(self):
+        self.assertEqual(
+            days(recurrence.occurrence_ordinals('m', 'm', 15, date(2020, 1, 16), date(2020, 3, 14))),
+            [date(2020, 2, 15)])
+        self.assertEqual(recurrence.occurrence_ordinals('w', '', 0, date(2020, 2, 1), date(2020, 1, 1)), [])
+
+    def test_invalid_rules(self):
+        self.assertEqual(list(recurrence.occurrence_ordinals(' ', ' ', 0, date(2020, 1, 1), date(2020, 12, 31))), [])
+        self.assertEqual(list(recurrence.occurrence_ordinals('w', '', 7, date(2020, 1, 1), date(2020, 12, 31))), [])
+        self.assertEqual(list(recurrence.occurrence_ordinals('m', 'm', 0, date(2020, 1, 1), date(2020, 12, 31))), [])
+
+    def test_expand(self):
+        rules = [(1, 'm', 'm', 10), (2, 'w', '', 4)]
+        occurrences = recurrence.expand(rules, date(2020, 7, 1), date(2020, 7, 12))
+        self.assertEqual(occurrences, [
+            (date(2020, 7, 3).toordinal(), 2),
+            (date(2020, 7, 10).toordinal(), 1),
+            (date(2020, 7, 10).toordinal(), 2)
+        ])
+
+    def test_iter_occurrence_ordinals(self):
+        for rule in (('w', '', 2), ('m', 'w', 0), ('m', 'm', 31), ('m', 'x', 1)):
+            self.assertEqual(
+                list(recurrence.iter_occurrence_ordinals(*rule, date(2020, 1, 15), date(2020, 12, 10))),
+                list(recurrence.occurrence_ordinals(*rule, date(2020, 1, 15), date(2020, 12, 10))))
+        occurrences = recurrence.iter_occurrence_ordinals('m', 'm', 31, date(2020, 1, 1), date(2020, 12, 31))
+        self.assertEqual(date.fromordinal(next(occurrences)), date(2020, 1, 31))
+        self.assertEqual(date.fromordinal(next(occurrences)), date(2020, 2, 29))
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from datetime import datetime, timedelta
+
+from app.mod_calendar import timezones
+
+class TimezonesTestCase(unittest.TestCase):
+    """This class represents the calendar time zones test case"""
+
+    def test_to_local(self):
+        # CEST (UTC+2) in summer, CET (UTC+1) in winter
+        self.assertEqual(timezones.to_local('Europe/Madrid', datetime(2020, 7, 1, 23, 30)), datetime(2020, 7, 2, 1, 30))
+        self.assertEqual(timezones.to_local('Europe/Madrid', datetime(2020, 1, 1, 12)), datetime(2020, 1, 1, 13))
+        self.assertEqual(timezones.to_local('America/New_York', datetime(2020, 7, 1, 2)), datetime(2020, 6, 30, 22))
+
+    def test_daylight_saving_transition_day(self):
+        # Europe/Madrid moved to CEST at 2020-03-29 01:00 UTC
+        self.assertIsNone(timezones._day_offset('Europe/Madrid', datetime(2020, 3, 29).toordinal()))
+        self.assertEqual(timezones.to_local('Europe/Madrid', datetime(2020, 3, 29, 0, 30)), datetime(2020, 3, 29, 1, 30))
+        self.assertEqual(timezones.to_local('Europe/Madrid', datetime(2020, 3, 29, 1, 30)), datetime(2020, 3, 29, 3, 30))
+
+    def test_day_offset_memoized(self):
+        ordinal = datetime(2020, 7, 1).toordinal()
+        self.assertEqual(timezones._day_offset('Asia/Tokyo', ordinal), timedelta(hours=9))
+        hits = timezones._day_offset.cache_info().hits
+        timezones.to_local('Asia/Tokyo', datetime(2020, 7, 1, 15))
+        self.assertEqual(timezones._day_offset.cache_info().hits, hits + 1)
+
+    def test_unknown_zone(self):
+        self.assertFalse(timezones.is_valid('Mars/Olympus_Mons'))
+        self.assertFalse(timezones.is_valid(None))
+        self.assertTrue(timezones.is_valid('Europe/Madrid'))
+        self.assertEqual(timezones.to_local('Mars/Olympus_Mons', datetime(2020, 7, 1, 12)), datetime(2020, 7, 1, 12))
+
+    def test_to_utc(self):
+        self.assertEqual(timezones.to_utc('Europe/Madrid', datetime(2020, 12, 31, 23, 59, 59)), datetime(2020, 12, 31, 22, 59, 59))
+        self.assertEqual(timezones.to_utc('Europe/Madrid', datetime(2020, 7, 1, 12)), datetime(2020, 7, 1, 10))
+
+    def test_transitions(self):
+        initial, changes = timezones.transitions('Europe/Madrid', 2020, 2020)
+        self.assertEqual(initial, (timedelta(hours=1), 'CET', False))
+        self.assertEqual(changes, [
+            (datetime(2020, 3, 29, 2), timedelta(hours=1), timedelta(hours=2), 'CEST', True),
+            (datetime(2020, 10, 25, 3), timedelta(hours=2), timedelta(hours=1), 'CET', False)
+        ])
+        self.assertEqual(timezones.transitions('UTC', 2020, 2020), ((timedelta(0), 'UTC', False), []))
+
+    def test_local_now(self):
+        now = timezones.local_now('Asia/Kolkata')
+        self.assertAlmostEqual((now - datetime.utcnow()).total_seconds(), 5.5 * 3600, delta=5)
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()